@@ -0,0 +1,197 @@
+# app/bench.py
+# Offline ingestion benchmark over a synthetic archive (see synthetic.py): per-stage
+# timings, then end-to-end throughput and peak RSS for each chunk size, worker count
+# and row budget.
+import argparse
+import json
+import logging
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import duckdb
+import decoding
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+from preprocessing import validate_match
+from flatten import flatten_match
+from columnar import ROW_BUDGET, ChunkBuffers
+from dimensions import Dimensions
+from manifest import plan_loads
+from db_utils import initialize_db
+from sources import count_zip_matches, iter_zip_matches
+from synthetic import write_archive
+
+STAGES = ("decode", "validate", "flatten", "buffer", "insert", "commit")
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def time_stages(zip_path: Path, db_path: str, chunk_size: int, row_budget: int = ROW_BUDGET) -> Dict[str, Any]:
+    """Run the serial columnar loader with a timer around each stage.
+
+    decode is a plain JSON decode, timed on its own for reference; validate is
+    validate_match as the loader calls it, which decodes into the models itself;
+    buffer includes spilling to the staging tables.
+    """
+    seconds = defaultdict(float)
+    matches = deliveries = 0
+    conn = initialize_db(db_path)
+    buffers = ChunkBuffers(Dimensions.open(conn), row_budget)
+
+    def commit_chunk() -> None:
+        start = time.perf_counter()
+        conn.execute("BEGIN")
+        buffers.flush(conn)
+        flushed = time.perf_counter()
+        conn.execute("COMMIT")
+        buffers.committed()
+        seconds["insert"] += flushed - start
+        seconds["commit"] += time.perf_counter() - flushed
+
+    for source, raw in iter_zip_matches(zip_path):
+        start = time.perf_counter()
+        decoding.loads(raw)
+        decoded = time.perf_counter()
+        match = validate_match(raw, source)
+        validated = time.perf_counter()
+        if match is None:
+            continue
+        rows = flatten_match(match, source).materialize()
+        flattened = time.perf_counter()
+        buffers.add_match(conn, rows)
+        buffered = time.perf_counter()
+        seconds["decode"] += decoded - start
+        seconds["validate"] += validated - decoded
+        seconds["flatten"] += flattened - validated
+        seconds["buffer"] += buffered - flattened
+        matches += 1
+        deliveries += len(rows.innings)
+        if len(buffers) >= chunk_size:
+            commit_chunk()
+    if len(buffers):
+        commit_chunk()
+    conn.close()
+    return {"matches": matches, "deliveries": deliveries, "seconds": dict(seconds),
+            "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF)}
+
+
+def run_once(zip_path: Path, db_path: str, chunk_size: int, workers: int,
+             row_budget: int = ROW_BUDGET) -> Dict[str, Any]:
+    """Load the archive into a fresh database with the real loaders and measure it."""
+    from ingest import batched, process_chunk
+    from pipeline import run_pipeline
+
+    conn = initialize_db(db_path)
+    conn.close()
+    start = time.perf_counter()
+    match_files = plan_loads(iter_zip_matches(zip_path), {})
+    if workers > 0:
+        matches = run_pipeline(match_files, db_path, workers, chunk_size, decoder=decoding.get_backend(),
+                               row_budget=row_budget)
+    else:
+        total_chunks = math.ceil(count_zip_matches(zip_path) / chunk_size)
+        matches = sum(process_chunk(chunk, db_path, i, total_chunks, row_budget=row_budget)
+                      for i, chunk in enumerate(batched(match_files, chunk_size), 1))
+    elapsed = time.perf_counter() - start
+    conn = duckdb.connect(db_path, read_only=True)
+    deliveries = conn.execute("SELECT count(*) FROM innings").fetchone()[0]
+    conn.close()
+    return {
+        "chunk_size": chunk_size,
+        "workers": workers,
+        "row_budget": row_budget,
+        "matches": matches,
+        "deliveries": deliveries,
+        "seconds": elapsed,
+        "matches_per_s": matches / elapsed,
+        "deliveries_per_s": deliveries / elapsed,
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_child_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def _run_isolated(zip_path: Path, work_dir: Path, chunk_size: int, workers: int, row_budget: int,
+                  decoder: str) -> Dict[str, Any]:
+    """run_once in a fresh interpreter, so peak RSS is measured per configuration."""
+    db_path = work_dir / f"bench_c{chunk_size}_w{workers}_r{row_budget}.db"
+    output = subprocess.run(
+        [sys.executable, __file__, "--archive", str(zip_path), "--decoder", decoder,
+         "--run-once", str(db_path), "--chunk-sizes", str(chunk_size), "--workers", str(workers),
+         "--row-budgets", str(row_budget)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def report_stages(stages: Dict[str, Any]) -> None:
+    total = sum(stages["seconds"].values())
+    print(f"\nPer-stage time, serial columnar loader ({stages['matches']} matches, "
+          f"{stages['deliveries']} deliveries):")
+    for stage in STAGES:
+        spent = stages["seconds"].get(stage, 0.0)
+        print(f"  {stage:<9} {spent * 1000 / max(stages['matches'], 1):8.2f} ms/match {spent / total:7.1%}")
+    print(f"  peak RSS  {stages['peak_rss_mb']:8.1f} MB")
+
+
+def report_runs(runs: List[Dict[str, Any]]) -> None:
+    print(f"\n{'chunk':>6} {'workers':>7} {'row budget':>10} {'seconds':>8} {'matches/s':>10} {'deliveries/s':>13} "
+          f"{'peak RSS MB':>12} {'children MB':>12}")
+    for run in runs:
+        print(f"{run['chunk_size']:>6} {run['workers']:>7} {run['row_budget']:>10} {run['seconds']:>8.2f} "
+              f"{run['matches_per_s']:>10.1f} "
+              f"{run['deliveries_per_s']:>13.0f} {run['peak_rss_mb']:>12.1f} {run['peak_child_rss_mb']:>12.1f}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion on synthetic Cricsheet-style data")
+    parser.add_argument("-m", "--matches", type=int, default=500,
+                        help="Synthetic matches to generate (default: 500)")
+    parser.add_argument("--archive", type=Path,
+                        help="Benchmark an existing archive instead of generating one")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[50, 100, 500],
+                        help="Comma-separated chunk sizes to compare (default: 50,100,500)")
+    parser.add_argument("--workers", type=_int_list, default=[0, os.cpu_count()],
+                        help="Comma-separated worker counts to compare; 0 is the serial loader "
+                             "(default: 0 and the CPU count)")
+    parser.add_argument("--row-budgets", type=_int_list, default=[ROW_BUDGET],
+                        help=f"Comma-separated row budgets to compare (default: {ROW_BUDGET})")
+    parser.add_argument("--decoder", choices=("auto",) + decoding.BACKENDS, default="auto")
+    parser.add_argument("-o", "--output", type=Path, help="Also write the results as JSON")
+    parser.add_argument("--run-once", metavar="DB_FILE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    decoder = decoding.set_backend(args.decoder)
+    if args.run_once:
+        logging.getLogger().setLevel(logging.WARNING)
+        print(json.dumps(run_once(args.archive, args.run_once, args.chunk_sizes[0], args.workers[0],
+                                  args.row_budgets[0])))
+        raise SystemExit(0)
+
+    with tempfile.TemporaryDirectory(prefix="cricket_bench_") as tmp:
+        work_dir = Path(tmp)
+        zip_path = args.archive or write_archive(work_dir / "synthetic.zip", args.matches)
+        logging.getLogger().setLevel(logging.WARNING)
+        print(f"Benchmarking {zip_path} with the {decoder} decoder")
+
+        stages = time_stages(zip_path, str(work_dir / "stages.db"), args.chunk_sizes[0], args.row_budgets[0])
+        report_stages(stages)
+
+        runs = [_run_isolated(zip_path, work_dir, chunk_size, workers, row_budget, decoder)
+                for workers in args.workers for chunk_size in args.chunk_sizes for row_budget in args.row_budgets]
+        report_runs(runs)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"decoder": decoder, "stages": stages, "runs": runs}, file, indent=2)
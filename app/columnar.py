@@ -0,0 +1,365 @@
+# app/columnar.py
+import logging
+import pyarrow as pa
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+from flatten import MATCH_COLUMNS, PLAYER_COLUMNS, MATCH_PLAYER_COLUMNS, INNINGS_COLUMNS, MatchRows
+from manifest import MANIFEST_COLUMNS, MANIFEST_UPSERT, release_matches, replace_matches
+from dimensions import COMPACT_MATCH_COLUMNS, FACT_COLUMNS, Dimensions
+from staging import (
+    QUARANTINE_COLUMNS,
+    QUARANTINE_UPSERT,
+    RejectedFile,
+    clear_quarantine,
+    constraint_checks,
+    create_staging_table,
+    discard_rejects,
+    find_rejects,
+    quarantine_rejects
+)
+from summaries import refresh_summaries, team_groups
+from db_utils import bump_data_version
+from metrics import METRICS
+
+# Rows held in Python before they are spilled to the staging tables
+ROW_BUDGET = 50_000
+
+# Players are shared between matches, so rows for players already stored are skipped;
+# a bulk load has no primary key to conflict on until it is finished (db_utils.finish_bulk_load)
+NEW_PLAYERS = "ON CONFLICT (player_id) DO NOTHING"
+BULK_NEW_PLAYERS = "WHERE player_id NOT IN (SELECT player_id FROM players)"
+
+
+class ColumnarBuffer:
+    """Rows collected for one table, spilled in batches to a staging table and
+    written with a single INSERT ... SELECT."""
+
+    def __init__(self, table: str, columns: Sequence[str], on_conflict: str = "",
+                 target: Optional[str] = None, order_by: str = ""):
+        self.table = table
+        self.columns = tuple(columns)
+        self.on_conflict = on_conflict
+        self.target = target or table  # table whose constraints the rows are checked against
+        self.order_by = order_by
+        self.rows: List[tuple] = []
+        self.staged: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def extend(self, rows: Iterable[tuple]) -> None:
+        self.rows.extend(rows)
+
+    def to_arrow(self) -> pa.Table:
+        """Transpose the buffered rows into an Arrow table."""
+        columns = zip(*self.rows) if self.rows else [()] * len(self.columns)
+        return pa.table({name: pa.array(values) for name, values in zip(self.columns, columns)})
+
+    def spill(self, conn) -> None:
+        """Append the buffered rows to the staging table, creating it first if needed, and clear the buffer."""
+        if not self.rows:
+            return
+        if not self.staged:
+            create_staging_table(conn, f"stage_{self.table}", self.target, self.columns)
+            self.staged = f"stage_{self.table}"
+        view = f"{self.table}_buffer"
+        column_list = ", ".join(self.columns)
+        conn.register(view, self.to_arrow())
+        try:
+            conn.execute(f"INSERT INTO {self.staged} ({column_list}) SELECT {column_list} FROM {view};")
+        finally:
+            conn.unregister(view)
+        self.rows = []
+
+    def stage(self, conn) -> Optional[str]:
+        """Spill what is still buffered. Returns the staging table's name, or None if nothing was buffered."""
+        self.spill(conn)
+        return self.staged
+
+    def promote(self, conn) -> int:
+        """Insert the staged rows with a single INSERT ... SELECT. Returns the number of rows written."""
+        if not self.staged:
+            return 0
+        column_list = ", ".join(self.columns)
+        written = conn.execute(f"""
+        INSERT INTO {self.table} ({column_list})
+        SELECT {column_list} FROM {self.staged}
+        {f"ORDER BY {self.order_by}" if self.order_by else ""}
+        {self.on_conflict};
+        """).fetchone()[0]
+        conn.execute(f"DROP TABLE {self.staged};")
+        self.staged = None
+        return written
+
+    def drop(self, conn) -> None:
+        """Forget the buffered and staged rows."""
+        self.rows = []
+        if self.staged:
+            conn.execute(f"DROP TABLE IF EXISTS {self.staged};")
+            self.staged = None
+
+    def flush(self, conn) -> int:
+        """Insert the buffered rows and clear the buffer. Returns the number of rows written."""
+        self.stage(conn)
+        return self.promote(conn)
+
+
+class ChunkBuffers:
+    """Columnar buffers for every table touched by a chunk of matches.
+
+    At most row_budget rows are held in Python: whenever the buffers fill up they
+    are spilled to the chunk's staging tables, so memory stays flat however large
+    the chunk or its matches are. With dimensions (compact schema), deliveries are
+    keyed and written to innings_fact. bulk writes to the tables of an unfinished
+    bulk load, which have no primary keys yet.
+    """
+
+    def __init__(self, dimensions: Optional[Dimensions] = None, row_budget: int = ROW_BUDGET,
+                 bulk: bool = False):
+        self.dimensions = dimensions
+        self.row_budget = max(1, row_budget)
+        match_columns = COMPACT_MATCH_COLUMNS if dimensions else MATCH_COLUMNS
+        self.matches = ColumnarBuffer("matches", match_columns)
+        self.replaced = ColumnarBuffer("replaced_matches", match_columns, target="matches")
+        self.players = ColumnarBuffer("players", PLAYER_COLUMNS, BULK_NEW_PLAYERS if bulk else NEW_PLAYERS)
+        self.match_players = ColumnarBuffer("match_players", MATCH_PLAYER_COLUMNS)
+        # Deliveries are written in match date order, so row groups cover narrow date ranges
+        delivery_order = "match_date, match_id, innings_number, over, ball"
+        if dimensions:
+            self.innings = ColumnarBuffer("innings_fact", FACT_COLUMNS, order_by=delivery_order)
+        else:
+            self.innings = ColumnarBuffer("innings", INNINGS_COLUMNS, order_by=delivery_order)
+        self.manifest = ColumnarBuffer("ingest_manifest", MANIFEST_COLUMNS, MANIFEST_UPSERT)
+        self.quarantine = ColumnarBuffer("ingest_quarantine", QUARANTINE_COLUMNS, QUARANTINE_UPSERT)
+        self.files = 0
+        self.match_ids: List[str] = []
+        self.replaced_ids: List[str] = []
+        self._seen_players: Set[str] = set()
+        self._retry_tables: List[str] = []
+
+    def __len__(self) -> int:
+        return self.files
+
+    def _buffers(self) -> Tuple[ColumnarBuffer, ...]:
+        return (self.matches, self.replaced, self.players, self.match_players, self.innings, self.manifest,
+                self.quarantine)
+
+    def buffered_rows(self) -> int:
+        return sum(len(buffer) for buffer in self._buffers())
+
+    def _reset(self) -> None:
+        self.files = 0
+        self.match_ids = []
+        self.replaced_ids = []
+        self._seen_players = set()
+
+    def spill(self, conn) -> None:
+        """Move every buffered row to the staging tables."""
+        with METRICS.timer("spill"):
+            for buffer in self._buffers():
+                buffer.spill(conn)
+
+    def add(self, conn, parsed: Union[MatchRows, RejectedFile]) -> None:
+        """Buffer a parsed match, or the quarantine entry of a file that failed to parse."""
+        if isinstance(parsed, RejectedFile):
+            self.add_rejected(parsed)
+            return
+        try:
+            self.add_match(conn, parsed)
+        except Exception as e:
+            logging.error(f"Error buffering file {parsed.source}: {e}")
+            METRICS.count("matches_rejected", reason="error")
+            self.add_rejected(RejectedFile(parsed.source, parsed.content_hash, "error", str(e)))
+
+    def add_rejected(self, rejected: RejectedFile) -> None:
+        self.quarantine.extend([rejected])
+        self.files += 1
+
+    def add_match(self, conn, rows: MatchRows) -> None:
+        """Buffer every row of one match. Players already buffered in this chunk are skipped.
+
+        Delivery rows are streamed into the innings buffer, spilling it whenever the
+        row budget is reached; if generating them fails, the rows already buffered
+        or spilled for the match are dropped again, so a match that fails here
+        leaves nothing behind.
+        """
+        match_id = rows.match[0]
+        mark = len(self.innings.rows)
+        spilled = False
+        try:
+            if self.dimensions:
+                match_row, innings_rows = self.dimensions.encode(rows)
+            else:
+                match_row, innings_rows = rows.match, rows.innings
+            innings_rows = iter(innings_rows)
+            while True:
+                room = self.row_budget - self.buffered_rows()
+                if room <= 0:
+                    self.spill(conn)
+                    mark, spilled = 0, True
+                    continue
+                buffered = len(self.innings.rows)
+                self.innings.extend(islice(innings_rows, room))
+                if len(self.innings.rows) - buffered < room:
+                    break
+        except Exception:
+            del self.innings.rows[mark:]
+            if spilled:
+                conn.execute(f"DELETE FROM {self.innings.staged} WHERE match_id = ?;", [str(match_id)])
+            raise
+        players = {player[0]: player for player in reversed(rows.players) if player[0] not in self._seen_players}
+        if rows.replaces:
+            self.replaced.extend([match_row])
+            self.replaced_ids.append(match_id)
+        else:
+            self.matches.extend([match_row])
+            self.match_ids.append(match_id)
+        self._seen_players.update(players)
+        self.players.extend(reversed(players.values()))
+        self.match_players.extend(rows.match_players)
+        self.manifest.extend([(rows.source, rows.content_hash, match_id, rows.archive, rows.innings_skipped)])
+        self.files += 1
+        if self.buffered_rows() >= self.row_budget:
+            self.spill(conn)
+
+    def discard(self, conn) -> None:
+        """Drop everything buffered and staged, e.g. after the chunk failed to commit.
+
+        Dimension keys handed out stay pending and are written by the next chunk.
+        """
+        for buffer in self._buffers():
+            buffer.drop(conn)
+        self._reset()
+
+    def committed(self) -> None:
+        """Called once the transaction that flushed the buffers has committed."""
+        self._reset()
+        if self.dimensions:
+            self.dimensions.commit()
+
+    def set_aside(self, conn) -> Tuple[List[tuple], List[RejectedFile]]:
+        """Keep the staged rows of a chunk that failed to commit for retrying file by file.
+
+        Returns the (source_file, content_hash, match_id) of every staged match and
+        the chunk's quarantine entries; restage puts one match back in staging.
+        """
+        self.spill(conn)
+        retry_tables = []
+        for buffer in self._buffers():
+            if buffer.staged:
+                conn.execute(f"ALTER TABLE {buffer.staged} RENAME TO retry_{buffer.table};")
+                retry_tables.append(buffer.table)
+            buffer.staged = None
+        self._reset()
+        self._retry_tables = retry_tables
+        matches = []
+        if self.manifest.table in retry_tables:
+            matches = conn.execute(f"""
+            SELECT source_file, content_hash, match_id FROM retry_{self.manifest.table};
+            """).fetchall()
+        rejected = []
+        if self.quarantine.table in retry_tables:
+            rejected = [RejectedFile(*row) for row in conn.execute(f"""
+            SELECT {", ".join(QUARANTINE_COLUMNS)} FROM retry_{self.quarantine.table};
+            """).fetchall()]
+        return matches, rejected
+
+    def restage(self, conn, match_id: str) -> None:
+        """Stage one match of the chunk set aside, along with all of the chunk's players."""
+        for buffer in (self.matches, self.replaced, self.match_players, self.innings, self.manifest):
+            if buffer.table not in self._retry_tables:
+                continue
+            staged = f"stage_{buffer.table}"
+            conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE {staged} AS
+            SELECT * FROM retry_{buffer.table} WHERE match_id = ?;
+            """, [match_id])
+            buffer.staged = staged
+        if self.players.table in self._retry_tables:
+            conn.execute("CREATE OR REPLACE TEMP TABLE stage_players AS SELECT * FROM retry_players;")
+            self.players.staged = "stage_players"
+        if self.replaced.staged and conn.execute(f"SELECT count(*) FROM {self.replaced.staged}").fetchone()[0]:
+            self.replaced_ids = [match_id]
+        else:
+            self.match_ids = [match_id]
+        self.files = 1
+
+    def drop_set_aside(self, conn) -> None:
+        for table in self._retry_tables:
+            conn.execute(f"DROP TABLE IF EXISTS retry_{table};")
+        self._retry_tables = []
+
+    def release(self, conn) -> None:
+        """Clear the child rows of buffered matches that replace earlier loads.
+
+        Commits on its own, so it must be called before the transaction that flushes.
+        """
+        release_matches(conn, self.replaced_ids)
+
+    def _check(self, conn) -> Dict[str, str]:
+        """Reject the matches whose staged rows the tables would refuse.
+
+        Players are shared between matches, so a bad player row is dropped and every
+        match listing that player is rejected with it.
+        """
+        checks = [
+            constraint_checks(conn, buffer.staged, buffer.target, buffer.columns)
+            for buffer in (self.matches, self.replaced, self.match_players, self.innings)
+            if buffer.staged
+        ]
+        if self.players.staged:
+            bad_players = constraint_checks(conn, self.players.staged, "players", self.players.columns, "player_id")
+            conn.execute(f"CREATE OR REPLACE TEMP TABLE stage_bad_players AS {bad_players};")
+            conn.execute(f"""
+            DELETE FROM {self.players.staged}
+            WHERE player_id IN (SELECT player_id FROM stage_bad_players);
+            """)
+            if self.match_players.staged:
+                checks.append(f"""
+                SELECT mp.match_id, 'players: ' || p.error AS error
+                FROM {self.match_players.staged} mp
+                JOIN stage_bad_players p ON p.player_id = mp.player_id
+                """)
+        return find_rejects(conn, checks)
+
+    def flush(self, conn) -> Dict[str, int]:
+        """Stage, check and write all buffers, parents before children. Returns rows written per table.
+
+        Every match is checked as a whole against the target tables' constraints
+        in the staging tables (see staging.py); matches that fail go to
+        ingest_quarantine with the reason, and the rest are promoted with one
+        INSERT ... SELECT per table. Released matches are overwritten in place
+        first, and the manifest records every source written. The summary tables
+        are refreshed for the promoted matches last, and the data version bumped.
+        """
+        written = {}
+        self.spill(conn)
+        replaced_ids = list(self.replaced_ids)
+        match_ids = replaced_ids + self.match_ids
+        rejects = self._check(conn)
+        if rejects:
+            METRICS.count("matches_rejected", len(rejects), reason="constraint")
+            quarantined = quarantine_rejects(conn, self.manifest.staged)
+            for buffer in (self.matches, self.replaced, self.match_players, self.innings, self.manifest):
+                discard_rejects(conn, buffer.staged)
+            replaced_ids = [match_id for match_id in replaced_ids if match_id not in rejects]
+            match_ids = [match_id for match_id in match_ids if match_id not in rejects]
+        else:
+            quarantined = 0
+
+        stale_groups = team_groups(conn, replaced_ids)
+        if self.replaced.staged:
+            replace_matches(conn, self.replaced.staged, self.replaced.columns)
+            conn.execute(f"DROP TABLE {self.replaced.staged};")
+            self.replaced.staged = None
+            written[self.replaced.table] = len(replaced_ids)
+        if self.dimensions:
+            written.update(self.dimensions.flush(conn))
+        if self.manifest.staged:
+            clear_quarantine(conn, self.manifest.staged)
+        for buffer in (self.matches, self.players, self.match_players, self.innings, self.manifest):
+            written[buffer.table] = buffer.promote(conn)
+        written[self.quarantine.table] = self.quarantine.promote(conn) + quarantined
+        written.update(refresh_summaries(conn, match_ids, stale_groups))
+        bump_data_version(conn)
+        return written
@@ -2,7 +2,7 @@
 import duckdb
 import argparse
 import logging
-import time
+from typing import Dict, List, Tuple
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,54 +13,208 @@ logging.basicConfig(
     ]
 )
 
-def initialize_db(db_file):
-    """Initialize the database schema and return connection."""
-    try:
-        # Connect to database (will create if doesn't exist)
-        conn = duckdb.connect(db_file)
+# First over (0-based) of the middle and death phases per match format; every other
+# over is in the powerplay. Formats without fielding restrictions (e.g. Tests) have no phases.
+PHASE_OVERS = {"ODI": (10, 40), "ODM": (10, 40), "T20": (6, 15), "IT20": (6, 15)}
 
-        # Create matches table with UUID primary key
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS matches (
-            match_id UUID PRIMARY KEY DEFAULT uuid(),
-            balls_per_over INTEGER DEFAULT 6,
-            city TEXT,
-            date TEXT, -- Array of dates
-            event_name TEXT,
-            event_match_number INTEGER,
-            event_group TEXT,
-            event_stage TEXT,
-            gender TEXT NOT NULL,
-            match_type TEXT NOT NULL, -- Test, ODI, T20, etc.
-            match_type_number INTEGER,
-            outcome_winner TEXT,
-            outcome_by TEXT, -- JSON string for by object
-            outcome_method TEXT, -- D/L, VJD, etc.
-            outcome_result TEXT, -- draw, tie, no result
-            outcome_eliminator TEXT, -- super over winner
-            overs INTEGER,
-            player_of_match TEXT[], -- Array of players
-            season TEXT NOT NULL,
-            team_type TEXT NOT NULL, -- international or club
-            team_1 TEXT NOT NULL,
-            team_2 TEXT NOT NULL,
-            toss_winner TEXT NOT NULL,
-            toss_decision TEXT NOT NULL,
-            toss_uncontested BOOLEAN DEFAULT FALSE,
-            venue TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """)
+# Derived per-delivery columns, running totals kept as deliveries are flattened (see flatten.innings_rows)
+BALL_STATE_COLUMNS = {
+    "innings_runs": "INTEGER",  # team score after this delivery
+    "innings_wickets": "INTEGER",  # wickets fallen after this delivery, retired hurt/not out excluded
+    "legal_ball": "INTEGER",  # legal deliveries bowled in the innings so far, this one included
+    "phase": "TEXT",  # powerplay, middle or death in limited-overs matches
+}
 
-        # Create innings table with auto-incrementing ID and UUID foreign key
-        conn.execute("""
-        CREATE SEQUENCE IF NOT EXISTS innings_id_seq;
-        """)
 
-        conn.execute("""
+def table_exists(conn, table: str) -> bool:
+    return conn.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = ? AND table_type = 'BASE TABLE'",
+        [table]
+    ).fetchone()[0] > 0
+
+
+def is_compact(conn) -> bool:
+    """Whether the database uses the compact schema (see create_compact_schema)."""
+    return table_exists(conn, "innings_fact")
+
+
+def innings_table(conn) -> str:
+    """The physical table holding deliveries."""
+    return "innings_fact" if is_compact(conn) else "innings"
+
+
+def create_compact_schema(conn, bulk=False):
+    """Create the dictionary-encoded variant of the innings table.
+
+    Deliveries are stored in innings_fact with integer surrogate keys into dim_players
+    and dim_teams instead of repeating player and team names on every row, and matches
+    gain team and venue keys. An innings view decodes the keys back into the original
+    column names, so queries written against innings keep working. bulk defers the
+    keys of innings_fact, as in create_schema.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS dim_players (
+        player_key INTEGER PRIMARY KEY,
+        player_id TEXT NOT NULL UNIQUE, -- registry id, or the name when the registry has none
+        player_name TEXT NOT NULL
+    );
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS dim_teams (
+        team_key INTEGER PRIMARY KEY,
+        team TEXT NOT NULL UNIQUE
+    );
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS dim_venues (
+        venue_key INTEGER PRIMARY KEY,
+        venue TEXT NOT NULL UNIQUE
+    );
+    """)
+
+    conn.execute("ALTER TABLE matches ADD COLUMN IF NOT EXISTS team_1_key INTEGER;")
+    conn.execute("ALTER TABLE matches ADD COLUMN IF NOT EXISTS team_2_key INTEGER;")
+    conn.execute("ALTER TABLE matches ADD COLUMN IF NOT EXISTS venue_key INTEGER;")
+
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS innings_fact (
+        innings_id INTEGER {"" if bulk else "PRIMARY KEY"} DEFAULT nextval('innings_id_seq'),
+        match_id UUID,
+        match_date DATE, -- copy of matches.date; rows are kept in this order
+        innings_number INTEGER,
+        team_key INTEGER NOT NULL,
+        over INTEGER,
+        ball INTEGER,
+        batter_key INTEGER NOT NULL,
+        bowler_key INTEGER NOT NULL,
+        non_striker_key INTEGER NOT NULL,
+        runs_batter INTEGER DEFAULT 0,
+        runs_extras INTEGER DEFAULT 0,
+        runs_total INTEGER DEFAULT 0,
+        runs_non_boundary BOOLEAN DEFAULT FALSE,
+        extras_byes INTEGER,
+        extras_legbyes INTEGER,
+        extras_noballs INTEGER,
+        extras_penalty INTEGER,
+        extras_wides INTEGER,
+        wicket_type TEXT,
+        player_out_key INTEGER,
+        fielder_keys INTEGER[], -- Array of fielders involved
+        declared BOOLEAN DEFAULT FALSE,
+        forfeited BOOLEAN DEFAULT FALSE,
+        super_over BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        innings_runs INTEGER,
+        innings_wickets INTEGER,
+        legal_ball INTEGER,
+        phase TEXT
+        {"" if bulk else ", FOREIGN KEY (match_id) REFERENCES matches(match_id)"}
+    );
+    """)
+    add_ball_state(conn, "innings_fact")
+
+    # Compatibility view with the column names of the plain innings table
+    conn.execute("""
+    CREATE OR REPLACE VIEW innings AS
+    SELECT
+        f.innings_id,
+        f.match_id,
+        f.match_date,
+        f.innings_number,
+        t.team,
+        f.over,
+        f.ball,
+        batter.player_name AS batter,
+        bowler.player_name AS bowler,
+        non_striker.player_name AS non_striker,
+        f.runs_batter,
+        f.runs_extras,
+        f.runs_total,
+        f.runs_non_boundary,
+        f.extras_byes,
+        f.extras_legbyes,
+        f.extras_noballs,
+        f.extras_penalty,
+        f.extras_wides,
+        f.wicket_type,
+        player_out.player_name AS player_out,
+        CASE WHEN len(f.fielder_keys) = 0 THEN []::TEXT[] ELSE (
+            SELECT list(p.player_name ORDER BY u.position)
+            FROM (SELECT unnest(f.fielder_keys) AS player_key,
+                         unnest(range(len(f.fielder_keys))) AS position) u
+            JOIN dim_players p ON p.player_key = u.player_key
+        ) END AS fielders,
+        f.declared,
+        f.forfeited,
+        f.super_over,
+        f.created_at,
+        f.innings_runs,
+        f.innings_wickets,
+        f.legal_ball,
+        f.phase
+    FROM innings_fact f
+    JOIN dim_teams t ON t.team_key = f.team_key
+    JOIN dim_players batter ON batter.player_key = f.batter_key
+    JOIN dim_players bowler ON bowler.player_key = f.bowler_key
+    JOIN dim_players non_striker ON non_striker.player_key = f.non_striker_key
+    LEFT JOIN dim_players player_out ON player_out.player_key = f.player_out_key;
+    """)
+
+
+def create_schema(conn, compact=False, bulk=False):
+    """Create any missing tables. compact uses the dictionary-encoded innings schema.
+
+    bulk creates the tables of a bulk load: deliveries, players, match_players and
+    officials without their primary and foreign keys, which finish_bulk_load
+    checks and builds once every row is in.
+    """
+    # Create matches table with UUID primary key
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS matches (
+        match_id UUID PRIMARY KEY DEFAULT uuid(),
+        balls_per_over INTEGER DEFAULT 6,
+        city TEXT,
+        date DATE, -- First day of the match
+        year INTEGER, -- Calendar year of date
+        event_name TEXT,
+        event_match_number INTEGER,
+        event_group TEXT,
+        event_stage TEXT,
+        gender TEXT NOT NULL,
+        match_type TEXT NOT NULL, -- Test, ODI, T20, etc.
+        match_type_number INTEGER,
+        outcome_winner TEXT,
+        outcome_by TEXT, -- JSON string for by object
+        outcome_method TEXT, -- D/L, VJD, etc.
+        outcome_result TEXT, -- draw, tie, no result
+        outcome_eliminator TEXT, -- super over winner
+        overs INTEGER,
+        player_of_match TEXT[], -- Array of players
+        season TEXT NOT NULL, -- e.g. 2019 or 2018/19
+        team_type TEXT NOT NULL, -- international or club
+        team_1 TEXT NOT NULL,
+        team_2 TEXT NOT NULL,
+        toss_winner TEXT NOT NULL,
+        toss_decision TEXT NOT NULL,
+        toss_uncontested BOOLEAN DEFAULT FALSE,
+        venue TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+    # Create innings table with auto-incrementing ID and UUID foreign key
+    conn.execute("""
+    CREATE SEQUENCE IF NOT EXISTS innings_id_seq;
+    """)
+
+    if not compact:
+        conn.execute(f"""
         CREATE TABLE IF NOT EXISTS innings (
-            innings_id INTEGER PRIMARY KEY DEFAULT nextval('innings_id_seq'),
+            innings_id INTEGER {"" if bulk else "PRIMARY KEY"} DEFAULT nextval('innings_id_seq'),
             match_id UUID,
+            match_date DATE, -- copy of matches.date; rows are kept in this order
             innings_number INTEGER,
             team TEXT NOT NULL,
             over INTEGER,
@@ -84,44 +238,472 @@ def initialize_db(db_file):
             forfeited BOOLEAN DEFAULT FALSE,
             super_over BOOLEAN DEFAULT FALSE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (match_id) REFERENCES matches(match_id)
+            innings_runs INTEGER, -- team score after this delivery
+            innings_wickets INTEGER, -- wickets fallen after this delivery
+            legal_ball INTEGER, -- legal deliveries bowled in the innings so far, this one included
+            phase TEXT -- powerplay, middle or death; NULL without phases (e.g. Tests)
+            {"" if bulk else ", FOREIGN KEY (match_id) REFERENCES matches(match_id)"}
         );
         """)
+        add_ball_state(conn, "innings")
+
+    # Create players table
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS players (
+        player_id TEXT {"" if bulk else "PRIMARY KEY"},
+        player_name TEXT NOT NULL,
+        registry_id TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+    # Create match_players junction table with UUID foreign key
+    match_player_keys = "" if bulk else """,
+        PRIMARY KEY (match_id, player_id),
+        FOREIGN KEY (match_id) REFERENCES matches(match_id),
+        FOREIGN KEY (player_id) REFERENCES players(player_id)"""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS match_players (
+        match_id UUID,
+        player_id TEXT,
+        team TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{match_player_keys}
+    );
+    """)
+
+    # Create officials table with UUID foreign key
+    official_keys = "" if bulk else """,
+        PRIMARY KEY (match_id, official_name, role),
+        FOREIGN KEY (match_id) REFERENCES matches(match_id)"""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS officials (
+        match_id UUID,
+        official_name TEXT,
+        role TEXT, -- match_referee, umpire, tv_umpire, reserve_umpire
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{official_keys}
+    );
+    """)
+
+    if compact:
+        create_compact_schema(conn, bulk)
 
-        # Create players table
+    # Create ingestion manifest: one row per source file, replaced when its content changes
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+        source_file TEXT PRIMARY KEY, -- match file name inside the Cricsheet archive
+        content_hash TEXT NOT NULL, -- sha256 of the raw JSON
+        match_id UUID NOT NULL,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        archive TEXT, -- source archive the file was loaded from, e.g. odis or t20s
+        innings_skipped INTEGER -- innings left out because they failed validation
+    );
+    """)
+    # Manifests written before archives were tagged, or before skipped innings were counted
+    conn.execute("ALTER TABLE ingest_manifest ADD COLUMN IF NOT EXISTS archive TEXT;")
+    conn.execute("ALTER TABLE ingest_manifest ADD COLUMN IF NOT EXISTS innings_skipped INTEGER;")
+
+    # Files that could not be loaded, with the reason; cleared when the file later loads
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_quarantine (
+        source_file TEXT PRIMARY KEY, -- match file name inside the Cricsheet archive
+        content_hash TEXT NOT NULL,
+        reason TEXT NOT NULL, -- e.g. invalid_info, constraint, error
+        error TEXT,
+        quarantined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+    # One row, bumped by every ingestion commit; cached query results from an older version are stale.
+    # It starts at the creation time in microseconds, so a recreated database never reuses old versions.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS data_version (
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    conn.execute("""
+    INSERT INTO data_version (version)
+    SELECT epoch_us(CURRENT_TIMESTAMP) WHERE NOT EXISTS (SELECT * FROM data_version);
+    """)
+
+    create_summary_schema(conn)
+
+
+def add_ball_state(conn, deliveries: str) -> None:
+    """Add the derived ball-state columns to a deliveries table created before they existed, and fill them."""
+    existing = {row[0] for row in conn.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?", [deliveries]
+    ).fetchall()}
+    if set(BALL_STATE_COLUMNS) <= existing:
+        return
+    logging.info(f"Adding ball-state columns to {deliveries}")
+    for column, data_type in BALL_STATE_COLUMNS.items():
+        conn.execute(f"ALTER TABLE {deliveries} ADD COLUMN IF NOT EXISTS {column} {data_type};")
+    backfill_ball_state(conn, deliveries)
+
+
+def backfill_ball_state(conn, deliveries: str) -> int:
+    """Compute the ball-state columns of stored deliveries with window functions. Returns rows updated.
+
+    Matches the values computed at ingestion, except that only the first wicket of
+    a delivery is stored, so a delivery with two wickets counts one here.
+    """
+    phase_cases = "\n            ".join(
+        f"WHEN m.match_type = '{match_type}' THEN "
+        f"CASE WHEN d.over < {middle} THEN 'powerplay' WHEN d.over < {death} THEN 'middle' ELSE 'death' END"
+        for match_type, (middle, death) in PHASE_OVERS.items()
+    )
+    return conn.execute(f"""
+    UPDATE {deliveries} SET
+        innings_runs = s.innings_runs,
+        innings_wickets = s.innings_wickets,
+        legal_ball = s.legal_ball,
+        phase = s.phase
+    FROM (
+        SELECT
+            d.innings_id,
+            sum(d.runs_total) OVER innings AS innings_runs,
+            count(*) FILTER (WHERE d.wicket_type NOT IN ('retired hurt', 'retired not out')) OVER innings
+                AS innings_wickets,
+            count(*) FILTER (WHERE d.extras_wides IS NULL AND d.extras_noballs IS NULL) OVER innings
+                AS legal_ball,
+            CASE WHEN d.super_over THEN NULL
+            {phase_cases}
+            END AS phase
+        FROM {deliveries} d
+        JOIN matches m USING (match_id)
+        WINDOW innings AS (PARTITION BY d.match_id, d.innings_number ORDER BY d.over, d.ball
+                           ROWS UNBOUNDED PRECEDING)
+    ) s
+    WHERE {deliveries}.innings_id = s.innings_id;
+    """).fetchone()[0]
+
+
+def bump_data_version(conn) -> int:
+    """Record that the data changed, inside the transaction changing it. Returns the new version."""
+    return conn.execute("""
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    RETURNING version;
+    """).fetchone()[0]
+
+
+def create_summary_schema(conn):
+    """Create the summary tables maintained by summaries.py as chunks commit."""
+    # Summaries from before match formats were kept apart are derived data: drop
+    # them, and the next ingest rebuilds them from the base tables
+    if table_exists(conn, "team_results") and not conn.execute(
+        "SELECT count(*) FROM information_schema.columns WHERE table_name = 'team_results' AND column_name = 'match_type'"
+    ).fetchone()[0]:
+        for table in ("team_results", "batter_match_stats", "bowler_match_stats"):
+            conn.execute(f"DROP TABLE {table};")
+
+    # Win records per team, year and format, over decided matches not settled by D/L
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS team_results (
+        team TEXT,
+        year INTEGER,
+        gender TEXT,
+        match_type TEXT, -- ODI, T20, Test, ...
+        matches INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        PRIMARY KEY (team, year, gender, match_type)
+    );
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS batter_match_stats (
+        match_id UUID,
+        batter TEXT,
+        match_date DATE,
+        year INTEGER,
+        gender TEXT,
+        match_type TEXT,
+        balls_faced INTEGER, -- excludes wides
+        runs INTEGER,
+        fours INTEGER,
+        sixes INTEGER,
+        dismissals INTEGER, -- excludes retired hurt and retired not out
+        PRIMARY KEY (match_id, batter)
+    );
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS bowler_match_stats (
+        match_id UUID,
+        bowler TEXT,
+        match_date DATE,
+        year INTEGER,
+        gender TEXT,
+        match_type TEXT,
+        balls INTEGER, -- legal deliveries
+        runs_conceded INTEGER, -- runs off the bat plus wides and no balls
+        wickets INTEGER, -- bowled, caught, lbw, stumped and hit wicket only
+        PRIMARY KEY (match_id, bowler)
+    );
+    """)
+
+
+def needs_migration(conn) -> bool:
+    """Whether the database predates the typed match date columns."""
+    return table_exists(conn, "matches") and not conn.execute(
+        "SELECT count(*) FROM information_schema.columns WHERE table_name = 'matches' AND column_name = 'year'"
+    ).fetchone()[0]
+
+
+# Column order deliveries are stored in, so zone maps on match_date prune row groups
+DELIVERY_ORDER = "match_date, match_id, innings_id"
+
+
+def _set_aside(conn, tables) -> None:
+    """Copy tables to <table>_old and drop them, children before parents."""
+    if is_compact(conn):
+        conn.execute("DROP VIEW IF EXISTS innings;")
+    for table in tables:
+        conn.execute(f"CREATE TABLE {table}_old AS SELECT * FROM {table};")
+        conn.execute(f"DROP TABLE {table};")
+
+
+def migrate_schema(conn):
+    """Move a database created before the typed date columns to the current schema.
+
+    matches.date becomes a DATE with a derived year, and deliveries gain match_date
+    and are rewritten in date order. DuckDB cannot alter a column of a table that
+    foreign keys point at, so matches and its child tables are copied aside,
+    recreated and filled back in one transaction.
+    """
+    compact = is_compact(conn)
+    deliveries = innings_table(conn)
+    children = tuple(table for table in (deliveries, "match_players", "officials") if table_exists(conn, table))
+    conn.execute("BEGIN")
+    try:
+        _set_aside(conn, children + ("matches",))
+        create_schema(conn, compact)
         conn.execute("""
-        CREATE TABLE IF NOT EXISTS players (
-            player_id TEXT PRIMARY KEY,
-            player_name TEXT NOT NULL,
-            registry_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+        INSERT INTO matches BY NAME
+        SELECT * REPLACE (date::DATE AS date), year(date::DATE) AS year
+        FROM matches_old;
+        """)
+        conn.execute(f"""
+        INSERT INTO {deliveries} BY NAME
+        SELECT d.*, m.date::DATE AS match_date
+        FROM {deliveries}_old d
+        JOIN matches_old m USING (match_id)
+        ORDER BY {DELIVERY_ORDER};
         """)
+        backfill_ball_state(conn, deliveries)
+        for table in children[1:]:
+            conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {table}_old;")
+        for table in children + ("matches",):
+            conn.execute(f"DROP TABLE {table}_old;")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
 
-        # Create match_players junction table with UUID foreign key
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS match_players (
-            match_id UUID,
-            player_id TEXT,
-            team TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (match_id, player_id),
-            FOREIGN KEY (match_id) REFERENCES matches(match_id),
-            FOREIGN KEY (player_id) REFERENCES players(player_id)
-        );
+
+def unmanifested_matches(conn) -> int:
+    """Matches with no ingest_manifest row: loaded before the manifest existed, under
+    random match ids and with no record of their source file, so a later load cannot
+    replace them and would add each match again."""
+    return conn.execute("""
+    SELECT count(*) FROM matches
+    WHERE match_id NOT IN (SELECT match_id FROM ingest_manifest);
+    """).fetchone()[0]
+
+
+def drop_unmanifested(conn) -> int:
+    """Delete the matches unmanifested_matches counts, with their child and per-match
+    summary rows, so they can be loaded again from the archive. team_results is left
+    to the caller. Returns the matches deleted.
+
+    The child rows are committed first, as in manifest.release_matches: DuckDB cannot
+    delete a row whose references were removed in the same transaction.
+    """
+    unmanifested = "SELECT match_id FROM matches WHERE match_id NOT IN (SELECT match_id FROM ingest_manifest)"
+    tables = (innings_table(conn), "match_players", "officials", "batter_match_stats", "bowler_match_stats")
+    conn.execute("BEGIN")
+    try:
+        for table in tables:
+            conn.execute(f"DELETE FROM {table} WHERE match_id IN ({unmanifested});")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.execute(f"DELETE FROM matches WHERE match_id IN ({unmanifested});").fetchone()[0]
+
+
+def recluster_innings(conn) -> int:
+    """Rewrite deliveries in match date order. Returns the number of rows rewritten.
+
+    Chunks are sorted as they load, but incremental runs and reloaded matches append
+    out of order over time; this restores one ordering across the whole table.
+    """
+    compact = is_compact(conn)
+    deliveries = innings_table(conn)
+    conn.execute("BEGIN")
+    try:
+        _set_aside(conn, (deliveries,))
+        create_schema(conn, compact)
+        conn.execute(f"""
+        INSERT INTO {deliveries} BY NAME
+        SELECT * FROM {deliveries}_old
+        ORDER BY {DELIVERY_ORDER};
         """)
+        rows = conn.execute(f"SELECT count(*) FROM {deliveries}").fetchone()[0]
+        conn.execute(f"DROP TABLE {deliveries}_old;")
+        conn.execute("COMMIT")
+        return rows
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
 
-        # Create officials table with UUID foreign key
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS officials (
-            match_id UUID,
-            official_name TEXT,
-            role TEXT, -- match_referee, umpire, tv_umpire, reserve_umpire
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (match_id, official_name, role),
-            FOREIGN KEY (match_id) REFERENCES matches(match_id)
-        );
+
+# Primary keys a bulk load defers (see create_schema), besides innings_id of the deliveries
+BULK_KEYS = {
+    "players": ("player_id",),
+    "match_players": ("match_id", "player_id"),
+    "officials": ("match_id", "official_name", "role"),
+}
+
+# Foreign keys a bulk load leaves out, as (table, column, parent, parent column), besides
+# match_id of the deliveries
+BULK_REFERENCES = (
+    ("match_players", "match_id", "matches", "match_id"),
+    ("match_players", "player_id", "players", "player_id"),
+    ("officials", "match_id", "matches", "match_id"),
+)
+
+
+class IntegrityError(Exception):
+    """Rows of a bulk load that the keys it deferred would refuse."""
+
+
+def bulk_loading(conn) -> bool:
+    """Whether the database holds a bulk load whose keys are not built yet."""
+    deliveries = innings_table(conn)
+    return table_exists(conn, deliveries) and not conn.execute("""
+    SELECT count(*) FROM duckdb_constraints()
+    WHERE database_name = current_database() AND schema_name = 'main' AND table_name = ?
+        AND constraint_type = 'PRIMARY KEY';
+    """, [deliveries]).fetchone()[0]
+
+
+def _key_text(columns) -> str:
+    return "'(' || concat_ws(', ', " + ", ".join(f"coalesce({column}::TEXT, 'NULL')" for column in columns) + ") || ')'"
+
+
+def integrity_problems(conn) -> List[str]:
+    """Check a bulk load against the keys it deferred, in one query. Returns a line per failed check.
+
+    Finds NULL and duplicate primary keys, and rows whose foreign key has no
+    parent row, with a count and a few examples of each.
+    """
+    deliveries = innings_table(conn)
+    keys = {deliveries: ("innings_id",), **BULK_KEYS}
+    references = ((deliveries, "match_id", "matches", "match_id"),) + BULK_REFERENCES
+    checks = []
+    for table, columns in keys.items():
+        key_list = ", ".join(columns)
+        null_key = " OR ".join(f"{column} IS NULL" for column in columns)
+        checks.append(f"""
+        SELECT '{table} rows with a NULL key ({key_list})' AS problem, count(*) AS rows,
+               list({_key_text(columns)})[1:5] AS examples
+        FROM {table} WHERE {null_key}
         """)
+        checks.append(f"""
+        SELECT 'duplicate {table} keys ({key_list})', count(*), list(example ORDER BY example)[1:5]
+        FROM (
+            SELECT {_key_text(columns)} AS example FROM {table}
+            WHERE NOT ({null_key})
+            GROUP BY {key_list} HAVING count(*) > 1
+        )
+        """)
+    for table, column, parent, parent_column in references:
+        checks.append(f"""
+        SELECT '{table} rows whose {column} is not in {parent}', count(*),
+               list(DISTINCT t.{column}::TEXT ORDER BY t.{column}::TEXT)[1:5]
+        FROM {table} t ANTI JOIN {parent} p ON p.{parent_column} = t.{column}
+        WHERE t.{column} IS NOT NULL
+        """)
+    rows = conn.execute(f"""
+    SELECT problem, rows, examples FROM ({" UNION ALL ".join(checks)})
+    WHERE rows > 0;
+    """).fetchall()
+    return [f"{problem}: {count} (e.g. {', '.join(examples)})" for problem, count, examples in rows]
+
+
+def _bulk_tables(conn) -> Tuple[str, ...]:
+    """The tables a bulk load creates without keys, parents before children."""
+    return ("players", innings_table(conn), "match_players", "officials")
+
+
+def finish_bulk_load(conn) -> Dict[str, Tuple[str, ...]]:
+    """Check a bulk load and rebuild its tables with every key, in one transaction.
+
+    Raises IntegrityError listing every failed check, and leaves the tables as
+    they are to be fixed and finished again. DuckDB cannot add a foreign key to
+    an existing table, so the unkeyed tables are renamed aside, created again
+    with their primary and foreign keys, and filled with one INSERT ... SELECT
+    each. Returns the primary keys built per table.
+    """
+    compact = is_compact(conn)
+    tables = _bulk_tables(conn)
+    keys = {innings_table(conn): ("innings_id",), **BULK_KEYS}
+    conn.execute("BEGIN")
+    try:
+        problems = integrity_problems(conn)
+        if problems:
+            raise IntegrityError("\n".join(problems))
+        if compact:
+            conn.execute("DROP VIEW IF EXISTS innings;")
+        for table in tables:
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_bulk;")
+        create_schema(conn, compact)
+        for table in tables:
+            conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {table}_bulk;")
+        for table in reversed(tables):
+            conn.execute(f"DROP TABLE {table}_bulk;")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    logging.info(f"Bulk load checked; rebuilt {', '.join(tables)} with their primary and foreign keys")
+    return keys
+
+
+def _unkey_empty(conn, db_file) -> None:
+    """Recreate the keyed tables of an empty database (e.g. from --initialize) for a bulk load."""
+    tables = _bulk_tables(conn)
+    if any(conn.execute(f"SELECT EXISTS (SELECT 1 FROM {table})").fetchone()[0] for table in tables + ("matches",)):
+        raise ValueError(f"{db_file} already holds data with its keys; a bulk load needs a new or empty database")
+    if is_compact(conn):
+        conn.execute("DROP VIEW IF EXISTS innings;")
+    for table in reversed(tables):
+        conn.execute(f"DROP TABLE {table};")
+
+
+def initialize_db(db_file, compact=False, bulk=False):
+    """Initialize the database schema and return connection.
+
+    compact creates the dictionary-encoded innings schema; an existing compact
+    database is always kept compact. bulk creates the tables of a bulk load,
+    which needs a new or empty database, and an unfinished bulk load keeps them.
+    Databases from before the typed date columns are migrated first.
+    """
+    try:
+        # Connect to database (will create if doesn't exist)
+        conn = duckdb.connect(db_file)
+        if table_exists(conn, "innings") and not is_compact(conn) and compact:
+            raise ValueError(f"{db_file} already uses the plain innings table; compact needs a new database")
+        compact = compact or is_compact(conn)
+        if bulk and table_exists(conn, innings_table(conn)) and not bulk_loading(conn):
+            _unkey_empty(conn, db_file)
+        bulk = bulk or bulk_loading(conn)
+
+        if needs_migration(conn):
+            logging.info(f"Migrating {db_file} to typed match dates")
+            migrate_schema(conn)
+        create_schema(conn, compact, bulk)
 
         logging.info(f"Successfully initialized database at {db_file}")
         return conn
@@ -132,11 +714,43 @@ def initialize_db(db_file):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Database utility script")
     parser.add_argument("--initialize", help="Initialize the database schema", type=str)
+    parser.add_argument("--compact", action="store_true",
+                        help="Store deliveries with integer player/team keys behind an innings view")
+    parser.add_argument("--recluster", metavar="DB_FILE",
+                        help="Rewrite deliveries in match date order (run after many incremental loads)")
+    parser.add_argument("--finish-bulk", metavar="DB_FILE",
+                        help="Check an unfinished bulk load and build its keys (ingest.py --bulk does this itself)")
     args = parser.parse_args()
 
+    if args.finish_bulk:
+        try:
+            conn = initialize_db(args.finish_bulk)
+            if bulk_loading(conn):
+                finish_bulk_load(conn)
+                print("Bulk load checked and its keys built.")
+            else:
+                print("No unfinished bulk load.")
+            conn.close()
+        except IntegrityError as e:
+            print(f"Bulk load failed its integrity checks:\n{e}")
+            exit(1)
+        except Exception as e:
+            print(f"Failed to finish bulk load: {e}")
+            exit(1)
+
+    if args.recluster:
+        try:
+            conn = initialize_db(args.recluster)
+            rows = recluster_innings(conn)
+            print(f"Reclustered {rows} deliveries.")
+            conn.close()
+        except Exception as e:
+            print(f"Failed to recluster database: {e}")
+            exit(1)
+
     if args.initialize:
         try:
-            conn = initialize_db(args.initialize)
+            conn = initialize_db(args.initialize, compact=args.compact)
             print("Database initialized successfully.")
             conn.close()
         except Exception as e:
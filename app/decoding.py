@@ -0,0 +1,59 @@
+# app/decoding.py
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Preferred first; "auto" picks the first one installed
+BACKENDS = ("msgspec", "orjson", "json")
+
+_LOADS: Dict[str, Optional[Callable[[bytes], Any]]] = {
+    "msgspec": msgspec.json.decode if msgspec else None,
+    "orjson": orjson.loads if orjson else None,
+    "json": json.loads,
+}
+
+_backend = "json"
+
+
+def available_backends() -> List[str]:
+    return [name for name in BACKENDS if _LOADS[name] is not None]
+
+
+def set_backend(name: str = "auto") -> str:
+    """Select the JSON decoder used by this process. Returns the backend chosen.
+
+    With msgspec, match validation also decodes straight into typed structs in a
+    single pass (see structs.py) instead of going through pydantic.
+    """
+    global _backend
+    if name == "auto":
+        name = available_backends()[0]
+    elif _LOADS.get(name) is None:
+        raise ValueError(f"JSON backend {name!r} is not installed (available: {', '.join(available_backends())})")
+    _backend = name
+    logging.debug(f"Using {name} to decode match JSON")
+    return name
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def loads(raw: bytes) -> Any:
+    """Decode JSON to plain Python objects with the selected backend."""
+    return _LOADS[_backend](raw)
+
+
+def typed_decoding() -> bool:
+    """Whether matches are decoded and validated in one pass into msgspec structs."""
+    return _backend == "msgspec"
@@ -0,0 +1,133 @@
+# app/dimensions.py
+import pyarrow as pa
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from db_utils import BALL_STATE_COLUMNS, is_compact
+from flatten import MATCH_COLUMNS, INNINGS_COLUMNS, MatchRows
+
+COMPACT_MATCH_COLUMNS = MATCH_COLUMNS + ("team_1_key", "team_2_key", "venue_key")
+
+FACT_COLUMNS = (
+    "match_id", "match_date", "innings_number", "team_key", "over", "ball",
+    "batter_key", "bowler_key", "non_striker_key",
+    "runs_batter", "runs_extras", "runs_total", "runs_non_boundary",
+    "extras_byes", "extras_legbyes", "extras_noballs", "extras_penalty", "extras_wides",
+    "wicket_type", "player_out_key", "fielder_keys",
+    "declared", "forfeited", "super_over"
+) + tuple(BALL_STATE_COLUMNS)
+
+_MATCH = {column: i for i, column in enumerate(MATCH_COLUMNS)}
+_INNINGS = {column: i for i, column in enumerate(INNINGS_COLUMNS)}
+
+
+class Interner:
+    """In-memory value -> surrogate key cache for one dimension table.
+
+    Keys handed out since the last commit are pending: every flush writes them
+    until a transaction that did so commits, so the keys of a chunk that failed
+    are written by the next transaction instead.
+    """
+
+    def __init__(self, table: str, key_column: str, value_column: str, extra_columns: Sequence[str] = ()):
+        self.table = table
+        self.columns = (key_column, value_column) + tuple(extra_columns)
+        self.keys: Dict[str, int] = {}
+        self.pending: List[tuple] = []
+        self.next_key = 1
+
+    def load(self, conn) -> None:
+        rows = conn.execute(f"SELECT {self.columns[1]}, {self.columns[0]} FROM {self.table}").fetchall()
+        self.keys = dict(rows)
+        self.pending = []
+        self.next_key = max(self.keys.values(), default=0) + 1
+
+    def key(self, value: Optional[str], *extra) -> Optional[int]:
+        if value is None:
+            return None
+        key = self.keys.get(value)
+        if key is None:
+            key = self.next_key
+            self.next_key += 1
+            self.keys[value] = key
+            self.pending.append((key, value) + extra)
+        return key
+
+    def flush(self, conn) -> int:
+        """Insert the pending keys. They stay pending until commit or rollback."""
+        if not self.pending:
+            return 0
+        view = f"{self.table}_buffer"
+        column_list = ", ".join(self.columns)
+        conn.register(view, pa.table({name: list(values) for name, values in zip(self.columns, zip(*self.pending))}))
+        try:
+            conn.execute(f"INSERT INTO {self.table} ({column_list}) SELECT {column_list} FROM {view};")
+        finally:
+            conn.unregister(view)
+        return len(self.pending)
+
+    def commit(self) -> None:
+        self.pending = []
+
+
+class Dimensions:
+    """Player, team and venue interners for the compact schema, shared across chunks."""
+
+    def __init__(self):
+        self.players = Interner("dim_players", "player_key", "player_id", ("player_name",))
+        self.teams = Interner("dim_teams", "team_key", "team")
+        self.venues = Interner("dim_venues", "venue_key", "venue")
+
+    @classmethod
+    def open(cls, conn) -> Optional["Dimensions"]:
+        """Dimensions loaded from the database, or None if it does not use the compact schema."""
+        if not is_compact(conn):
+            return None
+        dimensions = cls()
+        for interner in dimensions._interners():
+            interner.load(conn)
+        return dimensions
+
+    def _interners(self) -> Tuple[Interner, ...]:
+        return self.players, self.teams, self.venues
+
+    def encode(self, rows: MatchRows) -> Tuple[tuple, Iterator[tuple]]:
+        """Key the match row and turn its delivery rows into innings_fact rows, generated lazily."""
+        match = rows.match
+        match_row = match + (
+            self.teams.key(match[_MATCH["team_1"]]),
+            self.teams.key(match[_MATCH["team_2"]]),
+            self.venues.key(match[_MATCH["venue"]]),
+        )
+
+        # Deliveries name players; the match registry maps names to player ids.
+        # Names missing from it (e.g. substitute fielders) are keyed by name.
+        player_ids = {name: player_id for player_id, name, _ in rows.players}
+        cache = {}
+
+        def player_key(name: Optional[str]) -> Optional[int]:
+            if name is None:
+                return None
+            key = cache.get(name)
+            if key is None:
+                key = cache[name] = self.players.key(player_ids.get(name, name), name)
+            return key
+
+        team, batter, bowler, non_striker, player_out, fielders = (
+            _INNINGS["team"], _INNINGS["batter"], _INNINGS["bowler"],
+            _INNINGS["non_striker"], _INNINGS["player_out"], _INNINGS["fielders"],
+        )
+        fact_rows = (
+            row[:team] + (self.teams.key(row[team]),) + row[team + 1:batter]
+            + (player_key(row[batter]), player_key(row[bowler]), player_key(row[non_striker]))
+            + row[non_striker + 1:player_out]
+            + (player_key(row[player_out]), [player_key(name) for name in row[fielders]])
+            + row[fielders + 1:]
+            for row in rows.innings
+        )
+        return match_row, fact_rows
+
+    def flush(self, conn) -> Dict[str, int]:
+        return {interner.table: interner.flush(conn) for interner in self._interners()}
+
+    def commit(self) -> None:
+        for interner in self._interners():
+            interner.commit()
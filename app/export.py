@@ -0,0 +1,107 @@
+# app/export.py
+# Parquet export of the database, and running SQL over the exported files instead of
+# the DuckDB file. Self-contained so it can run as `python -m app.export`.
+import argparse
+import logging
+import os
+import shutil
+import duckdb
+from pathlib import Path
+from typing import Dict, Tuple
+
+# Table -> (SELECT producing its rows, hive partition columns)
+EXPORTS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "matches": ("SELECT * FROM matches ORDER BY date, match_id", ("gender", "year")),
+    "innings": ("""
+        SELECT i.*, m.gender, m.year
+        FROM innings i
+        JOIN matches m ON m.match_id = i.match_id
+        ORDER BY i.match_date, i.match_id, i.innings_id
+    """, ("gender", "year")),
+    "players": ("SELECT * FROM players ORDER BY player_id", ()),
+    "match_players": ("SELECT * FROM match_players ORDER BY match_id", ()),
+    "team_results": ("SELECT * FROM team_results ORDER BY year, gender, team", ()),
+    "batter_match_stats": ("SELECT * FROM batter_match_stats ORDER BY match_date, match_id", ()),
+    "bowler_match_stats": ("SELECT * FROM bowler_match_stats ORDER BY match_date, match_id", ()),
+}
+
+# Matches DuckDB's own row group size; one (gender, year) partition of ODI
+# deliveries is roughly one row group
+ROW_GROUP_SIZE = 122_880
+
+
+def export_parquet(conn, out_dir: Path, compression: str = "zstd",
+                   row_group_size: int = ROW_GROUP_SIZE) -> Dict[str, int]:
+    """Write every exported table under out_dir/<table>/. Returns rows written per table.
+
+    The export is built in a sibling directory and swapped in when complete, so
+    readers never see a half-written export.
+    """
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    written = {}
+    for table, (select, partition_by) in EXPORTS.items():
+        options = ["FORMAT PARQUET", f"COMPRESSION {compression}", f"ROW_GROUP_SIZE {row_group_size}"]
+        if partition_by:
+            target = tmp_dir / table
+            options.append(f"PARTITION_BY ({', '.join(partition_by)})")
+        else:
+            os.makedirs(tmp_dir / table)
+            target = tmp_dir / table / "data.parquet"
+        written[table] = conn.execute(f"COPY ({select}) TO '{target}' ({', '.join(options)});").fetchone()[0]
+        logging.info(f"Exported {written[table]} {table} rows")
+
+    old_dir = out_dir.with_name(out_dir.name + ".old")
+    if out_dir.exists():
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logging.info(f"Exported Parquet files to {out_dir}")
+    return written
+
+
+def connect_parquet(parquet_dir: Path, conn=None):
+    """In-memory connection with a view per exported table over its Parquet files.
+
+    Nothing holds the database file lock, so any number of processes can query the
+    export at once; DuckDB reads only the columns and hive partitions a query needs.
+    """
+    conn = conn or duckdb.connect()
+    for table in EXPORTS:
+        files = Path(parquet_dir) / table / "**" / "*.parquet"
+        conn.execute(f"""
+        CREATE OR REPLACE VIEW {table} AS
+        SELECT * FROM read_parquet('{files}', hive_partitioning = true);
+        """)
+    return conn
+
+
+def run_query(parquet_dir: Path, sql_file: Path, conn=None) -> duckdb.DuckDBPyRelation:
+    """Run a query file from queries/ against the Parquet export."""
+    conn = connect_parquet(parquet_dir, conn)
+    return conn.sql(Path(sql_file).read_text())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Parquet export and query-over-files mode")
+    parser.add_argument("--export", metavar="DB_FILE", help="Export the database to Parquet")
+    parser.add_argument("--query", metavar="SQL_FILE", help="Run a query over the Parquet export")
+    parser.add_argument("--parquet-dir", type=Path, default=Path("export"),
+                        help="Directory holding the Parquet export (default: export)")
+    parser.add_argument("--compression", default="zstd", help="Parquet compression codec (default: zstd)")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE,
+                        help=f"Rows per Parquet row group (default: {ROW_GROUP_SIZE})")
+    args = parser.parse_args()
+    if not (args.export or args.query):
+        parser.error("nothing to do: pass --export and/or --query")
+
+    if args.export:
+        conn = duckdb.connect(args.export, read_only=True)
+        export_parquet(conn, args.parquet_dir, args.compression, args.row_group_size)
+        conn.close()
+    if args.query:
+        run_query(args.parquet_dir, args.query).show()
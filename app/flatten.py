@@ -0,0 +1,337 @@
+# app/flatten.py
+import json
+import logging
+import time
+import uuid
+import decoding
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from preprocessing import InfoModel, InningsModel, ValidatedMatch
+from db_utils import BALL_STATE_COLUMNS, PHASE_OVERS
+
+# Column order of the rows produced below. Shared by the row-wise and columnar loaders.
+MATCH_COLUMNS = (
+    "match_id", "balls_per_over", "city", "date", "year", "event_name", "event_match_number",
+    "event_group", "event_stage", "gender", "match_type", "match_type_number",
+    "outcome_winner", "outcome_by", "outcome_method", "outcome_result", "outcome_eliminator",
+    "overs", "player_of_match", "season", "team_type", "team_1", "team_2",
+    "toss_winner", "toss_decision", "toss_uncontested", "venue"
+)
+
+PLAYER_COLUMNS = ("player_id", "player_name", "registry_id")
+
+MATCH_PLAYER_COLUMNS = ("match_id", "player_id", "team")
+
+INNINGS_COLUMNS = (
+    "match_id", "match_date", "innings_number", "team", "over", "ball",
+    "batter", "bowler", "non_striker",
+    "runs_batter", "runs_extras", "runs_total", "runs_non_boundary",
+    "extras_byes", "extras_legbyes", "extras_noballs", "extras_penalty", "extras_wides",
+    "wicket_type", "player_out", "fielders",
+    "declared", "forfeited", "super_over"
+) + tuple(BALL_STATE_COLUMNS)
+
+# Dismissals that do not count as a wicket fallen
+NOT_OUT_DISMISSALS = ("retired hurt", "retired not out")
+
+
+# Namespace of the match ids derived from Cricsheet match ids (see match_uuid)
+MATCH_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://cricsheet.org/matches/")
+
+
+def match_uuid(source: str) -> str:
+    """Deterministic match_id for a Cricsheet match file: a UUIDv5 of its match id (the file name stem).
+
+    The same match gets the same id in every archive, on every run and in every
+    writer process, so ids are known before anything is inserted. Rows without a
+    source file (e.g. flattened for a benchmark) get a random id.
+    """
+    if not source:
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(MATCH_NAMESPACE, PurePosixPath(source).stem))
+
+
+def first_match_date(info: InfoModel) -> Optional[str]:
+    """First day of the match as an ISO date string."""
+    return info.dates[0] if info.dates else None
+
+
+def match_values(info: InfoModel) -> Tuple[Any, ...]:
+    """Values for a matches row, in MATCH_COLUMNS order without the match_id."""
+    event = info.event
+    outcome = info.outcome
+    toss = info.toss
+    outcome_by = json.dumps(outcome.by) if outcome and outcome.by else None
+
+    # Get first date from dates array
+    match_date = first_match_date(info)
+
+    return (
+        info.balls_per_over,
+        info.city,
+        match_date,
+        int(match_date[:4]) if match_date else None,
+        event.name if event else None,
+        event.match_number if event else None,
+        event.group if event else None,
+        event.stage if event else None,
+        info.gender,
+        info.match_type,
+        None,
+        outcome.winner if outcome else None,
+        outcome_by,
+        outcome.method if outcome else None,
+        outcome.result if outcome else None,
+        outcome.eliminator if outcome else None,
+        info.overs,
+        info.player_of_match,
+        str(info.season),
+        info.team_type,
+        info.teams[0] if info.teams else "unknown",
+        info.teams[1] if len(info.teams) > 1 else "unknown",
+        toss.winner if toss else "unknown",
+        toss.decision if toss else "unknown",
+        toss.uncontested if toss else False,
+        info.venue
+    )
+
+
+def player_rows(info: InfoModel, match_id: Any) -> Tuple[List[tuple], List[tuple]]:
+    """Rows for the players and match_players tables."""
+    player_data = []
+    match_player_data = []
+    people = info.registry.get("people", {})
+    for team, players in (info.players or {}).items():
+        for player in players:
+            registry_id = people.get(player)
+            player_data.append((registry_id or player, player, registry_id))
+            match_player_data.append((match_id, registry_id or player, team))
+    return player_data, match_player_data
+
+
+def phase(over: int, match_type: Optional[str], super_over: Optional[bool] = False) -> Optional[str]:
+    """powerplay, middle or death for a (0-based) over, or None for formats without phases."""
+    bounds = None if super_over else PHASE_OVERS.get(match_type)
+    if not bounds:
+        return None
+    middle, death = bounds
+    return "powerplay" if over < middle else "middle" if over < death else "death"
+
+
+def innings_rows(innings: List[InningsModel], match_id: Any, match_date: Optional[str] = None,
+                 match_type: Optional[str] = None) -> Iterator[tuple]:
+    """One row per delivery, in INNINGS_COLUMNS order, generated as they are read.
+
+    The match date is repeated on every delivery so the innings table can be kept
+    in date order and filtered by date without joining matches. The ball-state
+    columns (score, wickets fallen and legal balls so far, and the phase) are
+    running totals kept in the same pass.
+    """
+    for innings_num, inning in enumerate(innings, 1):
+        score = fallen = legal_balls = 0
+        for over in inning.overs:
+            over_phase = phase(over.over, match_type, inning.super_over)
+            for ball_num, delivery in enumerate(over.deliveries, 1):
+                wicket = delivery.wickets[0] if delivery.wickets else None
+                fielders = [f.name for f in wicket.fielders] if wicket and wicket.fielders else []
+                extras = delivery.extras
+                score += delivery.runs.total
+                if wicket:
+                    fallen += sum(w.kind not in NOT_OUT_DISMISSALS for w in delivery.wickets)
+                if not extras or (extras.wides is None and extras.noballs is None):
+                    legal_balls += 1
+
+                yield (
+                    match_id,
+                    match_date,
+                    innings_num,
+                    inning.team,
+                    over.over,
+                    ball_num,
+                    delivery.batter,
+                    delivery.bowler,
+                    delivery.non_striker,
+                    delivery.runs.batter,
+                    delivery.runs.extras,
+                    delivery.runs.total,
+                    delivery.runs.non_boundary,
+                    extras.byes if extras else None,
+                    extras.legbyes if extras else None,
+                    extras.noballs if extras else None,
+                    extras.penalty if extras else None,
+                    extras.wides if extras else None,
+                    wicket.kind if wicket else None,
+                    wicket.player_out if wicket else None,
+                    fielders,
+                    inning.declared,
+                    inning.forfeited,
+                    inning.super_over,
+                    score,
+                    fallen,
+                    legal_balls,
+                    over_phase
+                )
+
+
+def trusted_innings_rows(innings: List[Dict[str, Any]], match_id: Any,
+                         match_date: Optional[str] = None, match_type: Optional[str] = None) -> Iterator[tuple]:
+    """Same rows as innings_rows, read straight from already-validated JSON dicts."""
+    for innings_num, inning in enumerate(innings, 1):
+        team = inning["team"]
+        declared = inning.get("declared")
+        forfeited = inning.get("forfeited")
+        super_over = inning.get("super_over")
+        score = fallen = legal_balls = 0
+        for over in inning.get("overs", ()):
+            over_num = over["over"]
+            over_phase = phase(over_num, match_type, super_over)
+            for ball_num, delivery in enumerate(over["deliveries"], 1):
+                runs = delivery["runs"]
+                extras = delivery.get("extras")
+                wickets = delivery.get("wickets")
+                wicket = wickets[0] if wickets else None
+                fielders = [f["name"] for f in wicket["fielders"]] if wicket and wicket.get("fielders") else []
+                score += runs.get("total", 0)
+                if wicket:
+                    fallen += sum(w["kind"] not in NOT_OUT_DISMISSALS for w in wickets)
+                if not extras or ("wides" not in extras and "noballs" not in extras):
+                    legal_balls += 1
+
+                yield (
+                    match_id,
+                    match_date,
+                    innings_num,
+                    team,
+                    over_num,
+                    ball_num,
+                    delivery["batter"],
+                    delivery["bowler"],
+                    delivery["non_striker"],
+                    runs.get("batter", 0),
+                    runs.get("extras", 0),
+                    runs.get("total", 0),
+                    runs.get("non_boundary"),
+                    extras.get("byes") if extras else None,
+                    extras.get("legbyes") if extras else None,
+                    extras.get("noballs") if extras else None,
+                    extras.get("penalty") if extras else None,
+                    extras.get("wides") if extras else None,
+                    wicket["kind"] if wicket else None,
+                    wicket["player_out"] if wicket else None,
+                    fielders,
+                    declared,
+                    forfeited,
+                    super_over,
+                    score,
+                    fallen,
+                    legal_balls,
+                    over_phase
+                )
+
+
+@dataclass
+class MatchRows:
+    """Every row produced by one match file.
+
+    Delivery rows are generated lazily, so a loader can stream them into its
+    buffers without a full list per match; call materialize before pickling.
+    """
+    source: str
+    content_hash: str
+    match: tuple
+    players: List[tuple]
+    match_players: List[tuple]
+    innings: Iterable[tuple]
+    replaces: bool = False  # the match_id was loaded before and is overwritten in place
+    archive: str = ""  # source archive the file came from, e.g. odis
+    innings_skipped: int = 0  # invalid innings left out; the trusted path would keep them
+
+    def materialize(self) -> "MatchRows":
+        """Generate the delivery rows now, e.g. before sending the rows to another process."""
+        self.innings = list(self.innings)
+        return self
+
+
+def flatten_match(match: ValidatedMatch, source: str = "", match_id: Optional[str] = None) -> MatchRows:
+    """Flatten one validated match into table rows.
+
+    The match_id is derived from the source file (see match_uuid) unless the
+    match replaces an existing one, which keeps its id.
+    """
+    replaces = match_id is not None
+    match_id = match_id or match_uuid(source)
+    player_data, match_player_data = player_rows(match.info, match_id)
+    return MatchRows(
+        source=source,
+        content_hash=match.content_hash,
+        match=(match_id,) + match_values(match.info),
+        players=player_data,
+        match_players=match_player_data,
+        innings=innings_rows(match.innings, match_id, first_match_date(match.info), match.info.match_type),
+        replaces=replaces,
+        innings_skipped=match.innings_skipped,
+    )
+
+
+def flatten_trusted(raw: bytes, digest: str, source: str = "", match_id: Optional[str] = None) -> MatchRows:
+    """Flatten a match whose content hash already passed validation.
+
+    Only the small info section is rebuilt as a model; deliveries are read
+    straight from the decoded JSON instead of being validated again.
+    """
+    data = decoding.loads(raw)
+    info = InfoModel.model_validate(data["info"])
+    replaces = match_id is not None
+    match_id = match_id or match_uuid(source)
+    player_data, match_player_data = player_rows(info, match_id)
+    return MatchRows(
+        source=source,
+        content_hash=digest,
+        match=(match_id,) + match_values(info),
+        players=player_data,
+        match_players=match_player_data,
+        innings=trusted_innings_rows(data["innings"], match_id, first_match_date(info), info.match_type),
+        replaces=replaces,
+    )
+
+
+def benchmark(file_path: str, repeat: int) -> None:
+    """Time the per-match cost of validating and flattening one file each way, per JSON backend."""
+    from preprocessing import validate_and_preprocess, validate_match, content_hash
+
+    with open(file_path, "rb") as file:
+        raw = file.read()
+    digest = content_hash(raw)
+
+    def round_trip():
+        # Validate, dump back to dicts, then rebuild the models from the dicts
+        validated_data = validate_and_preprocess(file_path)
+        info = InfoModel(**validated_data["info"])
+        innings = [InningsModel(**inning) for inning in validated_data["innings"]]
+        flatten_match(ValidatedMatch(info, innings, digest)).materialize()
+
+    def timed(name: str, fn) -> None:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        per_match = (time.perf_counter() - start) / repeat
+        print(f"{name:<36} {per_match * 1000:8.2f} ms/match {1 / per_match:8.0f} matches/s")
+
+    logging.getLogger().setLevel(logging.WARNING)
+    decoding.set_backend("json")
+    timed("validate + dump + revalidate", round_trip)
+    for backend in decoding.available_backends():
+        decoding.set_backend(backend)
+        timed(f"validate_match [{backend}]", lambda: flatten_match(validate_match(raw, file_path)).materialize())
+        timed(f"trusted [{backend}]", lambda: flatten_trusted(raw, digest).materialize())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Micro-benchmark match validation and flattening")
+    parser.add_argument("file_path")
+    parser.add_argument("-r", "--repeat", type=int, default=50)
+    args = parser.parse_args()
+    benchmark(args.file_path, args.repeat)
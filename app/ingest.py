@@ -1,16 +1,62 @@
 # app/ingest.py
-import requests
-import zipfile
 import os
-import logging
 import json
+import logging
+import math
 import duckdb
+import pyarrow as pa
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-from preprocessing import (
-    validate_and_preprocess,
-    InfoModel,
-    InningsModel
+from typing import Iterable, Iterator, List, Optional, Tuple
+from preprocessing import InvalidMatch, check_match, ValidatedMatch
+from flatten import (
+    MATCH_COLUMNS,
+    INNINGS_COLUMNS,
+    first_match_date,
+    innings_rows,
+    match_uuid,
+    match_values,
+    player_rows
+)
+from columnar import ROW_BUDGET, ChunkBuffers
+from dimensions import Dimensions
+from manifest import (
+    MANIFEST_COLUMNS,
+    MANIFEST_UPSERT,
+    MatchFile,
+    load_manifest,
+    plan_archives,
+    recorded,
+    release_matches,
+    replace_matches,
+    unfinished_files
+)
+from pipeline import commit_chunk, parse_match, run_pipeline
+from shards import run_sharded
+from staging import RejectedFile
+from summaries import refresh_summaries, rebuild_summaries, summaries_missing, team_groups
+from export import export_parquet
+from snapshot import Snapshotter
+from metrics import METRICS
+from db_utils import (
+    IntegrityError,
+    bulk_loading,
+    drop_unmanifested,
+    finish_bulk_load,
+    initialize_db,
+    is_compact,
+    unmanifested_matches
+)
+import decoding
+from sources import (
+    COMPETITIONS,
+    archive_name,
+    cached_archive,
+    count_zip_matches,
+    fetch_archives,
+    iter_zip_matches,
+    mark_ingested,
+    resolve_source
 )
 
 logging.basicConfig(
@@ -22,184 +68,148 @@ logging.basicConfig(
     ]
 )
 
-
-def download_and_extract_zip(url: str, extract_to: str = "data") -> None:
-    """Download and extract cricket data ZIP file."""
-    os.makedirs(extract_to, exist_ok=True)
-    try:
-        logging.info(f"Downloading file from {url}...")
-        response = requests.get(url)
-        response.raise_for_status()
-
-        zip_path = os.path.join(extract_to, "temp.zip")
-        with open(zip_path, "wb") as file:
-            file.write(response.content)
-        logging.info(f"Downloaded zip file to {zip_path}")
-
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(extract_to)
-        logging.info(f"Extracted JSON files to {extract_to}")
-
-        os.remove(zip_path)
-        logging.info("Temporary zip file removed.")
-    except Exception as e:
-        logging.error("Failed to download or extract the zip file.")
-        logging.exception(e)
-        raise
-
-
-def process_chunk(files: List[Path], db_path: str, chunk_num: int, total_chunks: int) -> int:
-    """Process a chunk of files in a single transaction."""
-    logging.info(f"Processing chunk {chunk_num}/{total_chunks} with {len(files)} files")
+# Delivery rows per executemany in the rowwise loader
+ROWWISE_BATCH = 1000
+
+
+def batched(items: Iterable[MatchFile], size: int) -> Iterator[List[MatchFile]]:
+    """Split a stream of match files into lists of at most size items."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_match_rowwise(conn, match: ValidatedMatch, match_file: MatchFile) -> str:
+    """Insert one match with per-row statements."""
+    info, innings = match.info, match.innings
+    if match_file.match_id:
+        # Loaded before and released by process_chunk: overwrite the existing match in place
+        match_id = match_file.match_id
+        conn.register("replaced_matches", pa.table(
+            {column: [value] for column, value in zip(MATCH_COLUMNS, (match_id,) + match_values(info))}
+        ))
+        try:
+            replace_matches(conn, "replaced_matches")
+        finally:
+            conn.unregister("replaced_matches")
+    else:
+        match_id = match_uuid(match_file.source)
+        conn.execute(f"""
+        INSERT INTO matches ({", ".join(MATCH_COLUMNS)})
+        VALUES ({", ".join("?" * len(MATCH_COLUMNS))});
+        """, (match_id,) + match_values(info))
+
+    # Process players in bulk
+    METRICS.count("rows_inserted", table="matches")
+    player_data, match_player_data = player_rows(info, match_id)
+    METRICS.count("rows_inserted", len(player_data), table="match_players")
+    if player_data:
+        conn.executemany("""
+        INSERT INTO players (player_id, player_name, registry_id)
+        VALUES (?, ?, ?)
+        ON CONFLICT (player_id) DO NOTHING;
+        """, player_data)
+
+        conn.executemany("""
+        INSERT INTO match_players (match_id, player_id, team)
+        VALUES (?, ?, ?);
+        """, match_player_data)
+
+    # Process innings in batches as the rows are generated
+    innings_data = innings_rows(innings, match_id, first_match_date(info), info.match_type)
+    deliveries = 0
+    while batch := list(islice(innings_data, ROWWISE_BATCH)):
+        conn.executemany(f"""
+        INSERT INTO innings ({", ".join(INNINGS_COLUMNS)})
+        VALUES ({", ".join("?" * len(INNINGS_COLUMNS))});
+        """, batch)
+        deliveries += len(batch)
+    METRICS.count("rows_inserted", deliveries, table="innings")
+
+    conn.execute(f"""
+    INSERT INTO ingest_manifest ({", ".join(MANIFEST_COLUMNS)})
+    VALUES ({", ".join("?" * len(MANIFEST_COLUMNS))})
+    {MANIFEST_UPSERT};
+    """, (match_file.source, match_file.content_hash, match_id, match_file.archive, match.innings_skipped))
+    conn.execute("DELETE FROM ingest_quarantine WHERE source_file = ?;", [match_file.source])
+    return str(match_id)
+
+
+def process_chunk(match_files: List[MatchFile], db_path: str, chunk_num: int, total_chunks: int,
+                  loader: str = "columnar", row_budget: int = ROW_BUDGET,
+                  snapshot: Optional[Snapshotter] = None) -> int:
+    """Process a chunk of files in a single transaction.
+
+    The columnar loader buffers the chunk, spilling it to staging tables every
+    row_budget rows, checks it there and writes each table with one
+    INSERT ... SELECT (see pipeline.commit_chunk); the rowwise loader issues
+    per-row inserts for every match. Files that fail
+    validation are recorded in ingest_quarantine either way. With a snapshot,
+    the read-only copy is refreshed after the commit when it is due.
+    """
+    logging.info(f"Processing chunk {chunk_num}/{total_chunks} with {len(match_files)} files")
 
     conn = duckdb.connect(db_path)
-    successful = 0
+    buffers = ChunkBuffers(Dimensions.open(conn), row_budget, bulk_loading(conn))
+
+    if loader != "rowwise":
+        try:
+            for match_file in match_files:
+                buffers.add(conn, parse_match(match_file))
+            committed = commit_chunk(conn, buffers, f"{chunk_num}/{total_chunks}")
+            if snapshot:
+                with METRICS.timer("snapshot"):
+                    snapshot.after_commit(conn)
+            return committed
+        finally:
+            conn.close()
 
+    successful = 0
     try:
+        replaced_ids = [match_file.match_id for match_file in match_files if match_file.match_id]
+        with METRICS.timer("release"):
+            release_matches(conn, replaced_ids)
         conn.execute("BEGIN")
+        stale_groups = team_groups(conn, replaced_ids)
+        match_ids = []
 
-        for file_path in files:
+        # DuckDB aborts the whole transaction on a failed statement, so unlike the
+        # columnar loader a match that fails to insert fails the chunk
+        for match_file in match_files:
             try:
-                # Validate and create models
-                validated_data = validate_and_preprocess(str(file_path))
-                if not validated_data:
-                    continue
-
-                info = InfoModel(**validated_data['info'])
-                innings = [InningsModel(**inning) for inning in validated_data['innings']]
-
-                # Process match info
-                match_sql = """
-                INSERT INTO matches (
-                    balls_per_over, city, date, event_name, event_match_number,
-                    event_group, event_stage, gender, match_type, match_type_number,
-                    outcome_winner, outcome_by, outcome_method, outcome_result, outcome_eliminator,
-                    overs, player_of_match, season, team_type, team_1, team_2,
-                    toss_winner, toss_decision, toss_uncontested, venue
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                RETURNING match_id;
-                """
-
-                # Extract data from models
-                event = info.event
-                outcome = info.outcome
-                toss = info.toss
-                outcome_by = json.dumps(outcome.by) if outcome and outcome.by else None
-
-                # Get first date from dates array
-                match_date = info.dates[0] if info.dates else None
-
-                result = conn.execute(match_sql, (
-                    info.balls_per_over,
-                    info.city,
-                    match_date,
-                    event.name if event else None,
-                    event.match_number if event else None,
-                    event.group if event else None,
-                    event.stage if event else None,
-                    info.gender,
-                    info.match_type,
-                    None,
-                    outcome.winner if outcome else None,
-                    outcome_by,
-                    outcome.method if outcome else None,
-                    outcome.result if outcome else None,
-                    outcome.eliminator if outcome else None,
-                    info.overs,
-                    info.player_of_match,
-                    str(info.season),
-                    info.team_type,
-                    info.teams[0] if info.teams else "unknown",
-                    info.teams[1] if len(info.teams) > 1 else "unknown",
-                    toss.winner if toss else "unknown",
-                    toss.decision if toss else "unknown",
-                    toss.uncontested if toss else False,
-                    info.venue
-                )).fetchone()
-
-                match_id = result[0]
-
-                # Process players in bulk
-                if info.players:
-                    player_data = []
-                    match_player_data = []
-                    for team, players in info.players.items():
-                        for player in players:
-                            registry_id = info.registry.get("people", {}).get(player)
-                            player_data.append((registry_id or player, player, registry_id))
-                            match_player_data.append((match_id, registry_id or player, team))
-
-                    conn.executemany("""
-                    INSERT INTO players (player_id, player_name, registry_id)
-                    VALUES (?, ?, ?)
-                    ON CONFLICT (player_id) DO NOTHING;
-                    """, player_data)
-
-                    conn.executemany("""
-                    INSERT INTO match_players (match_id, player_id, team)
-                    VALUES (?, ?, ?);
-                    """, match_player_data)
-
-                # Process innings in bulk
-                innings_data = []
-                for innings_num, inning in enumerate(innings, 1):
-                    for over in inning.overs:
-                        for ball_num, delivery in enumerate(over.deliveries, 1):
-                            wicket = delivery.wickets[0] if delivery.wickets else None
-                            fielders = [f.name for f in wicket.fielders] if wicket and wicket.fielders else []
-
-                            innings_data.append((
-                                match_id,
-                                innings_num,
-                                inning.team,
-                                over.over,
-                                ball_num,
-                                delivery.batter,
-                                delivery.bowler,
-                                delivery.non_striker,
-                                delivery.runs.batter,
-                                delivery.runs.extras,
-                                delivery.runs.total,
-                                delivery.runs.non_boundary,
-                                delivery.extras.byes if delivery.extras else None,
-                                delivery.extras.legbyes if delivery.extras else None,
-                                delivery.extras.noballs if delivery.extras else None,
-                                delivery.extras.penalty if delivery.extras else None,
-                                delivery.extras.wides if delivery.extras else None,
-                                wicket.kind if wicket else None,
-                                wicket.player_out if wicket else None,
-                                fielders,
-                                inning.declared,
-                                inning.forfeited,
-                                inning.super_over
-                            ))
-
-                if innings_data:
-                    conn.executemany("""
-                    INSERT INTO innings (
-                        match_id, innings_number, team, over, ball,
-                        batter, bowler, non_striker,
-                        runs_batter, runs_extras, runs_total, runs_non_boundary,
-                        extras_byes, extras_legbyes, extras_noballs, extras_penalty, extras_wides,
-                        wicket_type, player_out, fielders,
-                        declared, forfeited, super_over
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-                    """, innings_data)
-
-                successful += 1
-
-            except Exception as e:
-                logging.error(f"Error processing file {file_path}: {e}")
+                with METRICS.timer("validate"):
+                    match = check_match(match_file.raw, match_file.source)
+            except InvalidMatch as e:
+                buffers.add_rejected(RejectedFile(match_file.source, match_file.content_hash, e.reason, str(e)))
                 continue
-
-        conn.execute("COMMIT")
+            METRICS.count("files_parsed", archive=match_file.archive)
+            with METRICS.timer("insert"):
+                match_ids.append(insert_match_rowwise(conn, match, match_file))
+            successful += 1
+
+        with METRICS.timer("insert"):
+            written = buffers.flush(conn)
+            written.update(refresh_summaries(conn, match_ids, stale_groups))
+        with METRICS.timer("commit"):
+            conn.execute("COMMIT")
+        buffers.committed()
+        METRICS.count("chunks_committed")
+        for table, rows in written.items():
+            METRICS.count("rows_inserted", rows, table=table)
         logging.info(f"Successfully committed chunk {chunk_num}/{total_chunks}")
+        if snapshot:
+            with METRICS.timer("snapshot"):
+                snapshot.after_commit(conn)
         return successful
 
     except Exception as e:
         conn.execute("ROLLBACK")
         logging.error(f"Error processing chunk {chunk_num}: {e}")
-        return successful
+        METRICS.count("chunks_failed")
+        return 0
     finally:
         conn.close()
 
@@ -214,36 +224,201 @@ if __name__ == "__main__":
                         help='Number of files to process in test mode (default: 10)')
     parser.add_argument('-c', '--chunk-size', type=int, default=100,
                         help='Number of files to process in each chunk (default: 100)')
+    parser.add_argument('--row-budget', type=int, default=ROW_BUDGET,
+                        help='Rows buffered in memory before they are spilled to the staging tables '
+                             f'(default: {ROW_BUDGET})')
+    parser.add_argument('-l', '--loader', choices=['columnar', 'rowwise'], default='columnar',
+                        help='Insert path: columnar bulk load or per-row executemany (default: columnar)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help='Parser processes feeding the single database writer; '
+                             '0 parses and writes serially in this process (default: CPU count)')
+    parser.add_argument('--shards', type=int, default=0, metavar='N',
+                        help='Parse and load the files in N writer processes, each into its own shard '
+                             'database, then merge the shards into the database (default: 0, one writer)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Skip files whose content is unchanged since they were last loaded')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Initial load into a new or empty database: create the tables without their keys, '
+                             'load everything, then check the rows and rebuild the tables with their keys at the end')
+    parser.add_argument('--reload-legacy', action='store_true',
+                        help='Delete the matches loaded before the ingest manifest existed and load them again '
+                             'from the archive, so they get stable match ids')
+    parser.add_argument('--decoder', choices=('auto',) + decoding.BACKENDS, default='auto',
+                        help='JSON decoding backend; msgspec also validates into typed structs in one pass '
+                             '(default: fastest installed)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Create a new database with integer player/team/venue keys in the innings '
+                             'fact table (existing compact databases are detected automatically)')
+    parser.add_argument('-s', '--source', action='append', default=[], metavar='NAME_OR_URL',
+                        help=f'Archive to download and ingest: a Cricsheet competition ({", ".join(COMPETITIONS)}) '
+                             'or a URL. Repeat for several; they are fetched concurrently (default: odis)')
+    parser.add_argument('--archive', type=Path, action='append', default=[],
+                        help='Ingest a local Cricsheet archive instead of downloading one; may be repeated')
+    parser.add_argument('--offline', action='store_true',
+                        help='Use the cached archives in data/ without making any network request')
+    parser.add_argument('--snapshot', nargs='?', const='', metavar='FILE',
+                        help='Keep a read-only copy of the database for readers such as app/service.py, '
+                             'refreshed after commits (default file: odi_data.snapshot.db)')
+    parser.add_argument('--snapshot-interval', type=float, default=30.0, metavar='SECONDS',
+                        help='Refresh the snapshot at most this often during a run; it is always '
+                             'refreshed at the end (default: 30)')
+    parser.add_argument('--export-parquet', type=Path, metavar='DIR',
+                        help='After loading, export the tables as Parquet partitioned by gender and year')
+    parser.add_argument('--metrics-json', type=Path, metavar='FILE',
+                        help='Write the run\'s stage timers and counters as JSON')
+    parser.add_argument('--metrics-prom', type=Path, metavar='FILE',
+                        help='Write the run\'s metrics in Prometheus text format (textfile collector)')
+    parser.add_argument('--profile', type=lambda value: value.split(','), default=[], metavar='STAGES',
+                        help='Comma-separated stages to run under cProfile, e.g. validate,flatten,insert,commit')
+    parser.add_argument('--profile-dir', default='profiles',
+                        help='Directory for <stage>.<pid>.prof files (default: profiles)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Log every file as it is validated')
     args = parser.parse_args()
 
-    cricsheet_url = "https://cricsheet.org/downloads/odis_json.zip"
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    METRICS.enable_profiling(args.profile, args.profile_dir)
+    decoder = decoding.set_backend(args.decoder)
+    logging.info(f"Decoding JSON with {decoder}")
+
     root_dir = Path(__file__).parent.parent
     data_dir = root_dir / "data"
     db_path = root_dir / "odi_data.db"
 
-    # Initialize
-    os.makedirs(data_dir, exist_ok=True)
-
-    # Download data
-    download_and_extract_zip(cricsheet_url, str(data_dir))
-
-    # Get list of files
-    json_files = list(data_dir.glob("*.json"))
+    # Fetch data; matches are read straight out of the archives
+    try:
+        sources = [resolve_source(spec) for spec in args.source or ["odis"]]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.archive:
+        archives = [(archive_name(path), cached_archive(path)) for path in args.archive]
+    elif args.offline:
+        archives = [(source.name, cached_archive(data_dir / source.filename)) for source in sources]
+    else:
+        archives = list(zip([source.name for source in sources], fetch_archives(sources, data_dir)))
+    failed_sources = [name for name, fetched in archives if fetched is None]
+    archives = [(name, fetched) for name, fetched in archives if fetched is not None]
+    if failed_sources and not archives:
+        logging.error("No archive could be fetched")
+        raise SystemExit(1)
+
+    if args.incremental:
+        for name, fetched in archives:
+            if not fetched.changed and fetched.ingested:
+                logging.info(f"{fetched.path} has not changed since it was last ingested; skipping {name}")
+        archives = [(name, fetched) for name, fetched in archives if fetched.changed or not fetched.ingested]
+        if not archives:
+            logging.info("Nothing to do")
+            raise SystemExit(1 if failed_sources else 0)
+
+    limit = args.num_files if args.test else None
+    archive_files = {name: count_zip_matches(fetched.path) for name, fetched in archives}
+    total_files = min(sum(archive_files.values()), limit or math.inf)
+    logging.info(f"Ingesting {', '.join(f'{name} ({files} files)' for name, files in archive_files.items())}")
     if args.test:
-        json_files = json_files[:args.num_files]
-        logging.info(f"Running in test mode with {len(json_files)} files")
+        logging.info(f"Running in test mode with {total_files} files")
 
     # Process in chunks
-    total_files = len(json_files)
-    chunk_size = min(args.chunk_size, total_files)
-    chunks = [json_files[i:i + chunk_size] for i in range(0, total_files, chunk_size)]
-    total_chunks = len(chunks)
+    chunk_size = max(1, min(args.chunk_size, total_files))
+    total_chunks = math.ceil(total_files / chunk_size)
 
     logging.info(f"Processing {total_files} files in {total_chunks} chunks of size {chunk_size}")
 
-    total_successful = 0
-    for i, chunk in enumerate(chunks, 1):
-        successful = process_chunk(chunk, str(db_path), i, total_chunks)
-        total_successful += successful
+    # Files loaded before are replaced in place; with --incremental unchanged ones are skipped
+    if args.bulk and (args.incremental or args.loader == 'rowwise'):
+        parser.error("--bulk is an initial load with the columnar loader; incremental runs keep the keys")
+    conn = initialize_db(str(db_path), compact=args.compact, bulk=args.bulk)
+    legacy = unmanifested_matches(conn)
+    if legacy and not args.reload_legacy:
+        parser.error(f"{db_path} has {legacy} matches loaded before the ingest manifest existed, whose source "
+                     f"files are unknown, so this run would add each of them again. Run once with "
+                     f"--reload-legacy to delete them and load them again from the archive, or use a new database")
+    if legacy:
+        logging.info(f"Deleting {legacy} matches loaded before the ingest manifest existed, to load them again")
+        drop_unmanifested(conn)
+        rebuild_summaries(conn)
+    manifest = load_manifest(conn)
+    if args.loader == 'rowwise' and is_compact(conn):
+        parser.error("the rowwise loader only writes the plain innings table, not the compact schema")
+    if bulk_loading(conn) and not args.bulk:
+        parser.error(f"{db_path} holds an unfinished bulk load; run again with --bulk, or fix it and run "
+                     f"python -m app.db_utils --finish-bulk {db_path}")
+    if args.shards and (args.loader == 'rowwise' or is_compact(conn)):
+        parser.error("--shards needs the columnar loader and the plain schema (compact keys are assigned per writer)")
+    if summaries_missing(conn):
+        logging.info("Building summary tables for matches loaded before they existed")
+        rebuild_summaries(conn)
+    conn.close()
+
+    # One stream of files across all archives, each tagged with its archive
+    match_files = plan_archives(((name, iter_zip_matches(fetched.path)) for name, fetched in archives),
+                                manifest, args.incremental)
+    match_files = islice(match_files, limit)
+    planned: List[Tuple[str, str, str]] = []
+    match_files = recorded(match_files, planned)
+    snapshot = None
+    if args.snapshot is not None:
+        snapshot = Snapshotter(db_path, args.snapshot or None, args.snapshot_interval)
+    if args.shards > 0:
+        logging.info(f"Loading into {args.shards} shards")
+        total_successful = run_sharded(match_files, str(db_path), args.shards, chunk_size,
+                                       decoder=decoder, row_budget=args.row_budget, snapshot=snapshot,
+                                       profile=args.profile, profile_dir=args.profile_dir)
+    elif args.workers > 0 and args.loader == 'columnar':
+        logging.info(f"Parsing with {args.workers} worker processes")
+        total_successful = run_pipeline(match_files, str(db_path), args.workers, chunk_size,
+                                        decoder=decoder, row_budget=args.row_budget, snapshot=snapshot,
+                                        profile=args.profile, profile_dir=args.profile_dir)
+    else:
+        total_successful = 0
+        for i, chunk in enumerate(batched(match_files, chunk_size), 1):
+            successful = process_chunk(chunk, str(db_path), i, total_chunks, args.loader, args.row_budget,
+                                       snapshot)
+            total_successful += successful
+        if snapshot:
+            conn = duckdb.connect(str(db_path))
+            snapshot.flush(conn)
+            conn.close()
+
+    if args.bulk:
+        conn = duckdb.connect(str(db_path))
+        try:
+            with METRICS.timer("finish_bulk"):
+                finish_bulk_load(conn)
+        except IntegrityError as e:
+            logging.error(f"Bulk load failed its integrity checks; the keys were not built:\n{e}")
+            raise SystemExit(1)
+        finally:
+            conn.close()
+
+    if not args.archive and not args.test:
+        # Only an archive whose files all loaded (or were rejected for good) is skipped
+        # by the next --incremental run; the rest fall through to the manifest
+        conn = duckdb.connect(str(db_path))
+        try:
+            unfinished = unfinished_files(conn, planned)
+        finally:
+            conn.close()
+        for name, fetched in archives:
+            if unfinished.get(name):
+                logging.warning(f"{unfinished[name]} files from {name} were not loaded; "
+                                f"the next run retries them")
+            else:
+                mark_ingested(fetched.path)
 
     logging.info(f"Processing complete. Successfully processed {total_successful}/{total_files} files")
+    logging.info(f"Metrics: {json.dumps(METRICS.summary())}")
+    if args.metrics_json:
+        METRICS.write_json(args.metrics_json)
+    if args.metrics_prom:
+        METRICS.write_prometheus(args.metrics_prom)
+
+    if args.export_parquet:
+        conn = duckdb.connect(str(db_path), read_only=True)
+        export_parquet(conn, args.export_parquet)
+        conn.close()
+
+    if failed_sources:
+        logging.error(f"Not loaded, could not be fetched: {', '.join(failed_sources)}")
+        raise SystemExit(1)
@@ -0,0 +1,163 @@
+# app/manifest.py
+import logging
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import pyarrow as pa
+from preprocessing import content_hash
+from flatten import MATCH_COLUMNS
+from staging import RETRIED_REASONS
+from db_utils import innings_table
+from metrics import METRICS
+
+MANIFEST_COLUMNS = ("source_file", "content_hash", "match_id", "archive", "innings_skipped")
+
+MANIFEST_UPSERT = """
+ON CONFLICT (source_file) DO UPDATE SET
+    content_hash = EXCLUDED.content_hash,
+    match_id = EXCLUDED.match_id,
+    archive = EXCLUDED.archive,
+    innings_skipped = EXCLUDED.innings_skipped,
+    loaded_at = now()
+"""
+
+# Whether a manifest row's content can skip validation when it is loaded again. Files
+# with innings that failed validation are not, since the trusted path would keep them;
+# neither are rows from before skipped innings were recorded (NULL).
+TRUSTED = "coalesce(innings_skipped = 0, FALSE)"
+
+# Child tables cleared before a previously loaded match is written again
+MATCH_CHILD_TABLES = ("match_players", "officials", "batter_match_stats", "bowler_match_stats")
+
+
+class ManifestEntry(NamedTuple):
+    content_hash: str
+    match_id: str
+    trusted: bool = False  # loaded whole: every innings passed validation
+
+
+class MatchFile(NamedTuple):
+    """Raw content of one match file and what the manifest knows about its source."""
+    source: str
+    raw: bytes
+    content_hash: str
+    match_id: Optional[str] = None  # set when the source was loaded before; the match is replaced in place
+    trusted: bool = False  # content hash already passed validation, every innings of it, on an earlier load
+    archive: str = ""  # source archive the file was read from, e.g. odis
+
+
+def load_manifest(conn) -> Dict[str, ManifestEntry]:
+    """Map every loaded source file to the content hash and match_id it was loaded with."""
+    rows = conn.execute(f"SELECT source_file, content_hash, match_id::TEXT, {TRUSTED} FROM ingest_manifest").fetchall()
+    return {source: ManifestEntry(*row) for source, *row in rows}
+
+
+def plan_loads(sources: Iterable[Tuple[str, bytes]], manifest: Dict[str, ManifestEntry],
+               incremental: bool = False, archive: str = "") -> Iterator[MatchFile]:
+    """Attach manifest state to each (source, raw) pair.
+
+    Sources loaded before keep their match_id so reloading replaces them instead of
+    adding a duplicate match. With incremental, sources whose content is unchanged
+    are skipped entirely. Every file is tagged with the archive it came from.
+    """
+    trusted = {entry.content_hash for entry in manifest.values() if entry.trusted}
+    skipped = 0
+    for source, raw in sources:
+        digest = content_hash(raw)
+        entry = manifest.get(source)
+        METRICS.count("files_read", archive=archive)
+        if incremental and entry and entry.content_hash == digest:
+            skipped += 1
+            METRICS.count("files_skipped", archive=archive)
+            continue
+        yield MatchFile(source, raw, digest, entry.match_id if entry else None, digest in trusted, archive)
+
+    if incremental:
+        logging.info(f"Skipped {skipped} unchanged files{f' from {archive}' if archive else ''}")
+
+
+def plan_archives(archives: Iterable[Tuple[str, Iterable[Tuple[str, bytes]]]],
+                  manifest: Dict[str, ManifestEntry], incremental: bool = False) -> Iterator[MatchFile]:
+    """plan_loads over several (archive, sources) pairs in turn, as one stream.
+
+    Cricsheet archives overlap (a match has the same file name in every archive
+    that includes it), so a file already planned from an earlier archive in this
+    run is skipped rather than loaded twice.
+    """
+    planned = set()
+
+    def unplanned(sources: Iterable[Tuple[str, bytes]], archive: str) -> Iterator[Tuple[str, bytes]]:
+        for source, raw in sources:
+            if source in planned:
+                METRICS.count("files_duplicated", archive=archive)
+                continue
+            planned.add(source)
+            yield source, raw
+
+    for archive, sources in archives:
+        yield from plan_loads(unplanned(sources, archive), manifest, incremental, archive)
+
+
+def recorded(match_files: Iterable[MatchFile], planned: List[Tuple[str, str, str]]) -> Iterator[MatchFile]:
+    """Pass match files through, appending (archive, source, content hash) of each to planned."""
+    for match_file in match_files:
+        planned.append((match_file.archive, match_file.source, match_file.content_hash))
+        yield match_file
+
+
+def unfinished_files(conn, planned: List[Tuple[str, str, str]]) -> Dict[str, int]:
+    """Count, per archive, the planned files that are neither loaded with their content
+    nor quarantined for a reason that would recur, e.g. after a failed chunk or shard."""
+    if not planned:
+        return {}
+    archives, sources, hashes = zip(*planned)
+    conn.register("planned_files", pa.table({"archive": archives, "source_file": sources, "content_hash": hashes}))
+    try:
+        return dict(conn.execute("""
+        SELECT p.archive, count(*)
+        FROM planned_files p
+        LEFT JOIN ingest_manifest m ON m.source_file = p.source_file AND m.content_hash = p.content_hash
+        LEFT JOIN ingest_quarantine q ON q.source_file = p.source_file AND q.content_hash = p.content_hash
+            AND NOT list_contains(?, q.reason)
+        WHERE m.source_file IS NULL AND q.source_file IS NULL
+        GROUP BY p.archive;
+        """, [list(RETRIED_REASONS)]).fetchall())
+    finally:
+        conn.unregister("planned_files")
+
+
+def release_matches(conn, match_ids: List[str]) -> None:
+    """First step of replacing previously loaded matches; runs in its own transaction.
+
+    DuckDB cannot rewrite a row that is still referenced through a foreign key in the
+    same transaction that removed the references, so the child rows are deleted and
+    committed before the new rows are written. The manifest entries are blanked in the
+    same transaction, so if the load fails afterwards the sources still look changed
+    and the next run loads them again.
+    """
+    if not match_ids:
+        return
+    conn.execute("BEGIN")
+    try:
+        conn.execute("""
+        UPDATE ingest_manifest SET content_hash = ''
+        WHERE list_contains(?, match_id::TEXT);
+        """, [match_ids])
+        for table in (innings_table(conn),) + MATCH_CHILD_TABLES:
+            conn.execute(f"""
+            DELETE FROM {table}
+            WHERE list_contains(?, match_id::TEXT);
+            """, [match_ids])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def replace_matches(conn, view: str, columns: Sequence[str] = MATCH_COLUMNS) -> None:
+    """Overwrite released matches in place with the rows registered as view."""
+    assignments = ",\n        ".join(f"{column} = {view}.{column}" for column in columns[1:])
+    conn.execute(f"""
+    UPDATE matches SET
+        {assignments}
+    FROM {view}
+    WHERE matches.match_id = {view}.match_id::UUID;
+    """)
@@ -0,0 +1,140 @@
+# app/metrics.py
+# Process-local ingest metrics: stage timers and labelled counters, merged across the
+# parser and writer processes and exported as JSON or Prometheus text at the end of a run.
+import cProfile
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Counters keyed by name and labels, and timers as [count, total seconds, max seconds]."""
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        self.timers: Dict[str, List[float]] = {}
+        self.profiled: Dict[str, cProfile.Profile] = {}
+        self.profile_dir: Optional[Path] = None
+        self.profiling: Optional[str] = None  # stage whose profiler is running
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time a stage; stages selected with enable_profiling also run under cProfile.
+
+        Only one profiler can run at a time, so a profiled stage nested in another
+        one is timed but left in the outer stage's profile.
+        """
+        profile = self.profiled.get(name) if self.profiling is None else None
+        if profile:
+            profile.enable()
+            self.profiling = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+            if profile:
+                profile.disable()
+                self.profiling = None
+
+    def enable_profiling(self, stages: Iterable[str], profile_dir: Path) -> None:
+        """Profile the named stages in this process; profiles are written when it exits."""
+        stages = [stage for stage in stages if stage]
+        if not stages:
+            return
+        self.profiled = {stage: cProfile.Profile() for stage in stages}
+        self.profile_dir = Path(profile_dir)
+        # Finalize rather than atexit, so multiprocessing workers write theirs too
+        Finalize(self, Metrics.dump_profiles, args=(self,), exitpriority=10)
+
+    def dump_profiles(self) -> List[Path]:
+        """Write <stage>.<pid>.prof for every profiled stage that ran; open them with pstats."""
+        if not self.profile_dir:
+            return []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        paths = []
+        for stage, profile in self.profiled.items():
+            if profile.getstats():
+                path = self.profile_dir / f"{stage}.{os.getpid()}.prof"
+                profile.dump_stats(path)
+                paths.append(path)
+        return paths
+
+    def drain(self) -> Dict[str, Any]:
+        """Snapshot for merging into another process's registry, then reset."""
+        snapshot = {"counters": list(self.counters.items()), "timers": self.timers}
+        self.counters = defaultdict(float)
+        self.timers = {}
+        return snapshot
+
+    def merge(self, snapshot: Optional[Dict[str, Any]]) -> None:
+        if not snapshot:
+            return
+        for (name, labels), value in snapshot["counters"]:
+            self.counters[(name, tuple(map(tuple, labels)))] += value
+        for name, (count, total, longest) in snapshot["timers"].items():
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += count
+            timer[1] += total
+            timer[2] = max(timer[2], longest)
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-friendly view: counters nested by label, timers with count/total/mean/max."""
+        counters: Dict[str, Any] = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            value = int(value) if float(value).is_integer() else value
+            if labels:
+                counters.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+            else:
+                counters[name] = value
+        timers = {
+            name: {"count": count, "total_s": round(total, 6), "mean_s": round(total / count, 6) if count else 0.0,
+                   "max_s": round(longest, 6)}
+            for name, (count, total, longest) in sorted(self.timers.items())
+        }
+        return {"counters": counters, "timers": timers}
+
+    def write_json(self, path: Path) -> None:
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def write_prometheus(self, path: Path, prefix: str = "cricket_ingest") -> None:
+        """Write the metrics in Prometheus text format, e.g. for node_exporter's textfile collector."""
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (counter, labels), value in sorted(self.counters.items()):
+                if counter == name:
+                    label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{prefix}_{name}_total{{{label_text}}} {value:g}" if labels
+                                 else f"{prefix}_{name}_total {value:g}")
+        for name, (count, total, longest) in sorted(self.timers.items()):
+            lines.append(f"# TYPE {prefix}_{name}_seconds summary")
+            lines.append(f"{prefix}_{name}_seconds_count {count}")
+            lines.append(f"{prefix}_{name}_seconds_sum {total:.6f}")
+            lines.append(f"# TYPE {prefix}_{name}_seconds_max gauge")
+            lines.append(f"{prefix}_{name}_seconds_max {longest:.6f}")
+        tmp_path = Path(str(path) + ".tmp")
+        with open(tmp_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+# Registry for the current process
+METRICS = Metrics()
@@ -0,0 +1,246 @@
+# app/pipeline.py
+import logging
+import multiprocessing
+import duckdb
+import decoding
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from queue import Full
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Union
+from preprocessing import InvalidMatch, check_match
+from flatten import MatchRows, flatten_match, flatten_trusted
+from columnar import ROW_BUDGET, ChunkBuffers
+from dimensions import Dimensions
+from manifest import MatchFile
+from staging import RejectedFile
+from snapshot import Snapshotter
+from metrics import METRICS
+from db_utils import bulk_loading
+
+Parsed = Union[MatchRows, RejectedFile]
+
+
+def parse_match(match_file: MatchFile, materialize: bool = False) -> Parsed:
+    """Worker stage: validate one match and flatten it into table rows.
+
+    Trusted content skips validation, unless the msgspec typed decoder is in use,
+    which validates faster than the untyped trusted path can flatten. Delivery rows
+    are generated as the caller consumes them, unless materialize is set (rows
+    sent to another process). Files that fail are logged and returned as a
+    RejectedFile for the quarantine table.
+    """
+    try:
+        if match_file.trusted and not decoding.typed_decoding():
+            with METRICS.timer("flatten_trusted"):
+                rows = flatten_trusted(match_file.raw, match_file.content_hash, match_file.source,
+                                       match_file.match_id)
+                if materialize:
+                    rows.materialize()
+        else:
+            with METRICS.timer("validate"):
+                match = check_match(match_file.raw, match_file.source)
+            with METRICS.timer("flatten"):
+                rows = flatten_match(match, match_file.source, match_file.match_id)
+                if materialize:
+                    rows.materialize()
+        rows.archive = match_file.archive
+        METRICS.count("files_parsed", archive=match_file.archive)
+        return rows
+    except InvalidMatch as e:
+        return RejectedFile(match_file.source, match_file.content_hash, e.reason, str(e))
+    except Exception as e:
+        logging.error(f"Error processing file {match_file.source}: {e}")
+        METRICS.count("matches_rejected", reason="error")
+        return RejectedFile(match_file.source, match_file.content_hash, "error", str(e))
+
+
+def _init_worker(decoder: str, profile: Sequence[str], profile_dir: str) -> None:
+    # Forked with a copy of the parent's metrics: report only this worker's own
+    METRICS.drain()
+    decoding.set_backend(decoder)
+    METRICS.enable_profiling(profile, profile_dir)
+
+
+def _parse_in_worker(match_file: MatchFile) -> Tuple[Parsed, Dict[str, Any]]:
+    """parse_match on a pool worker, returning the worker's metrics along with the rows."""
+    return parse_match(match_file, materialize=True), METRICS.drain()
+
+
+def _write_chunk(conn, buffers: ChunkBuffers) -> Dict[str, int]:
+    """Flush the buffers in one transaction.
+
+    The rows are staged and released matches cleared before it begins, so the
+    staging tables outlive a rollback and the chunk can be retried from them.
+    """
+    with METRICS.timer("release"):
+        buffers.release(conn)
+    buffers.spill(conn)
+    conn.execute("BEGIN")
+    try:
+        with METRICS.timer("insert"):
+            written = buffers.flush(conn)
+        with METRICS.timer("commit"):
+            conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    buffers.committed()
+    return written
+
+
+def _quarantine_alone(conn, buffers: ChunkBuffers, rejected: RejectedFile) -> None:
+    buffers.add_rejected(rejected)
+    try:
+        _write_chunk(conn, buffers)
+    except Exception as e:
+        buffers.discard(conn)
+        logging.error(f"Could not quarantine {rejected.source}: {e}")
+
+
+def _retry_alone(conn, buffers: ChunkBuffers, source: str, content_hash: str, match_id: str) -> int:
+    """Write one match of a failed chunk in its own transaction, quarantining it if it fails again."""
+    buffers.restage(conn, match_id)
+    try:
+        return _write_chunk(conn, buffers).get(buffers.manifest.table, 0)
+    except Exception as e:
+        buffers.discard(conn)
+        logging.error(f"Error writing file {source}: {e}")
+        METRICS.count("matches_rejected", reason="write_failed")
+        _quarantine_alone(conn, buffers, RejectedFile(source, content_hash, "write_failed", str(e)))
+    return 0
+
+
+def commit_chunk(conn, buffers: ChunkBuffers, chunk_num) -> int:
+    """Write the buffered matches in one transaction. Returns the number of matches committed.
+
+    Matches the tables would refuse are quarantined by the flush itself. If the
+    chunk still fails, its staged files are retried one per transaction, so a bad
+    match costs only itself.
+    """
+    try:
+        written = _write_chunk(conn, buffers)
+    except Exception as e:
+        METRICS.count("chunks_failed")
+        try:
+            matches, rejected = buffers.set_aside(conn)
+        except Exception as staging_error:
+            buffers.discard(conn)
+            logging.error(f"Error processing chunk {chunk_num}: {e}; could not retry it: {staging_error}")
+            return 0
+        logging.error(f"Error processing chunk {chunk_num}: {e}; "
+                      f"retrying its {len(matches) + len(rejected)} files one at a time")
+        try:
+            for entry in rejected:
+                _quarantine_alone(conn, buffers, entry)
+            return sum(_retry_alone(conn, buffers, *match) for match in matches)
+        finally:
+            buffers.drop_set_aside(conn)
+    METRICS.count("chunks_committed")
+    for table, rows in written.items():
+        METRICS.count("rows_inserted", rows, table=table)
+    matches = written[buffers.manifest.table]
+    deliveries = written[buffers.innings.table]
+    quarantined = written[buffers.quarantine.table]
+    logging.info(f"Successfully committed chunk {chunk_num} ({matches} matches, {deliveries} deliveries, "
+                 f"{quarantined} quarantined)")
+    return matches
+
+
+def writer_loop(db_path: str, queue, results, chunk_size: int, row_budget: int = ROW_BUDGET,
+                snapshot: Optional[Snapshotter] = None, profile: Sequence[str] = (),
+                profile_dir: str = "profiles") -> None:
+    """Writer stage: the only process that opens the database.
+
+    Consumes parsed files from the queue until a None sentinel arrives, committing
+    every chunk_size files, and puts the number of committed matches and the
+    writer's metrics on results. The writer also keeps the snapshot, if any, fresh.
+    """
+    METRICS.drain()  # forked with a copy of the parent's metrics
+    METRICS.enable_profiling(profile, profile_dir)
+    conn = duckdb.connect(db_path)
+    buffers = ChunkBuffers(Dimensions.open(conn), row_budget, bulk_loading(conn))
+    chunk_num = 0
+    committed = 0
+    try:
+        while True:
+            rows = queue.get()
+            if rows is None:
+                break
+            buffers.add(conn, rows)
+            if len(buffers) >= chunk_size:
+                chunk_num += 1
+                committed += commit_chunk(conn, buffers, chunk_num)
+                if snapshot:
+                    with METRICS.timer("snapshot"):
+                        snapshot.after_commit(conn)
+
+        if len(buffers):
+            chunk_num += 1
+            committed += commit_chunk(conn, buffers, chunk_num)
+            if snapshot:
+                with METRICS.timer("snapshot"):
+                    snapshot.after_commit(conn)
+        if snapshot:
+            with METRICS.timer("snapshot"):
+                snapshot.flush(conn)
+    finally:
+        conn.close()
+        results.put((committed, METRICS.drain()))
+
+
+def _put(queue, rows: Optional[Parsed], writer) -> None:
+    """Put rows on the writer queue, failing instead of blocking forever if the writer has died."""
+    while True:
+        try:
+            queue.put(rows, timeout=1)
+            return
+        except Full:
+            if not writer.is_alive():
+                raise RuntimeError(f"Writer process exited with code {writer.exitcode}")
+
+
+def run_pipeline(match_files: Iterable[MatchFile], db_path: str, workers: int, chunk_size: int,
+                 queue_size: int = 64, decoder: str = "auto", row_budget: int = ROW_BUDGET,
+                 snapshot: Optional[Snapshotter] = None, profile: Sequence[str] = (),
+                 profile_dir: str = "profiles") -> int:
+    """Parse files on a process pool and stream the rows to a single writer process.
+
+    At most queue_size parsed matches wait on the writer, and at most twice that
+    many are in flight on the pool, so memory stays bounded when the writer is
+    the bottleneck; the writer holds at most row_budget rows before spilling them
+    to the staging tables, and refreshes the snapshot, if any, as it commits.
+    Workers decode JSON with the given decoding backend.
+    Metrics from the workers and the writer are merged into this process's
+    registry; profile names stages to run under cProfile in every process.
+    Returns the number of matches committed.
+    """
+    queue = multiprocessing.Queue(maxsize=queue_size)
+    results = multiprocessing.Queue()
+    writer = multiprocessing.Process(target=writer_loop,
+                                     args=(db_path, queue, results, chunk_size, row_budget, snapshot, profile, profile_dir))
+    writer.start()
+
+    def forward(future) -> None:
+        rows, worker_metrics = future.result()
+        METRICS.merge(worker_metrics)
+        _put(queue, rows, writer)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(decoder, profile, profile_dir)) as pool:
+            pending = set()
+            for match_file in match_files:
+                if len(pending) >= 2 * queue_size:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        forward(future)
+                pending.add(pool.submit(_parse_in_worker, match_file))
+
+            for future in pending:
+                forward(future)
+    finally:
+        _put(queue, None, writer)
+
+    committed, writer_metrics = results.get()
+    METRICS.merge(writer_metrics)
+    writer.join()
+    return committed
@@ -1,7 +1,9 @@
 # app/preprocessing.py
-import json
+import hashlib
 import logging
-from typing import Any, Dict, List, Optional, Union
+import decoding
+from metrics import METRICS
+from typing import Any, Dict, List, NamedTuple, Optional, Union
 from pydantic import BaseModel, ValidationError
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -97,63 +99,139 @@ class OverModel(BaseModel):
 
 class InningsModel(BaseModel):
     team: str
-    overs: List[OverModel]
+    overs: List[OverModel] = []  # absent for forfeited Test innings
     declared: Optional[bool] = None
     forfeited: Optional[bool] = None
     super_over: Optional[bool] = None
 
 
-def validate_and_preprocess(file_path: str) -> Dict[str, Any]:
+class MatchModel(BaseModel):
+    info: InfoModel
+    innings: List[InningsModel]
+
+
+class ValidatedMatch(NamedTuple):
+    # pydantic models, or their msgspec mirrors from structs.py when decoding with msgspec
+    info: InfoModel
+    innings: List[InningsModel]
+    content_hash: str
+    innings_skipped: int = 0  # innings left out because they failed validation
+
+
+def _decode_typed(raw: bytes) -> Optional[Any]:
+    """Decode and validate a whole match in one pass, or None if it does not validate."""
+    try:
+        if decoding.typed_decoding():
+            from structs import match_decoder
+            return match_decoder.decode(raw)
+        return MatchModel.model_validate_json(raw)
+    except (ValidationError, ValueError):
+        # msgspec.ValidationError and DecodeError are ValueErrors
+        return None
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _has_required_info(info: InfoModel) -> bool:
+    return bool(info.teams and info.dates and info.match_type)
+
+
+class InvalidMatch(ValueError):
+    """A match file rejected by validation; reason is a short machine-readable tag."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _reject(source: str, reason: str, message: str) -> InvalidMatch:
+    logging.warning(message)
+    METRICS.count("matches_rejected", reason=reason)
+    return InvalidMatch(reason, message)
+
+
+def check_match(raw: bytes, source: str) -> ValidatedMatch:
     """
-    Validate and preprocess a JSON file.
-    Games without required fields (teams, dates) are rejected.
+    Validate the raw JSON of a match and return the typed models.
+    Games without required fields (teams, dates) raise InvalidMatch.
     """
+    digest = content_hash(raw)
+
+    # Fast path: decode and validate the whole document in one pass
+    match = _decode_typed(raw)
+    if match is not None and _has_required_info(match.info) and match.innings:
+        logging.debug(f"Validated data for {source}")
+        return ValidatedMatch(match.info, match.innings, digest)
+
+    # Slow path: validate section by section, skipping invalid innings
     try:
-        with open(file_path, "r") as file:
-            data = json.load(file)
+        data = decoding.loads(raw)
+    except ValueError as e:
+        raise _reject(source, "invalid_json", f"Skipping {source}: invalid JSON ({e})")
 
-        # Validate and preprocess `info`
-        info = {}
-        try:
-            raw_info = data.get("info", {})
+    # Validate `info`
+    try:
+        raw_info = data.get("info", {})
+
+        # Check required fields
+        if not raw_info.get("teams") or not raw_info.get("dates"):
+            raise _reject(source, "missing_teams_or_dates", f"Skipping {source}: Missing required teams or dates")
 
-            # Check required fields
-            if not raw_info.get("teams") or not raw_info.get("dates"):
-                logging.warning(f"Skipping {file_path}: Missing required teams or dates")
-                return {}
+        # Additional validation for match type
+        if not raw_info.get("match_type"):
+            raise _reject(source, "missing_match_type", f"Skipping {source}: Missing match type")
 
-            # Additional validation for match type
-            if not raw_info.get("match_type"):
-                logging.warning(f"Skipping {file_path}: Missing match type")
-                return {}
+        info = InfoModel(**raw_info)
+    except ValidationError as e:
+        raise _reject(source, "invalid_info", f"Info validation failed for {source}. Errors: {e}")
 
-            info = InfoModel(**raw_info)
-            info = info.model_dump()
+    # Validate innings
+    innings = []
+    for i, inning_data in enumerate(data.get("innings", [])):
+        try:
+            innings.append(InningsModel(**inning_data))
         except ValidationError as e:
-            logging.warning(f"Info validation failed for {file_path}. Errors: {e}")
-            return {}
+            logging.warning(f"Innings {i + 1} validation failed in {source}. Errors: {e}")
+            METRICS.count("innings_skipped")
+            continue  # Skip invalid innings
 
-        # Validate and preprocess innings
-        innings = []
-        for i, inning_data in enumerate(data.get("innings", [])):
-            try:
-                inning = InningsModel(**inning_data)
-                innings.append(inning.model_dump())
-            except ValidationError as e:
-                logging.warning(f"Innings {i + 1} validation failed in {file_path}. Errors: {e}")
-                continue  # Skip invalid innings
-
-        if not innings:
-            logging.warning(f"No valid innings data in {file_path}")
-            return {}
+    if not innings:
+        raise _reject(source, "no_valid_innings", f"No valid innings data in {source}")
 
-        validated_data = {
-            "info": info,
-            "innings": innings,
-        }
+    logging.debug(f"Validated data for {source}")
+    return ValidatedMatch(info, innings, digest, len(data.get("innings", [])) - len(innings))
+
+
+def validate_match(raw: bytes, source: str) -> Optional[ValidatedMatch]:
+    """check_match, returning None instead of raising for rejected games."""
+    try:
+        return check_match(raw, source)
+    except InvalidMatch:
+        return None
 
-        logging.info(f"Validated data for {file_path}")
-        return validated_data
+
+def _dump(model: Any) -> Dict[str, Any]:
+    if isinstance(model, BaseModel):
+        return model.model_dump()
+    return decoding.msgspec.to_builtins(model)
+
+
+def validate_and_preprocess(file_path: str) -> Dict[str, Any]:
+    """
+    Validate and preprocess a JSON file into plain dicts.
+    Games without required fields (teams, dates) are rejected.
+    """
+    try:
+        with open(file_path, "rb") as file:
+            match = validate_match(file.read(), file_path)
+        if match is None:
+            return {}
+        return {
+            "info": _dump(match.info),
+            "innings": [_dump(inning) for inning in match.innings],
+        }
 
     except Exception as e:
         logging.error(f"Error processing file {file_path}")
@@ -0,0 +1,178 @@
+# app/query.py
+# Runs the SQL files in queries/ (or any other SQL file) with parameters, caching each
+# result as an Arrow IPC file keyed by the query text, its parameters and the database's data
+# version, so repeated runs skip the database until new data lands. Self-contained so
+# it can run as `python -m app.query`.
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import duckdb
+import pyarrow as pa
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+QUERY_DIR = Path(__file__).resolve().parent.parent / "queries"
+
+
+def named_queries() -> List[str]:
+    return sorted(path.stem for path in QUERY_DIR.glob("*.sql"))
+
+
+def resolve_query(name: str) -> Path:
+    """The SQL file for a query: a name from queries/ (e.g. 2b) or a path to a .sql file."""
+    path = Path(name)
+    if path.suffix == ".sql":
+        if not path.exists():
+            raise ValueError(f"No such query file: {name}")
+        return path
+    path = QUERY_DIR / f"{name}.sql"
+    if not path.exists():
+        raise ValueError(f"Unknown query {name}; expected one of {', '.join(named_queries())} or a .sql file")
+    return path
+
+
+def parse_param(spec: str) -> Tuple[str, Any]:
+    """NAME=VALUE, with integer values passed as integers."""
+    name, sep, value = spec.partition("=")
+    if not sep or not name.isidentifier():
+        raise ValueError(f"Expected NAME=VALUE, got {spec!r}")
+    try:
+        return name, int(value)
+    except ValueError:
+        return name, value
+
+
+def data_version(conn) -> Optional[int]:
+    """The version ingestion bumps on every commit, or None for databases without one."""
+    if not conn.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'data_version'"
+    ).fetchone()[0]:
+        return None
+    return conn.execute("SELECT max(version) FROM data_version").fetchone()[0]
+
+
+def run_query(conn, sql: str, params: Dict[str, Any]) -> pa.Table:
+    """Run sql with each parameter set as a variable, read with getvariable('name') in the query.
+
+    Queries fall back to their own defaults for parameters not given, so the
+    files in queries/ also run as they are in any DuckDB client. Variables left
+    by an earlier query on the same connection are reset first.
+    """
+    for (name,) in conn.execute("SELECT name FROM duckdb_variables();").fetchall():
+        conn.execute(f'RESET VARIABLE "{name}";')
+    for name, value in params.items():
+        conn.execute(f'SET VARIABLE "{name}" = ?;', [value])
+    return conn.sql(sql).to_arrow_table()
+
+
+def cache_key(sql: str, params: Dict[str, Any], version: int) -> str:
+    key = json.dumps([sql, sorted(params.items()), version], default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def default_cache_dir(db_path: Path) -> Path:
+    return Path(db_path).with_suffix(".query_cache")
+
+
+def _prune(cache_dir: Path, version: int) -> None:
+    """Delete results cached under older data versions; they can never be read again."""
+    for path in cache_dir.glob("v*-*.arrow"):
+        if int(path.name[1:path.name.index("-")]) < version:
+            path.unlink(missing_ok=True)
+
+
+def cached_query(db_path: Path, sql: str, params: Dict[str, Any],
+                 cache_dir: Optional[Path] = None, use_cache: bool = True) -> Tuple[pa.Table, bool]:
+    """Result of sql over the database, from the cache when the data has not changed since.
+
+    Returns the result and whether it came from the cache. Cached results are
+    memory-mapped Arrow files, written to a temporary file and renamed so
+    concurrent runs never read a partial one.
+    """
+    cache_dir = Path(cache_dir or default_cache_dir(db_path))
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        version = data_version(conn)
+        if not use_cache or version is None:
+            return run_query(conn, sql, params), False
+        path = cache_dir / f"v{version}-{cache_key(sql, params, version)}.arrow"
+        if path.exists():
+            return pa.ipc.open_file(pa.memory_map(str(path))).read_all(), True
+        result = run_query(conn, sql, params)
+    finally:
+        conn.close()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, result.schema) as writer:
+        writer.write_table(result)
+    os.replace(tmp_path, path)
+    _prune(cache_dir, version)
+    return result, False
+
+
+def result_rows(result: pa.Table) -> List[Dict[str, Any]]:
+    """Result rows as dicts, with FLOAT columns (e.g. ROUND(CAST(... AS FLOAT), 2)) printed as rounded."""
+    for i, field in enumerate(result.schema):
+        if field.type == pa.float32():
+            result = result.set_column(i, field.name, result.column(i).cast(pa.string()).cast(pa.float64()))
+    return result.to_pylist()
+
+
+def write_result(result: pa.Table, output_format: str) -> None:
+    if output_format == "json":
+        print(json.dumps(result_rows(result), default=str, indent=2))
+    elif output_format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(result.column_names)
+        writer.writerows(tuple(row.values()) for row in result_rows(result))
+    else:
+        duckdb.from_arrow(result).show(max_rows=max(result.num_rows, 1))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Run the queries in queries/ with parameters and cached results")
+    parser.add_argument("queries", nargs="*", metavar="QUERY",
+                        help="Query names from queries/ (e.g. 2a 2b 2c) or paths to .sql files")
+    parser.add_argument("--db", type=Path, default=Path("odi_data.db"),
+                        help="Database to query (default: odi_data.db)")
+    parser.add_argument("--year", type=int, help="year parameter")
+    parser.add_argument("--gender", help="gender parameter, e.g. male or female")
+    parser.add_argument("--match-type", help="match_type parameter, e.g. ODI, T20 or Test")
+    parser.add_argument("--limit", type=int, help="limit parameter")
+    parser.add_argument("-p", "--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Any other parameter the query reads with getvariable (repeatable)")
+    parser.add_argument("--format", choices=("table", "csv", "json"), default="table",
+                        help="Output format (default: table)")
+    parser.add_argument("--cache-dir", type=Path,
+                        help="Directory for cached results (default: <db>.query_cache next to the database)")
+    parser.add_argument("--no-cache", action="store_true", help="Always run the query")
+    parser.add_argument("--list", action="store_true", help="List the named queries and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(named_queries()))
+        raise SystemExit(0)
+    if not args.queries:
+        parser.error("nothing to do: name at least one query")
+    try:
+        params = dict(parse_param(spec) for spec in args.param)
+        files = [resolve_query(name) for name in args.queries]
+    except ValueError as e:
+        parser.error(str(e))
+    for name in ("year", "gender", "match_type", "limit"):
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+
+    for path in files:
+        start = time.perf_counter()
+        result, cached = cached_query(args.db, path.read_text(), params, args.cache_dir, not args.no_cache)
+        logging.info(f"{path.stem}: {result.num_rows} rows {'from cache' if cached else 'computed'} "
+                     f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+        write_result(result, args.format)
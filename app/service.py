@@ -0,0 +1,245 @@
+# app/service.py
+# Read-only HTTP service over the queries in queries/, answered from the snapshot the
+# ingest writer refreshes after its commits (see snapshot.py), so clients never touch
+# the database file the writer holds. Results are JSON or Arrow IPC.
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import duckdb
+import pyarrow as pa
+from query import cache_key, data_version, named_queries, parse_param, resolve_query, result_rows, run_query
+from snapshot import default_snapshot_path
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# Results kept per snapshot; dropped with it when a newer snapshot is swapped in
+CACHED_RESULTS = 256
+
+
+class Generation:
+    """A pool of read-only connections to one snapshot file, and the results computed from it.
+
+    Each generation attaches the file to its own in-memory DuckDB instance, so
+    it keeps reading the file it opened even after the path is replaced.
+    """
+
+    def __init__(self, path: Path, identity: Tuple[int, int], size: int):
+        self.identity = identity
+        self.db = duckdb.connect()
+        escaped = str(path).replace("'", "''")
+        self.db.execute(f"ATTACH '{escaped}' AS snapshot (READ_ONLY);")
+        self.db.execute("USE snapshot;")
+        self.version = data_version(self.db)
+        self.idle = queue.Queue()
+        for _ in range(size):
+            cursor = self.db.cursor()
+            cursor.execute("USE snapshot;")
+            self.idle.put(cursor)
+        self.users = 0
+        self.retired = False
+        self._results: Dict[str, pa.Table] = {}
+        self._lock = threading.Lock()
+
+    def cached(self, key: str) -> Optional[pa.Table]:
+        with self._lock:
+            return self._results.get(key)
+
+    def store(self, key: str, result: pa.Table) -> None:
+        with self._lock:
+            if len(self._results) >= CACHED_RESULTS:
+                del self._results[next(iter(self._results))]
+            self._results[key] = result
+
+    def close(self) -> None:
+        while not self.idle.empty():
+            self.idle.get().close()
+        self.db.close()
+
+
+class SnapshotPool:
+    """Hands out read-only connections to the current snapshot.
+
+    A snapshot replaced on disk is picked up by the next request; connections
+    to the previous one are closed once the requests using them finish.
+    """
+
+    def __init__(self, path: Path, size: int = 4):
+        self.path = Path(path)
+        self.size = size
+        self._current: Optional[Generation] = None
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> Generation:
+        stat = os.stat(self.path)
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            current = self._current
+            if current is None or current.identity != identity:
+                if current:
+                    current.retired = True
+                    self._close_if_unused(current)
+                current = self._current = Generation(self.path, identity, self.size)
+                logging.info(f"Serving snapshot {self.path} at data version {current.version}")
+            current.users += 1
+            return current
+
+    def _close_if_unused(self, generation: Generation) -> None:
+        if generation.retired and generation.users == 0:
+            generation.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[Tuple[Generation, Any]]:
+        generation = self._acquire()
+        try:
+            cursor = generation.idle.get()
+            try:
+                yield generation, cursor
+            finally:
+                generation.idle.put(cursor)
+        finally:
+            with self._lock:
+                generation.users -= 1
+                self._close_if_unused(generation)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._current:
+                self._current.retired = True
+                self._close_if_unused(self._current)
+                self._current = None
+
+
+def answer(pool: SnapshotPool, name: str, params: Dict[str, Any]) -> Tuple[pa.Table, Optional[int]]:
+    """Result of a named query over the current snapshot, and the snapshot's data version."""
+    sql = resolve_query(name).read_text()
+    with pool.connection() as (generation, cursor):
+        key = cache_key(sql, params, generation.version)
+        result = generation.cached(key)
+        if result is None:
+            result = run_query(cursor, sql, params)
+            generation.store(key, result)
+        return result, generation.version
+
+
+def arrow_ipc(result: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, result.schema) as writer:
+        writer.write_table(result)
+    return sink.getvalue().to_pybytes()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET /queries, /health and /query/<name>?year=2019&gender=female[&format=arrow]."""
+
+    server_version = "cricket-query/1.0"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        try:
+            if path in ("", "/queries"):
+                self._send_json(HTTPStatus.OK, {"queries": named_queries()})
+            elif path == "/health":
+                with self.server.pool.connection() as (generation, _):
+                    self._send_json(HTTPStatus.OK, {"snapshot": str(self.server.pool.path),
+                                                    "data_version": generation.version})
+            elif path.startswith("/query/"):
+                self._query(path[len("/query/"):], dict(parse_qsl(url.query)))
+            else:
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": f"No such endpoint: {url.path}"})
+        except FileNotFoundError:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE,
+                            {"error": f"No snapshot at {self.server.pool.path} yet; ingest with --snapshot"})
+        except duckdb.Error as e:
+            logging.error(f"Error serving {url.path}: {e}")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+    def _query(self, name: str, args: Dict[str, str]) -> None:
+        output_format = args.pop("format", None)
+        if output_format is None:
+            output_format = "arrow" if ARROW_STREAM in self.headers.get("Accept", "") else "json"
+        if output_format not in ("json", "arrow"):
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"Unknown format {output_format}"})
+            return
+        # Only the files in queries/, never a path from the URL
+        if name not in named_queries():
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown query {name}"})
+            return
+        try:
+            params = dict(parse_param(f"{key}={value}") for key, value in args.items())
+        except ValueError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+        try:
+            result, version = answer(self.server.pool, name, params)
+        except duckdb.Error as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+        headers = {"X-Data-Version": str(version)}
+        if output_format == "arrow":
+            self._send(HTTPStatus.OK, arrow_ipc(result), ARROW_STREAM, headers)
+        else:
+            self._send_json(HTTPStatus.OK, {"query": name, "data_version": version,
+                                            "columns": result.column_names, "rows": result_rows(result)},
+                            headers)
+
+    def _send_json(self, status: HTTPStatus, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(body, default=str).encode(), "application/json", headers)
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str,
+              headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], pool: SnapshotPool):
+        super().__init__(address, QueryHandler)
+        self.pool = pool
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Serve the queries in queries/ from a read-only snapshot")
+    parser.add_argument("--db", type=Path, default=Path("odi_data.db"),
+                        help="Database whose snapshot is served (default: odi_data.db)")
+    parser.add_argument("--snapshot", type=Path,
+                        help="Snapshot file to serve (default: <db>.snapshot.db next to the database)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--connections", type=int, default=4,
+                        help="Read-only connections per snapshot; more requests wait for one (default: 4)")
+    args = parser.parse_args()
+
+    snapshot_path = args.snapshot or default_snapshot_path(args.db)
+    if not snapshot_path.exists():
+        logging.warning(f"No snapshot at {snapshot_path} yet; queries fail until an ingest run with --snapshot")
+    pool = SnapshotPool(snapshot_path, args.connections)
+    server = QueryServer((args.host, args.port), pool)
+    logging.info(f"Serving queries on http://{args.host}:{args.port}/ from {snapshot_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
@@ -0,0 +1,207 @@
+# app/shards.py
+# Sharded loading. Match ids are derived from the match files (flatten.match_uuid), so
+# several writer processes can each parse and load part of the files into a shard
+# database of their own, with nothing shared between them; the shards are then merged
+# into the main database with one INSERT ... SELECT per table.
+import logging
+import multiprocessing
+import duckdb
+import decoding
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+from flatten import MATCH_COLUMNS, PLAYER_COLUMNS, MATCH_PLAYER_COLUMNS, INNINGS_COLUMNS, MatchRows
+from columnar import BULK_NEW_PLAYERS, NEW_PLAYERS, ROW_BUDGET, ChunkBuffers
+from manifest import MANIFEST_COLUMNS, MANIFEST_UPSERT, MatchFile, release_matches, replace_matches
+from pipeline import _put, commit_chunk, parse_match
+from staging import QUARANTINE_COLUMNS, QUARANTINE_UPSERT, clear_quarantine
+from summaries import refresh_team_results, team_groups
+from snapshot import Snapshotter
+from metrics import METRICS
+from db_utils import bulk_loading, bump_data_version, initialize_db
+
+# Per-match summary tables, computed by the shard writers and copied as they are
+SHARD_SUMMARIES = ("batter_match_stats", "bowler_match_stats")
+
+
+def shard_paths(db_path, shards: int) -> List[Path]:
+    """Shard databases of db_path: <db>.shards/shard-<n>.db next to it."""
+    shard_dir = Path(db_path).with_suffix(".shards")
+    return [shard_dir / f"shard-{n}.db" for n in range(shards)]
+
+
+def remove_shard(path: Path) -> None:
+    for file in (path, path.with_name(path.name + ".wal")):
+        file.unlink(missing_ok=True)
+
+
+def shard_loop(shard_path: Path, queue, results, chunk_size: int, row_budget: int = ROW_BUDGET,
+               decoder: str = "auto", profile: Sequence[str] = (), profile_dir: str = "profiles") -> None:
+    """Shard writer: parse the match files from the queue and load them into a new shard database.
+
+    Runs until a None sentinel arrives, committing every chunk_size files like the
+    single writer, and puts the number of matches committed and this process's
+    metrics on results. Matches that replace an earlier load keep its match_id
+    but are inserted into the shard; the merge overwrites the earlier load.
+    """
+    METRICS.drain()  # forked with a copy of the parent's metrics
+    decoding.set_backend(decoder)
+    METRICS.enable_profiling(profile, profile_dir)
+    conn = None
+    chunk_num = 0
+    committed = 0
+    try:
+        remove_shard(shard_path)
+        conn = initialize_db(str(shard_path))
+        buffers = ChunkBuffers(row_budget=row_budget)
+        while True:
+            match_file = queue.get()
+            if match_file is None:
+                break
+            rows = parse_match(match_file)
+            if isinstance(rows, MatchRows):
+                rows.replaces = False
+            buffers.add(conn, rows)
+            if len(buffers) >= chunk_size:
+                chunk_num += 1
+                committed += commit_chunk(conn, buffers, f"{shard_path.stem}/{chunk_num}")
+
+        if len(buffers):
+            chunk_num += 1
+            committed += commit_chunk(conn, buffers, f"{shard_path.stem}/{chunk_num}")
+    finally:
+        if conn:
+            conn.close()
+        results.put((committed, METRICS.drain()))
+
+
+def _copy(conn, table: str, columns: Sequence[str], clause: str = "") -> int:
+    """INSERT ... SELECT the columns of a table from the attached shard. Returns the rows written."""
+    column_list = ", ".join(columns)
+    return conn.execute(f"""
+    INSERT INTO {table} ({column_list})
+    SELECT {column_list} FROM shard.{table}
+    {clause};
+    """).fetchone()[0]
+
+
+def merge_shard(conn, shard_path: Path) -> Dict[str, int]:
+    """Move a shard's rows into the database in one transaction. Returns rows written per table.
+
+    Matches already in the database (reloaded files) are released and overwritten
+    in place, as in ChunkBuffers.flush. The shard's per-match summary rows are
+    copied, and only the team_results groups of its matches are recomputed.
+    """
+    escaped = str(shard_path).replace("'", "''")
+    conn.execute(f"ATTACH '{escaped}' AS shard (READ_ONLY);")
+    try:
+        match_ids = [row[0] for row in conn.execute("SELECT match_id::TEXT FROM shard.matches;").fetchall()]
+        new_players = BULK_NEW_PLAYERS if bulk_loading(conn) else NEW_PLAYERS
+        replaced_ids = [row[0] for row in conn.execute("""
+        SELECT s.match_id::TEXT FROM shard.matches s JOIN matches m ON m.match_id = s.match_id;
+        """).fetchall()]
+        release_matches(conn, replaced_ids)
+
+        conn.execute("BEGIN")
+        try:
+            written = {}
+            stale_groups = team_groups(conn, replaced_ids)
+            if replaced_ids:
+                conn.execute(f"""
+                CREATE OR REPLACE TEMP TABLE merge_replaced AS
+                SELECT {", ".join(MATCH_COLUMNS)} FROM shard.matches
+                WHERE list_contains(?, match_id::TEXT);
+                """, [replaced_ids])
+                replace_matches(conn, "merge_replaced")
+                conn.execute("DROP TABLE merge_replaced;")
+                written["replaced_matches"] = len(replaced_ids)
+            written["players"] = _copy(conn, "players", PLAYER_COLUMNS, new_players)
+            written["matches"] = _copy(conn, "matches", MATCH_COLUMNS,
+                                       "WHERE match_id NOT IN (SELECT match_id FROM matches)")
+            written["match_players"] = _copy(conn, "match_players", MATCH_PLAYER_COLUMNS)
+            written["innings"] = _copy(conn, "innings", INNINGS_COLUMNS,
+                                       "ORDER BY match_date, match_id, innings_number, over, ball")
+            for table in SHARD_SUMMARIES:
+                written[table] = conn.execute(
+                    f"INSERT INTO {table} BY NAME SELECT * FROM shard.{table};"
+                ).fetchone()[0]
+            clear_quarantine(conn, "shard.ingest_manifest")
+            written["ingest_manifest"] = _copy(conn, "ingest_manifest", MANIFEST_COLUMNS, MANIFEST_UPSERT)
+            written["ingest_quarantine"] = _copy(conn, "ingest_quarantine", QUARANTINE_COLUMNS, QUARANTINE_UPSERT)
+            written["team_results"] = refresh_team_results(conn, match_ids, stale_groups)
+            bump_data_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("DETACH shard;")
+    return written
+
+
+def run_sharded(match_files: Iterable[MatchFile], db_path: str, shards: int, chunk_size: int,
+                queue_size: int = 16, decoder: str = "auto", row_budget: int = ROW_BUDGET,
+                snapshot: Optional[Snapshotter] = None, profile: Sequence[str] = (),
+                profile_dir: str = "profiles") -> int:
+    """Load the files into shards from parallel writer processes, then merge the shards into db_path.
+
+    Files are dealt to the shard writers in turn, at most queue_size waiting on
+    each. Every shard is merged in its own transaction and deleted once merged; a
+    shard that fails to merge is kept for inspection, and its files are loaded
+    again by the next run. Returns the number of matches merged.
+    """
+    paths = shard_paths(db_path, shards)
+    paths[0].parent.mkdir(exist_ok=True)
+    results = multiprocessing.Queue()
+    queues, writers = [], []
+    for path in paths:
+        queue = multiprocessing.Queue(maxsize=queue_size)
+        writer = multiprocessing.Process(target=shard_loop, args=(path, queue, results, chunk_size, row_budget,
+                                                                  decoder, profile, profile_dir))
+        writer.start()
+        queues.append(queue)
+        writers.append(writer)
+
+    try:
+        for n, match_file in enumerate(match_files):
+            _put(queues[n % shards], match_file, writers[n % shards])
+    finally:
+        for queue, writer in zip(queues, writers):
+            _put(queue, None, writer)
+
+    loaded = 0
+    for _ in writers:
+        committed, shard_metrics = results.get()
+        METRICS.merge(shard_metrics)
+        loaded += committed
+    for writer in writers:
+        writer.join()
+    logging.info(f"Loaded {loaded} matches into {shards} shards; merging them into {db_path}")
+
+    merged = 0
+    conn = duckdb.connect(db_path)
+    try:
+        for path in paths:
+            try:
+                with METRICS.timer("merge"):
+                    written = merge_shard(conn, path)
+            except Exception as e:
+                METRICS.count("shards_failed")
+                logging.error(f"Error merging {path}: {e}; its files are loaded again by the next run")
+                continue
+            for table, rows in written.items():
+                METRICS.count("rows_merged", rows, table=table)
+            merged += written["ingest_manifest"]
+            logging.info(f"Merged {path.name} ({written['ingest_manifest']} matches, "
+                         f"{written['innings']} deliveries, {written['ingest_quarantine']} quarantined)")
+            remove_shard(path)
+            if snapshot:
+                with METRICS.timer("snapshot"):
+                    snapshot.after_commit(conn)
+        if snapshot:
+            with METRICS.timer("snapshot"):
+                snapshot.flush(conn)
+    finally:
+        conn.close()
+    if not any(paths[0].parent.iterdir()):
+        paths[0].parent.rmdir()
+    return merged
@@ -0,0 +1,81 @@
+# app/snapshot.py
+# Read-only copy of the database for readers such as service.py. DuckDB lets one
+# process write the file and blocks everyone else, so the ingest writer copies it
+# between commits and readers only ever open the copy. Self-contained so it can run
+# as `python -m app.snapshot`.
+import argparse
+import logging
+import os
+import shutil
+import time
+import duckdb
+from pathlib import Path
+
+
+def default_snapshot_path(db_path) -> Path:
+    return Path(db_path).with_suffix(".snapshot.db")
+
+
+def write_snapshot(conn, db_path, snapshot_path) -> Path:
+    """Checkpoint the database and copy it over snapshot_path in one atomic rename.
+
+    Call between transactions on the connection that writes the database, so
+    nothing changes the file while it is copied. Readers that still have the
+    previous snapshot open keep reading it until they reopen the path.
+    """
+    snapshot_path = Path(snapshot_path)
+    conn.execute("CHECKPOINT;")
+    tmp_path = snapshot_path.with_name(snapshot_path.name + ".tmp")
+    shutil.copyfile(db_path, tmp_path)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+class Snapshotter:
+    """Refreshes the snapshot after commits, at most once every interval seconds."""
+
+    def __init__(self, db_path, snapshot_path=None, interval: float = 30.0):
+        self.db_path = Path(db_path)
+        self.path = Path(snapshot_path or default_snapshot_path(db_path))
+        self.interval = interval
+        self.taken_at = None
+        self.stale = False  # commits since the last snapshot
+
+    def write(self, conn) -> bool:
+        """Write a snapshot now. A failure is logged and leaves the previous snapshot in
+        place; it never fails the ingest. Returns whether a snapshot was written."""
+        try:
+            write_snapshot(conn, self.db_path, self.path)
+        except Exception as e:
+            logging.error(f"Could not write snapshot {self.path}: {e}")
+            return False
+        self.taken_at = time.monotonic()
+        self.stale = False
+        logging.info(f"Wrote snapshot {self.path}")
+        return True
+
+    def after_commit(self, conn) -> bool:
+        """Write a snapshot if the last one is older than the interval."""
+        self.stale = True
+        if self.taken_at is not None and time.monotonic() - self.taken_at < self.interval:
+            return False
+        return self.write(conn)
+
+    def flush(self, conn) -> bool:
+        """Write a snapshot if commits since the last one are missing from it, e.g. at the end of a run."""
+        if self.stale or not self.path.exists():
+            return self.write(conn)
+        return False
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Copy the database to a read-only snapshot")
+    parser.add_argument("db", type=Path, help="Database to copy (must not be open in another process)")
+    parser.add_argument("snapshot", type=Path, nargs="?",
+                        help="Snapshot file (default: <db>.snapshot.db next to the database)")
+    args = parser.parse_args()
+
+    conn = duckdb.connect(str(args.db))
+    Snapshotter(args.db, args.snapshot).write(conn)
+    conn.close()
@@ -0,0 +1,216 @@
+# app/sources.py
+import asyncio
+import json
+import logging
+import os
+import time
+import zipfile
+import requests
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
+
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+
+CRICSHEET_DOWNLOADS = "https://cricsheet.org/downloads"
+
+# Cricsheet archives that can be named on the command line instead of given as a URL
+COMPETITIONS = ("odis", "t20s", "tests", "ipl", "bbl", "psl", "cpl")
+
+
+class FetchResult(NamedTuple):
+    path: Path
+    changed: bool  # False when the cached archive was still current
+    ingested: bool  # the cached archive was fully ingested by an earlier run
+
+
+class Source(NamedTuple):
+    """An archive to ingest; name tags every file loaded from it."""
+    name: str
+    url: str
+
+    @property
+    def filename(self) -> str:
+        return Path(urlparse(self.url).path).name
+
+
+def archive_name(path: str) -> str:
+    """Tag for an archive file, e.g. odis for odis_json.zip."""
+    name = Path(path).name
+    for suffix in (".zip", "_json"):
+        name = name[:-len(suffix)] if name.endswith(suffix) else name
+    return name
+
+
+def resolve_source(spec: str) -> Source:
+    """A Source from a competition name (see COMPETITIONS) or an archive URL."""
+    if spec in COMPETITIONS:
+        return Source(spec, f"{CRICSHEET_DOWNLOADS}/{spec}_json.zip")
+    if not urlparse(spec).scheme:
+        raise ValueError(f"Unknown source {spec!r}: expected a URL or one of {', '.join(COMPETITIONS)}")
+    return Source(archive_name(urlparse(spec).path), spec)
+
+
+def make_session(retries: int = 3, backoff: float = 0.5) -> requests.Session:
+    """Pooled session that retries connection errors and transient HTTP statuses with backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+    )
+    adapter = HTTPAdapter(max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _meta_path(zip_path: Path) -> Path:
+    return zip_path.with_name(zip_path.name + ".meta.json")
+
+
+def _load_meta(zip_path: Path) -> Dict[str, Any]:
+    try:
+        with open(_meta_path(zip_path)) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_meta(zip_path: Path, meta: Dict[str, Any]) -> None:
+    meta_path = _meta_path(zip_path)
+    tmp_path = meta_path.with_name(meta_path.name + ".tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(meta, file)
+    os.replace(tmp_path, meta_path)
+
+
+def mark_ingested(zip_path: Path) -> None:
+    """Record that the cached archive has been fully ingested."""
+    meta = _load_meta(zip_path)
+    if meta:
+        meta["ingested"] = True
+        _save_meta(zip_path, meta)
+
+
+def fetch_archive(url: str, zip_path: Path, session: Optional[requests.Session] = None,
+                  timeout: float = 60, retries: int = 3, backoff: float = 0.5) -> FetchResult:
+    """Download an archive into a local cache, skipping the transfer when it is unchanged.
+
+    The ETag and Last-Modified of the cached archive are stored next to it and sent as
+    a conditional request, so an unchanged archive costs one 304 round trip. The body
+    is streamed to a .part file that is renamed into place once complete; a transfer
+    cut off midway resumes from the .part file with a Range request guarded by
+    If-Range, on a later attempt or a later run.
+    """
+    session = session or make_session(retries, backoff)
+    os.makedirs(zip_path.parent, exist_ok=True)
+    partial_path = zip_path.with_name(zip_path.name + ".part")
+
+    for attempt in range(retries + 1):
+        meta = _load_meta(zip_path)
+        if meta.get("url") != url:
+            meta = {"url": url}
+
+        headers = {}
+        if zip_path.exists():
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        partial = meta.get("partial", {})
+        if partial_path.exists() and (partial.get("etag") or partial.get("last_modified")):
+            headers["Range"] = f"bytes={partial_path.stat().st_size}-"
+            headers["If-Range"] = partial.get("etag") or partial["last_modified"]
+
+        try:
+            logging.info(f"Downloading file from {url}...")
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304:
+                    logging.info(f"Archive at {url} is unchanged; using cached {zip_path}")
+                    return FetchResult(zip_path, False, meta.get("ingested", False))
+                if response.status_code == 416:
+                    # The partial file no longer lines up with the remote archive; start over
+                    os.remove(partial_path)
+                    meta.pop("partial", None)
+                    _save_meta(zip_path, meta)
+                    continue
+                response.raise_for_status()
+
+                validators = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+                resume = response.status_code == 206
+                meta["partial"] = validators
+                _save_meta(zip_path, meta)
+
+                with open(partial_path, "ab" if resume else "wb") as file:
+                    for block in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                        file.write(block)
+
+            os.replace(partial_path, zip_path)
+            _save_meta(zip_path, {"url": url, **validators, "ingested": False})
+            logging.info(f"Downloaded zip file to {zip_path}")
+            return FetchResult(zip_path, True, False)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == retries:
+                logging.error("Failed to download the zip file.")
+                raise
+            delay = backoff * 2 ** attempt
+            logging.warning(f"Download of {url} interrupted ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    raise RuntimeError(f"Could not download {url} after {retries + 1} attempts")
+
+
+async def _fetch_concurrently(sources: Sequence[Source], data_dir: Path, **kwargs) -> List[Any]:
+    # Each download runs on its own thread with its own session; requests sessions are not thread-safe
+    return list(await asyncio.gather(*(
+        asyncio.to_thread(fetch_archive, source.url, data_dir / source.filename, **kwargs) for source in sources
+    ), return_exceptions=True))
+
+
+def fetch_archives(sources: Sequence[Source], data_dir: Path, **kwargs) -> List[Optional[FetchResult]]:
+    """fetch_archive for every source at once, caching each as data_dir/<archive file name>.
+
+    Results are in the order of sources, with None for a source that could not be
+    fetched, so one failing download does not stop the others. kwargs are passed
+    on to fetch_archive.
+    """
+    results = []
+    for source, result in zip(sources, asyncio.run(_fetch_concurrently(sources, data_dir, **kwargs))):
+        if isinstance(result, Exception):
+            logging.error(f"Could not fetch {source.name} from {source.url}: {result}")
+            result = None
+        results.append(result)
+    return results
+
+
+def cached_archive(zip_path: Path) -> FetchResult:
+    """Use an archive already on disk without touching the network."""
+    if not zip_path.exists():
+        raise FileNotFoundError(f"No archive at {zip_path}")
+    return FetchResult(zip_path, False, _load_meta(zip_path).get("ingested", False))
+
+
+def _match_members(zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Match JSON members of a Cricsheet archive, in archive order (skips the README)."""
+    return [member for member in zip_ref.infolist()
+            if not member.is_dir() and member.filename.endswith(".json")]
+
+
+def count_zip_matches(zip_path: Path) -> int:
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        return len(_match_members(zip_ref))
+
+
+def iter_zip_matches(zip_path: Path, limit: Optional[int] = None) -> Iterator[Tuple[str, bytes]]:
+    """Yield (file name, raw JSON) for each match read straight out of the archive."""
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        for member in _match_members(zip_ref)[:limit]:
+            with zip_ref.open(member) as file:
+                yield os.path.basename(member.filename), file.read()
@@ -0,0 +1,153 @@
+# app/staging.py
+# Per-match validation of a staged chunk: the buffered rows sit in temporary tables,
+# every row is checked against the target table's constraints with one set-based
+# query per table, and matches that would fail are quarantined instead of aborting
+# the chunk.
+import logging
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from db_utils import BULK_KEYS
+
+QUARANTINE_COLUMNS = ("source_file", "content_hash", "reason", "error")
+
+QUARANTINE_UPSERT = """
+ON CONFLICT (source_file) DO UPDATE SET
+    content_hash = EXCLUDED.content_hash,
+    reason = EXCLUDED.reason,
+    error = EXCLUDED.error,
+    quarantined_at = now()
+"""
+
+# Temporary table of (match_id, error) for the matches left out of the current chunk
+REJECTS = "stage_rejects"
+
+# Quarantine reasons that say nothing about the file itself, so it may load if tried again
+RETRIED_REASONS = ("error", "write_failed")
+
+_INTEGER_TYPES = {"TINYINT", "SMALLINT", "INTEGER", "BIGINT", "UTINYINT", "USMALLINT", "UINTEGER"}
+
+
+class RejectedFile(NamedTuple):
+    """A match file that could not be loaded, recorded in ingest_quarantine."""
+    source: str
+    content_hash: str
+    reason: str
+    error: str
+
+
+def _target_columns(conn, table: str) -> Dict[str, tuple]:
+    """Map each column of table to (data type, nullable)."""
+    rows = conn.execute("""
+    SELECT column_name, data_type, is_nullable = 'YES'
+    FROM information_schema.columns
+    WHERE table_schema = 'main' AND table_name = ?;
+    """, [table]).fetchall()
+    return {column: (data_type, nullable) for column, data_type, nullable in rows}
+
+
+def staging_type(data_type: str) -> str:
+    """The staging column type for a target column type.
+
+    Wide enough to hold any value a loader produces for the column, so values the
+    target would refuse reach the checks below instead of failing the staging insert.
+    """
+    if data_type.endswith("[]"):
+        return staging_type(data_type[:-2]) + "[]"
+    if data_type in _INTEGER_TYPES:
+        return "BIGINT"
+    if data_type in ("DATE", "UUID") or data_type.startswith("TIMESTAMP"):
+        return "VARCHAR"
+    return data_type
+
+
+def create_staging_table(conn, staged: str, target: str, columns: Sequence[str]) -> None:
+    """(Re)create the temporary staging table for columns of target."""
+    types = _target_columns(conn, target)
+    column_defs = ", ".join(f"{column} {staging_type(types[column][0])}" for column in columns)
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE {staged} ({column_defs});")
+
+
+def _unique_keys(conn, table: str) -> List[List[str]]:
+    rows = conn.execute("""
+    SELECT constraint_column_names
+    FROM duckdb_constraints()
+    WHERE schema_name = 'main' AND table_name = ? AND constraint_type IN ('PRIMARY KEY', 'UNIQUE');
+    """, [table]).fetchall()
+    keys = [columns for (columns,) in rows]
+    if not keys and table in BULK_KEYS:
+        # Deferred by a bulk load, but a chunk's own rows are still checked against it
+        keys = [list(BULK_KEYS[table])]
+    return keys
+
+
+def constraint_checks(conn, staged: str, target: str, columns: Sequence[str], key: str = "match_id") -> str:
+    """SELECT of (key, error) for every staged row that target would refuse.
+
+    Checks NOT NULL columns, values that do not cast to the column type and
+    primary/unique keys duplicated within the staged rows, in one pass over them.
+    """
+    types = _target_columns(conn, target)
+    problems = []
+    for column in columns:
+        data_type, nullable = types[column]
+        if not nullable:
+            problems.append(f"CASE WHEN {column} IS NULL THEN '{target}.{column} is NULL' END")
+        problems.append(f"""CASE WHEN {column} IS NOT NULL AND TRY_CAST({column} AS {data_type}) IS NULL
+            THEN '{target}.{column} is not a valid {data_type}: ' || {column}::TEXT END""")
+    counts = []
+    for i, unique in enumerate(_unique_keys(conn, target)):
+        if set(unique) <= set(columns):
+            key_list = ", ".join(unique)
+            counts.append(f"count(*) OVER (PARTITION BY {key_list}) AS duplicates_{i}")
+            problems.append(f"CASE WHEN duplicates_{i} > 1 THEN 'duplicate {target} key ({key_list})' END")
+    return f"""
+    SELECT {key}, error FROM (
+        SELECT {key}, concat_ws('; ', {", ".join(problems)}) AS error
+        FROM (SELECT *{"".join(", " + count for count in counts)} FROM {staged})
+    )
+    WHERE error <> ''
+    """
+
+
+def find_rejects(conn, checks: Sequence[str]) -> Dict[str, str]:
+    """Collect the matches failing any check into the REJECTS table; returns match_id -> error.
+
+    A match is rejected as a whole if any of its rows fails, reporting the first
+    problem found and how many more there were.
+    """
+    conn.execute(f"""
+    CREATE OR REPLACE TEMP TABLE {REJECTS} AS
+    SELECT
+        match_id,
+        min(error) || CASE WHEN count(*) > 1 THEN ' (and ' || (count(*) - 1) || ' more)' ELSE '' END AS error
+    FROM ({" UNION ALL ".join(checks) if checks else "SELECT NULL AS match_id, NULL AS error LIMIT 0"})
+    GROUP BY match_id;
+    """)
+    rejects = dict(conn.execute(f"SELECT match_id::TEXT, error FROM {REJECTS}").fetchall())
+    for match_id, error in rejects.items():
+        logging.warning(f"Quarantining match {match_id}: {error}")
+    return rejects
+
+
+def discard_rejects(conn, staged: Optional[str]) -> None:
+    """Remove the rejected matches' rows from a staging table."""
+    if staged:
+        conn.execute(f"DELETE FROM {staged} WHERE match_id IN (SELECT match_id FROM {REJECTS});")
+
+
+def quarantine_rejects(conn, staged_manifest: str) -> int:
+    """Record the rejected matches' source files in ingest_quarantine. Returns the number recorded."""
+    return conn.execute(f"""
+    INSERT INTO ingest_quarantine ({", ".join(QUARANTINE_COLUMNS)})
+    SELECT m.source_file, m.content_hash, 'constraint', r.error
+    FROM {REJECTS} r
+    JOIN {staged_manifest} m ON m.match_id = r.match_id
+    {QUARANTINE_UPSERT};
+    """).fetchone()[0]
+
+
+def clear_quarantine(conn, staged_manifest: str) -> None:
+    """Drop quarantine entries for source files that have now loaded."""
+    conn.execute(f"""
+    DELETE FROM ingest_quarantine
+    WHERE source_file IN (SELECT source_file FROM {staged_manifest});
+    """)
@@ -0,0 +1,110 @@
+# app/structs.py
+# msgspec mirrors of the pydantic models in preprocessing.py. Field names match the
+# models, so the flattening code reads either interchangeably. Requires msgspec.
+from typing import Dict, List, Optional, Union
+import msgspec
+
+
+class TossStruct(msgspec.Struct):
+    decision: str
+    winner: str
+    uncontested: Optional[bool] = None
+
+
+class OutcomeStruct(msgspec.Struct):
+    winner: Optional[str] = None
+    by: Optional[Dict[str, int]] = None
+    method: Optional[str] = None
+    result: Optional[str] = None
+    eliminator: Optional[str] = None
+
+
+class EventStruct(msgspec.Struct):
+    name: str
+    match_number: Optional[int] = None
+    group: Optional[str] = None
+    stage: Optional[str] = None
+
+
+class OfficialsStruct(msgspec.Struct):
+    match_referees: Optional[List[str]] = None
+    reserve_umpires: Optional[List[str]] = None
+    tv_umpires: Optional[List[str]] = None
+    umpires: Optional[List[str]] = None
+
+
+class InfoStruct(msgspec.Struct):
+    dates: List[str]
+    gender: str
+    match_type: str
+    outcome: OutcomeStruct
+    players: Dict[str, List[str]]
+    registry: Dict[str, Dict[str, str]]
+    season: Union[str, int]
+    team_type: str
+    teams: List[str]
+    toss: TossStruct
+    balls_per_over: int = 6
+    city: Optional[str] = None
+    event: Optional[EventStruct] = None
+    officials: Optional[OfficialsStruct] = None
+    overs: Optional[int] = None
+    player_of_match: Optional[List[str]] = None
+    venue: Optional[str] = None
+
+
+class RunsStruct(msgspec.Struct):
+    batter: int = 0
+    extras: int = 0
+    total: int = 0
+    non_boundary: Optional[bool] = None
+
+
+class ExtrasStruct(msgspec.Struct):
+    byes: Optional[int] = None
+    legbyes: Optional[int] = None
+    noballs: Optional[int] = None
+    penalty: Optional[int] = None
+    wides: Optional[int] = None
+
+
+class WicketFielderStruct(msgspec.Struct):
+    name: str
+    substitute: Optional[bool] = None
+
+
+class WicketStruct(msgspec.Struct):
+    kind: str
+    player_out: str
+    fielders: Optional[List[WicketFielderStruct]] = None
+
+
+class DeliveryStruct(msgspec.Struct):
+    batter: str
+    bowler: str
+    non_striker: str
+    runs: RunsStruct
+    extras: Optional[ExtrasStruct] = None
+    wickets: Optional[List[WicketStruct]] = None
+
+
+class OverStruct(msgspec.Struct):
+    over: int
+    deliveries: List[DeliveryStruct]
+
+
+class InningsStruct(msgspec.Struct):
+    team: str
+    overs: List[OverStruct] = []
+    declared: Optional[bool] = None
+    forfeited: Optional[bool] = None
+    super_over: Optional[bool] = None
+
+
+class MatchStruct(msgspec.Struct):
+    info: InfoStruct
+    innings: List[InningsStruct]
+
+
+# strict=False allows the same lax coercions pydantic applies (e.g. "5" -> 5)
+match_decoder = msgspec.json.Decoder(MatchStruct, strict=False)
@@ -0,0 +1,203 @@
+# app/summaries.py
+# Summary tables kept in step with the base tables as each chunk commits (schema in
+# db_utils.py). Self-contained so it can run as `python -m app.summaries`.
+import argparse
+import logging
+import duckdb
+import pyarrow as pa
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+SUMMARY_TABLES = ("team_results", "batter_match_stats", "bowler_match_stats")
+
+# Matches counted in win records: decided, and not decided by D/L
+COUNTED_RESULT = "outcome_result IS NULL AND (outcome_method IS NULL OR outcome_method NOT LIKE '%D/L%')"
+
+# Dismissal kinds credited to the bowler
+BOWLER_WICKETS = ("bowled", "caught", "caught and bowled", "lbw", "stumped", "hit wicket")
+
+# Dismissals that leave the batter not out (as flatten.NOT_OUT_DISMISSALS)
+NOT_OUT_DISMISSALS = ("retired hurt", "retired not out")
+
+
+def _sql_list(values: Sequence[str]) -> str:
+    return ", ".join(f"'{value}'" for value in values)
+
+
+_TEAM_MATCHES = f"""
+SELECT team_1 AS team, year, gender, match_type, CASE WHEN outcome_winner = team_1 THEN 1 ELSE 0 END AS won
+FROM matches WHERE {COUNTED_RESULT}
+UNION ALL
+SELECT team_2 AS team, year, gender, match_type, CASE WHEN outcome_winner = team_2 THEN 1 ELSE 0 END AS won
+FROM matches WHERE {COUNTED_RESULT}
+"""
+
+_BATTER_STATS = f"""
+WITH deliveries AS (
+    SELECT i.match_id, i.match_date, m.year, m.gender, m.match_type, i.batter, i.runs_batter,
+           i.runs_non_boundary, i.extras_wides, i.player_out, i.wicket_type
+    FROM innings i
+    JOIN matches m ON m.match_id = i.match_id
+    WHERE {{where}}
+),
+dismissals AS (
+    SELECT match_id, player_out AS batter, count(*) AS dismissals
+    FROM deliveries
+    WHERE player_out IS NOT NULL AND coalesce(wicket_type, '') NOT IN ({_sql_list(NOT_OUT_DISMISSALS)})
+    GROUP BY match_id, player_out
+)
+SELECT
+    d.match_id,
+    d.batter,
+    any_value(d.match_date) AS match_date,
+    any_value(d.year) AS year,
+    any_value(d.gender) AS gender,
+    any_value(d.match_type) AS match_type,
+    count(*) FILTER (WHERE NOT coalesce(d.extras_wides > 0, FALSE)) AS balls_faced,
+    sum(d.runs_batter) AS runs,
+    count(*) FILTER (WHERE d.runs_batter = 4 AND NOT coalesce(d.runs_non_boundary, FALSE)) AS fours,
+    count(*) FILTER (WHERE d.runs_batter = 6 AND NOT coalesce(d.runs_non_boundary, FALSE)) AS sixes,
+    coalesce(any_value(x.dismissals), 0) AS dismissals
+FROM deliveries d
+LEFT JOIN dismissals x ON x.match_id = d.match_id AND x.batter = d.batter
+GROUP BY d.match_id, d.batter
+"""
+
+_BOWLER_STATS = f"""
+SELECT
+    i.match_id,
+    i.bowler,
+    any_value(i.match_date) AS match_date,
+    any_value(m.year) AS year,
+    any_value(m.gender) AS gender,
+    any_value(m.match_type) AS match_type,
+    count(*) FILTER (WHERE coalesce(i.extras_wides, 0) = 0 AND coalesce(i.extras_noballs, 0) = 0) AS balls,
+    sum(i.runs_batter + coalesce(i.extras_wides, 0) + coalesce(i.extras_noballs, 0)) AS runs_conceded,
+    count(*) FILTER (WHERE i.wicket_type IN ({_sql_list(BOWLER_WICKETS)})) AS wickets
+FROM innings i
+JOIN matches m ON m.match_id = i.match_id
+WHERE {{where}}
+GROUP BY i.match_id, i.bowler
+"""
+
+
+def team_groups(conn, match_ids: Sequence[str]) -> List[Tuple[str, int, str, str]]:
+    """(team, year, gender, match_type) groups the given matches currently count towards."""
+    if not match_ids:
+        return []
+    return conn.execute("""
+    SELECT DISTINCT team, year, gender, match_type FROM (
+        SELECT match_id, team_1 AS team, year, gender, match_type FROM matches
+        UNION ALL
+        SELECT match_id, team_2 AS team, year, gender, match_type FROM matches
+    )
+    WHERE list_contains(?, match_id::TEXT);
+    """, [list(match_ids)]).fetchall()
+
+
+def _refresh_team_results(conn, groups: Iterable[Tuple[str, int, str, str]]) -> int:
+    groups = list(set(groups))
+    if not groups:
+        return 0
+    view = "team_results_groups"
+    teams, years, genders, match_types = zip(*groups)
+    conn.register(view, pa.table({"team": list(teams), "year": list(years), "gender": list(genders),
+                                  "match_type": list(match_types)}))
+    try:
+        conn.execute(f"""
+        DELETE FROM team_results
+        WHERE (team, year, gender, match_type) IN (SELECT team, year, gender, match_type FROM {view});
+        """)
+        conn.execute(f"""
+        INSERT INTO team_results (team, year, gender, match_type, matches, wins)
+        SELECT team, year, gender, match_type, count(*), sum(won)
+        FROM ({_TEAM_MATCHES})
+        WHERE (team, year, gender, match_type) IN (SELECT team, year, gender, match_type FROM {view})
+        GROUP BY team, year, gender, match_type;
+        """)
+    finally:
+        conn.unregister(view)
+    return len(groups)
+
+
+def refresh_team_results(conn, match_ids: Sequence[str],
+                         stale_groups: Iterable[Tuple[str, int, str, str]] = ()) -> int:
+    """Recompute only the team_results groups of match_ids and stale_groups, for matches whose
+    per-match summary rows were computed elsewhere (see shards.merge_shard). Returns the groups refreshed."""
+    return _refresh_team_results(conn, list(stale_groups) + team_groups(conn, match_ids))
+
+
+def refresh_summaries(conn, match_ids: Sequence[str],
+                      stale_groups: Iterable[Tuple[str, int, str, str]] = ()) -> Dict[str, int]:
+    """Recompute the summary rows touched by a chunk, inside the chunk's transaction.
+
+    Per-match rows are rebuilt for match_ids from their deliveries only; the
+    chunk's date range lets zone maps on innings.match_date skip other row groups.
+    stale_groups are team groups replaced matches counted towards before they were
+    overwritten (see team_groups). Returns the rows or groups refreshed per table.
+    """
+    if not match_ids:
+        return {}
+    match_ids = list(match_ids)
+    first, last = conn.execute(
+        "SELECT min(date), max(date) FROM matches WHERE list_contains(?, match_id::TEXT);", [match_ids]
+    ).fetchone()
+    where = "list_contains(?, i.match_id::TEXT) AND i.match_date BETWEEN ? AND ?"
+
+    refreshed = {}
+    for table, select in (("batter_match_stats", _BATTER_STATS), ("bowler_match_stats", _BOWLER_STATS)):
+        conn.execute(f"DELETE FROM {table} WHERE list_contains(?, match_id::TEXT);", [match_ids])
+        refreshed[table] = conn.execute(
+            f"INSERT INTO {table} {select.format(where=where)};", [match_ids, first, last]
+        ).fetchone()[0]
+    refreshed["team_results"] = refresh_team_results(conn, match_ids, stale_groups)
+    return refreshed
+
+
+def _bump_data_version(conn) -> None:
+    # As db_utils.bump_data_version, so cached query results over the old summaries go stale
+    if conn.execute("SELECT count(*) FROM information_schema.tables WHERE table_name = 'data_version'").fetchone()[0]:
+        conn.execute("UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP;")
+
+
+def rebuild_summaries(conn) -> Dict[str, int]:
+    """Regenerate every summary table from the base tables in one transaction, as a new data version."""
+    conn.execute("BEGIN")
+    try:
+        for table in SUMMARY_TABLES:
+            conn.execute(f"DELETE FROM {table};")
+        conn.execute(f"""
+        INSERT INTO team_results (team, year, gender, match_type, matches, wins)
+        SELECT team, year, gender, match_type, count(*), sum(won)
+        FROM ({_TEAM_MATCHES})
+        GROUP BY team, year, gender, match_type;
+        """)
+        conn.execute(f"INSERT INTO batter_match_stats {_BATTER_STATS.format(where='TRUE')};")
+        conn.execute(f"INSERT INTO bowler_match_stats {_BOWLER_STATS.format(where='TRUE')};")
+        counts = {table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in SUMMARY_TABLES}
+        _bump_data_version(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    logging.info(f"Rebuilt summaries: {counts}")
+    return counts
+
+
+def summaries_missing(conn) -> bool:
+    """Whether deliveries were loaded before the summary tables existed."""
+    return conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM innings) AND NOT EXISTS (SELECT 1 FROM batter_match_stats)"
+    ).fetchone()[0]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Summary table maintenance")
+    parser.add_argument("--rebuild", metavar="DB_FILE", required=True,
+                        help="Regenerate all summary tables from the base tables")
+    args = parser.parse_args()
+
+    conn = duckdb.connect(args.rebuild)
+    counts = rebuild_summaries(conn)
+    conn.close()
+    print(", ".join(f"{table}: {rows} rows" for table, rows in counts.items()))
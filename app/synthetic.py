@@ -0,0 +1,197 @@
+# app/synthetic.py
+# Synthetic Cricsheet-shaped ODI match files for benchmarks, in the shapes accepted by
+# the models in preprocessing.py. Seeded, so the same arguments give the same archive.
+import argparse
+import json
+import random
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+TEAMS = (
+    "Afghanistan", "Australia", "Bangladesh", "England", "India", "Ireland", "Netherlands",
+    "New Zealand", "Pakistan", "Scotland", "South Africa", "Sri Lanka", "West Indies", "Zimbabwe",
+)
+
+VENUES = (
+    ("Melbourne Cricket Ground", "Melbourne"), ("Lord's, London", "London"), ("Eden Gardens", "Kolkata"),
+    ("Gaddafi Stadium", "Lahore"), ("Newlands", "Cape Town"), ("Shere Bangla National Stadium", "Mirpur"),
+    ("Eden Park", "Auckland"), ("Kensington Oval, Bridgetown", "Bridgetown"), ("R Premadasa Stadium", "Colombo"),
+    ("Harare Sports Club", "Harare"), ("The Grange Club, Edinburgh", "Edinburgh"), ("Sharjah Cricket Stadium", None),
+)
+
+# Relative frequencies per delivery, roughly those of men's ODIs
+RUNS_OFF_BAT = ((0, 48), (1, 32), (2, 8), (3, 1), (4, 9), (6, 2))
+WICKET_KINDS = (("caught", 60), ("bowled", 17), ("lbw", 12), ("run out", 7), ("stumped", 3), ("caught and bowled", 1))
+WICKET_RATE = 1 / 32
+WIDE_RATE = 0.03
+NOBALL_RATE = 0.005
+BYES_RATE = 0.015
+
+
+def _registry_id(name: str) -> str:
+    """Stable id per person across matches, like the Cricsheet registry."""
+    return f"{zlib.crc32(name.encode()):08x}"
+
+
+def _choice(rnd: random.Random, weighted) -> Any:
+    values, weights = zip(*weighted)
+    return rnd.choices(values, weights)[0]
+
+
+def _innings(rnd: random.Random, team: str, batting: List[str], bowling: List[str],
+             target: Optional[int] = None, overs: int = 50) -> Dict[str, Any]:
+    """One innings, ending when 10 wickets fall, the overs run out or the target is reached."""
+    bowlers = bowling[6:] + bowling[4:6]
+    striker, non_striker, next_batter = 0, 1, 2
+    runs = wickets = 0
+    over_list = []
+    for over in range(overs):
+        bowler = bowlers[over % len(bowlers)] if over % 2 == 0 else bowlers[(over + 3) % len(bowlers)]
+        deliveries = []
+        legal = 0
+        while legal < 6:
+            extras = {}
+            off_bat = 0
+            if rnd.random() < WIDE_RATE:
+                extras["wides"] = 1 if rnd.random() < 0.9 else 5
+            else:
+                legal += 1
+                if rnd.random() < NOBALL_RATE:
+                    extras["noballs"] = 1
+                    legal -= 1
+                if rnd.random() < BYES_RATE:
+                    extras["byes" if rnd.random() < 0.4 else "legbyes"] = rnd.choice((1, 1, 1, 2, 4))
+                else:
+                    off_bat = _choice(rnd, RUNS_OFF_BAT)
+            extra_runs = sum(extras.values())
+            delivery: Dict[str, Any] = {
+                "batter": batting[striker],
+                "bowler": bowler,
+                "non_striker": batting[non_striker],
+                "runs": {"batter": off_bat, "extras": extra_runs, "total": off_bat + extra_runs},
+            }
+            if off_bat == 4 and rnd.random() < 0.01:
+                delivery["runs"]["non_boundary"] = True
+            if extras:
+                delivery["extras"] = extras
+            runs += off_bat + extra_runs
+
+            if "wides" not in extras and rnd.random() < WICKET_RATE:
+                kind = _choice(rnd, WICKET_KINDS)
+                out = striker if kind != "run out" or rnd.random() < 0.6 else non_striker
+                wicket: Dict[str, Any] = {"kind": kind, "player_out": batting[out]}
+                if kind in ("caught", "run out", "stumped"):
+                    fielder = bowling[0] if kind == "stumped" else rnd.choice(bowling)
+                    wicket["fielders"] = [{"name": fielder}]
+                    if kind == "caught" and rnd.random() < 0.03:
+                        wicket["fielders"] = [{"name": f"{team} substitute", "substitute": True}]
+                delivery["wickets"] = [wicket]
+                wickets += 1
+                if wickets == 10:
+                    deliveries.append(delivery)
+                    break
+                if out == striker:
+                    striker = next_batter
+                else:
+                    non_striker = next_batter
+                next_batter += 1
+            elif (off_bat + extras.get("byes", 0) + extras.get("legbyes", 0)) % 2 == 1:
+                striker, non_striker = non_striker, striker
+
+            deliveries.append(delivery)
+            if target is not None and runs >= target:
+                break
+
+        over_list.append({"over": over, "deliveries": deliveries})
+        if wickets == 10 or (target is not None and runs >= target):
+            break
+        striker, non_striker = non_striker, striker
+
+    return {"team": team, "overs": over_list, "_runs": runs, "_wickets": wickets}
+
+
+def generate_match(rnd: random.Random, index: int) -> Dict[str, Any]:
+    """One match as a decoded Cricsheet JSON document."""
+    teams = rnd.sample(TEAMS, 2)
+    gender = "male" if rnd.random() < 0.75 else "female"
+    # Squads of 15 per team, from which 11 play
+    players = {team: sorted(rnd.sample(range(1, 16), 11)) for team in teams}
+    players = {team: [f"{team} Player {n}" for n in numbers] for team, numbers in players.items()}
+    umpires = [f"Umpire {rnd.randint(1, 40)}", f"Umpire {rnd.randint(41, 80)}"]
+    people = {name: _registry_id(name) for names in list(players.values()) + [umpires] for name in names}
+
+    year = 2004 + index % 20
+    month = rnd.randint(1, 12)
+    day = rnd.randint(1, 28)
+    venue, city = rnd.choice(VENUES)
+    toss_winner = rnd.choice(teams)
+    toss_decision = rnd.choice(("bat", "field"))
+    batting_first = toss_winner if toss_decision == "bat" else teams[1 - teams.index(toss_winner)]
+    chasing = teams[1 - teams.index(batting_first)]
+
+    first = _innings(rnd, batting_first, players[batting_first], players[chasing])
+    innings = [first]
+    outcome: Dict[str, Any]
+    if rnd.random() < 0.03:
+        outcome = {"result": "no result"}
+    else:
+        second = _innings(rnd, chasing, players[chasing], players[batting_first], target=first["_runs"] + 1)
+        innings.append(second)
+        if second["_runs"] > first["_runs"]:
+            outcome = {"winner": chasing, "by": {"wickets": 10 - second["_wickets"]}}
+        elif second["_runs"] == first["_runs"]:
+            outcome = {"result": "tie"}
+        else:
+            outcome = {"winner": batting_first, "by": {"runs": first["_runs"] - second["_runs"]}}
+        if rnd.random() < 0.04 and "winner" in outcome:
+            outcome["method"] = "D/L"
+    for inning in innings:
+        del inning["_runs"], inning["_wickets"]
+
+    info: Dict[str, Any] = {
+        "balls_per_over": 6,
+        "dates": [f"{year}-{month:02d}-{day:02d}"],
+        "event": {"name": f"{teams[0]} tour of {teams[1]}", "match_number": rnd.randint(1, 5)},
+        "gender": gender,
+        "match_type": "ODI",
+        "match_type_number": 1000 + index,
+        "officials": {"umpires": umpires, "match_referees": [f"Referee {rnd.randint(1, 20)}"]},
+        "outcome": outcome,
+        "overs": 50,
+        "player_of_match": [rnd.choice(players[outcome.get("winner", batting_first)])],
+        "players": players,
+        "registry": {"people": people},
+        "season": str(year) if month > 4 else f"{year - 1}/{str(year)[2:]}",
+        "team_type": "international",
+        "teams": teams,
+        "toss": {"decision": toss_decision, "winner": toss_winner},
+        "venue": venue,
+    }
+    if city:
+        info["city"] = city
+    return {"meta": {"data_version": "1.1.0", "created": info["dates"][0], "revision": 1},
+            "info": info, "innings": innings}
+
+
+def write_archive(path: Path, matches: int, seed: int = 0) -> Path:
+    """Write matches synthetic match files into a Cricsheet-style ZIP archive at path."""
+    rnd = random.Random(seed)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for index in range(matches):
+            archive.writestr(f"{1_000_000 + index}.json", json.dumps(generate_match(rnd, index)))
+        archive.writestr("README.txt", "Synthetic ODI matches for benchmarking.\n")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Cricsheet-style ODI archive")
+    parser.add_argument("matches", type=int)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_archive(args.path, args.matches, args.seed)
+    print(f"Wrote {args.matches} matches to {args.path}")
@@ -0,0 +1,251 @@
+# app/watch.py
+# Watch-folder daemon: keeps one warm process and DuckDB connection, polls a drop
+# directory for match files that are new or changed, and commits them in micro-batches
+# bounded by size and by how long the first buffered file has waited, so a match is
+# queryable seconds after its file lands instead of after a full ingest run.
+import argparse
+import logging
+import signal
+import threading
+import time
+import decoding
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from columnar import ROW_BUDGET, ChunkBuffers
+from dimensions import Dimensions
+from manifest import TRUSTED, ManifestEntry, load_manifest, plan_loads
+from pipeline import commit_chunk, parse_match
+from summaries import rebuild_summaries, summaries_missing
+from snapshot import Snapshotter
+from metrics import METRICS
+from db_utils import bulk_loading, initialize_db, unmanifested_matches
+
+
+class Arrival(NamedTuple):
+    """A match file ready to load, with when it landed in the directory (wall clock)."""
+    path: Path
+    arrived: float
+    signature: Tuple[int, int]  # (size, mtime_ns) when it was picked up
+
+
+class DropFolder:
+    """Polls a directory for match files that are new or changed since they were last picked up.
+
+    A file arrives when it is written or moved into the directory (its mtime or
+    ctime, whichever is later, so copies that keep an old mtime count from when
+    they landed). It is ready once nothing has touched it for settle seconds, so
+    files copied in slowly are not read half-written. Hidden files and other
+    extensions are ignored.
+    """
+
+    def __init__(self, path: Path, settle: float = 0.5, pattern: str = "*.json"):
+        self.path = Path(path)
+        self.settle = settle
+        self.pattern = pattern
+        self.seen: Dict[Path, Tuple[int, int]] = {}
+
+    def poll(self) -> List[Arrival]:
+        ready = []
+        now = time.time()
+        present = set()
+        for path in sorted(self.path.glob(self.pattern)):
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            present.add(path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            arrived = max(stat.st_mtime, stat.st_ctime)
+            if self.seen.get(path) == signature or now - arrived < self.settle:
+                continue
+            ready.append(Arrival(path, arrived, signature))
+        # Forget deleted files, so one dropped again under the same name is picked up
+        for path in set(self.seen) - present:
+            del self.seen[path]
+        return ready
+
+    def picked_up(self, arrival: Arrival) -> None:
+        self.seen[arrival.path] = arrival.signature
+
+
+class Watcher:
+    """Loads the files arriving in a DropFolder into the database on one persistent connection.
+
+    Files are parsed as they are picked up and buffered; the batch commits once it
+    holds batch_size files or its first file has waited max_delay seconds. The
+    source name is the file name, so a file with the name of an earlier load (from
+    an archive or the folder) replaces that match, and one whose content is
+    unchanged is skipped. The time from a file's arrival to the commit that
+    loaded it is recorded as the arrival_to_commit timer.
+    """
+
+    def __init__(self, conn, folder: DropFolder, batch_size: int = 50, max_delay: float = 1.0,
+                 row_budget: int = ROW_BUDGET, archive: str = "watch", snapshot: Optional[Snapshotter] = None):
+        self.conn = conn
+        self.folder = folder
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay
+        self.archive = archive
+        self.snapshot = snapshot
+        self.buffers = ChunkBuffers(Dimensions.open(conn), row_budget)
+        self.manifest: Dict[str, ManifestEntry] = load_manifest(conn)
+        self.buffered: Dict[str, Tuple[float, str]] = {}  # source -> (arrived, content hash)
+        self.buffered_at: Optional[float] = None  # monotonic time the first file of the batch was buffered
+        self.batches = 0
+
+    def poll(self) -> int:
+        """Pick up and buffer the files that are ready, committing when the batch is due. Returns files buffered."""
+        arrivals = self.folder.poll()
+        if any(arrival.path.name in self.buffered for arrival in arrivals):
+            # A newer version of a file still in the batch: commit the older one first
+            self.commit()
+        arrived = {arrival.path.name: arrival.arrived for arrival in arrivals}
+
+        buffered = 0
+        files = plan_loads(self._read(arrivals), self.manifest, incremental=True, archive=self.archive) if arrivals else ()
+        for match_file in files:
+            if len(self.buffers) >= self.batch_size:
+                self.commit()
+            self.buffers.add(self.conn, parse_match(match_file))
+            self.buffered[match_file.source] = (arrived[match_file.source], match_file.content_hash)
+            if self.buffered_at is None:
+                self.buffered_at = time.monotonic()
+            buffered += 1
+        if self.due():
+            self.commit()
+        return buffered
+
+    def _read(self, arrivals: List[Arrival]) -> Iterator[Tuple[str, bytes]]:
+        """(name, content) of each arrival, read only as it is planned, so a poll
+        holds one file in memory at a time however many have landed."""
+        for arrival in arrivals:
+            try:
+                raw = arrival.path.read_bytes()
+            except OSError as e:
+                logging.error(f"Could not read {arrival.path}: {e}")
+                continue
+            self.folder.picked_up(arrival)
+            yield arrival.path.name, raw
+
+    def due(self) -> bool:
+        """Whether the batch is full or its first file has waited max_delay seconds."""
+        if not len(self.buffers):
+            return False
+        return len(self.buffers) >= self.batch_size or time.monotonic() - self.buffered_at >= self.max_delay
+
+    def commit(self) -> int:
+        """Commit the buffered files. Returns the number of matches committed."""
+        if not len(self.buffers):
+            return 0
+        self.batches += 1
+        committed = commit_chunk(self.conn, self.buffers, f"watch/{self.batches}")
+        now = time.time()
+        sources = list(self.buffered)
+        latencies = []
+        # Reloaded from the manifest as committed: rejected files keep the entry they had
+        for source, digest, match_id, trusted in self.conn.execute(f"""
+        SELECT source_file, content_hash, match_id::TEXT, {TRUSTED} FROM ingest_manifest
+        WHERE list_contains(?, source_file);
+        """, [sources]).fetchall():
+            self.manifest[source] = ManifestEntry(digest, match_id, trusted)
+            arrived, buffered_hash = self.buffered[source]
+            if digest == buffered_hash:
+                latencies.append(now - arrived)
+                METRICS.observe("arrival_to_commit", now - arrived)
+        if latencies:
+            logging.info(f"Batch {self.batches}: {committed} of {len(sources)} files committed, "
+                         f"{max(latencies):.2f}s max from arrival to commit")
+        self.buffered = {}
+        self.buffered_at = None
+        if self.snapshot:
+            with METRICS.timer("snapshot"):
+                self.snapshot.after_commit(self.conn)
+        return committed
+
+    def close(self) -> None:
+        """Commit what is still buffered and bring the snapshot up to date."""
+        self.commit()
+        if self.snapshot:
+            with METRICS.timer("snapshot"):
+                self.snapshot.flush(self.conn)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Load match files dropped into a directory as they arrive")
+    parser.add_argument("drop_dir", type=Path, help="Directory to watch for Cricsheet match JSON files")
+    parser.add_argument("--db", type=Path, default=Path("odi_data.db"),
+                        help="Database to load into (default: odi_data.db)")
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="Commit once this many files are buffered (default: 50)")
+    parser.add_argument("--max-delay", type=float, default=1.0, metavar="SECONDS",
+                        help="Commit once the first buffered file has waited this long (default: 1)")
+    parser.add_argument("--poll-interval", type=float, default=0.25, metavar="SECONDS",
+                        help="How often to list the directory (default: 0.25)")
+    parser.add_argument("--settle", type=float, default=0.5, metavar="SECONDS",
+                        help="Pick a file up once it has not been written to for this long (default: 0.5)")
+    parser.add_argument("--archive", default="watch",
+                        help="Archive tag recorded in the manifest for files from the folder (default: watch)")
+    parser.add_argument("--row-budget", type=int, default=ROW_BUDGET,
+                        help=f"Rows buffered in memory before they are spilled to the staging tables "
+                             f"(default: {ROW_BUDGET})")
+    parser.add_argument("--decoder", choices=("auto",) + decoding.BACKENDS, default="auto",
+                        help="JSON decoding backend (default: fastest installed)")
+    parser.add_argument("--snapshot", nargs="?", const="", metavar="FILE",
+                        help="Keep a read-only copy of the database for app/service.py, refreshed after batches "
+                             "(default file: <db>.snapshot.db)")
+    parser.add_argument("--snapshot-interval", type=float, default=5.0, metavar="SECONDS",
+                        help="Refresh the snapshot at most this often (default: 5)")
+    parser.add_argument("--metrics-json", type=Path, metavar="FILE",
+                        help="Rewrite the metrics as JSON after every batch")
+    parser.add_argument("--metrics-prom", type=Path, metavar="FILE",
+                        help="Rewrite the metrics in Prometheus text format after every batch")
+    parser.add_argument("--once", action="store_true",
+                        help="Load the files already in the directory, then exit")
+    args = parser.parse_args()
+
+    if not args.drop_dir.is_dir():
+        parser.error(f"{args.drop_dir} is not a directory")
+    decoder = decoding.set_backend(args.decoder)
+    conn = initialize_db(str(args.db))
+    if bulk_loading(conn):
+        parser.error(f"{args.db} holds an unfinished bulk load; finish it first")
+    if unmanifested_matches(conn):
+        parser.error(f"{args.db} has matches loaded before the ingest manifest existed; "
+                     f"reload them first with app/ingest.py --reload-legacy")
+    if summaries_missing(conn):
+        logging.info("Building summary tables for matches loaded before they existed")
+        rebuild_summaries(conn)
+
+    snapshot = None
+    if args.snapshot is not None:
+        snapshot = Snapshotter(args.db, args.snapshot or None, args.snapshot_interval)
+    watcher = Watcher(conn, DropFolder(args.drop_dir, 0 if args.once else args.settle), args.batch_size,
+                      args.max_delay, args.row_budget, args.archive, snapshot)
+
+    def write_metrics() -> None:
+        if args.metrics_json:
+            METRICS.write_json(args.metrics_json)
+        if args.metrics_prom:
+            METRICS.write_prometheus(args.metrics_prom)
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    logging.info(f"Watching {args.drop_dir} for match files (decoding JSON with {decoder}); "
+                 f"loading into {args.db}")
+    try:
+        while not stop.is_set():
+            batches = watcher.batches
+            if not watcher.poll() and args.once:
+                break
+            if watcher.batches != batches:
+                write_metrics()
+            stop.wait(args.poll_interval)
+    finally:
+        watcher.close()
+        conn.close()
+        write_metrics()
+        logging.info("Stopped watching")
@@ -1,45 +1,19 @@
 --which teams had the highest win percentage in 2019?
-WITH match_results AS (
-    SELECT
-        gender,
-        date,
-        team_1,
-        team_2,
-        outcome_winner,
-        outcome_result,
-        outcome_method
-    FROM matches
-    WHERE date >= '2019-01-01'
-        AND date <= '2019-12-31'
-        AND outcome_result IS NULL
-        AND (outcome_method IS NULL OR outcome_method NOT LIKE '%D/L%')
-),
-team_matches AS (
-    SELECT
-        gender,
-        team_1 as team,
-        CASE WHEN outcome_winner = team_1 THEN 1 ELSE 0 END as won
-    FROM match_results
-
-    UNION ALL
-
-    SELECT
-        gender,
-        team_2 as team,
-        CASE WHEN outcome_winner = team_2 THEN 1 ELSE 0 END as won
-    FROM match_results
-),
-team_stats AS (
+-- parameters (python -m app.query 2b --year 2023): year (default 2019), match_type (default ODI), gender (default all)
+-- team_results already excludes ties, no results and DLS matches
+WITH team_stats AS (
     SELECT
         gender,
         team,
-        COUNT(*) as total_matches,
-        SUM(won) as total_wins,
-        ROUND(CAST(SUM(won) AS FLOAT) / COUNT(*) * 100, 2) as win_percentage,
-        ROW_NUMBER() OVER (PARTITION BY gender ORDER BY CAST(SUM(won) AS FLOAT) / COUNT(*) DESC) as rank
-    FROM team_matches
-    GROUP BY gender, team
-    -- HAVING COUNT(*) > 1 -- Optional. Excludes teams with only 1 match (like NED in 2019), making it Namibia at 75%...
+        matches as total_matches,
+        wins as total_wins,
+        ROUND(CAST(wins AS FLOAT) / matches * 100, 2) as win_percentage,
+        ROW_NUMBER() OVER (PARTITION BY gender ORDER BY CAST(wins AS FLOAT) / matches DESC) as rank
+    FROM team_results
+    WHERE year = coalesce(getvariable('year'), 2019)
+        AND match_type = coalesce(getvariable('match_type'), 'ODI')
+        AND (getvariable('gender') IS NULL OR gender = getvariable('gender'))
+    -- AND matches > 1 -- Optional. Excludes teams with only 1 match (like NED in 2019), making it Namibia at 75%...
 )
 SELECT
     gender,
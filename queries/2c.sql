@@ -1,17 +1,16 @@
 -- Calculate batsmen strike rates for the year 2019
+-- parameters (python -m app.query 2c --year 2023 --limit 20): year (default 2019), match_type (default ODI),
+-- gender (default all), limit (default 10)
 WITH batter_stats AS (
     SELECT
-        i.batter,
-        COUNT(*) as balls_faced,
-        SUM(i.runs_batter) as runs_scored,
-        COUNT(*) - COUNT(CASE
-            WHEN i.extras_wides > 0 THEN 1  -- Subtract wides from the total count to get actual balls faced
-            END) as actual_balls_faced  -- Calculate actual balls faced by excluding wides
-    FROM innings i
-    JOIN matches m ON i.match_id = m.match_id
-    WHERE m.date >= '2019-01-01'
-        AND m.date <= '2019-12-31'
-    GROUP BY i.batter  -- Group results by batter to calculate stats per individual
+        batter,
+        SUM(runs) as runs_scored,
+        SUM(balls_faced) as actual_balls_faced  -- balls faced per match already exclude wides
+    FROM batter_match_stats
+    WHERE year = coalesce(getvariable('year'), 2019)
+        AND match_type = coalesce(getvariable('match_type'), 'ODI')
+        AND (getvariable('gender') IS NULL OR gender = getvariable('gender'))
+    GROUP BY batter  -- Group results by batter to calculate stats per individual
 )
 SELECT
     batter,
@@ -20,4 +19,4 @@ SELECT
     ROUND(CAST(runs_scored AS FLOAT) / actual_balls_faced * 100, 2) as strike_rate
 FROM batter_stats
 ORDER BY strike_rate DESC
-LIMIT 10;
+LIMIT coalesce(getvariable('limit'), 10);
@@ -0,0 +1,170 @@
+# tests/conftest.py
+# The app modules import each other as siblings (they run as scripts from app/),
+# so the tests put app/ on the path the same way.
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+
+class Archive:
+    """What the stand-in server serves at one path, and how it misbehaves."""
+
+    def __init__(self, body: bytes, etag: Optional[str] = '"v1"',
+                 last_modified: Optional[str] = "Sat, 01 Jun 2024 00:00:00 GMT"):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.failures: List[int] = []  # statuses to answer the next requests with, in order
+        self.truncate_next = 0  # requests to cut off halfway through the body
+        self.ranges = True  # False to answer Range requests with the whole body
+        self.delay = 0.0  # seconds to wait before answering
+
+
+class ArchiveServer(ThreadingHTTPServer):
+    """A local stand-in for the Cricsheet downloads server, recording every request it gets."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ArchiveHandler)
+        self.archives: Dict[str, Archive] = {}
+        self.requests: List[Dict[str, str]] = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0  # most requests in flight at once
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def statuses(self, path: str) -> List[int]:
+        return [request["status"] for request in self.requests if request["path"] == path]
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server: ArchiveServer = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            self.reply(server)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def reply(self, server: ArchiveServer):
+        archive = server.archives.get(self.path)
+        if archive and archive.delay:
+            time.sleep(archive.delay)
+        with server.lock:
+            status = self.answer(archive)
+            server.requests.append({"path": self.path, "status": status, **self.headers})
+            truncate = archive is not None and status in (200, 206) and archive.truncate_next > 0
+            if truncate:
+                archive.truncate_next -= 1
+
+        if archive is None or status >= 300:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start = self.range_start() if status == 206 else 0
+        body = archive.body[start:]
+        self.send_response(status)
+        if archive.etag:
+            self.send_header("ETag", archive.etag)
+        if archive.last_modified:
+            self.send_header("Last-Modified", archive.last_modified)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(archive.body) - 1}/{len(archive.body)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if truncate:
+            # Promise the whole body but hang up halfway, like a dropped connection
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def answer(self, archive: Optional[Archive]) -> int:
+        if archive is None:
+            return 404
+        if archive.failures:
+            return archive.failures.pop(0)
+        if archive.etag and self.headers.get("If-None-Match") == archive.etag:
+            return 304
+        if self.headers.get("Range") and archive.ranges:
+            if_range = self.headers.get("If-Range")
+            if if_range in (None, archive.etag, archive.last_modified):
+                return 416 if self.range_start() >= len(archive.body) else 206
+        return 200
+
+    def range_start(self) -> int:
+        return int(self.headers["Range"].split("=")[1].rstrip("-"))
+
+
+@pytest.fixture
+def archive_server():
+    server = ArchiveServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def load_archives(db_path: Path, archives) -> int:
+    """Load (archive name, zip path) pairs into db_path with the serial columnar loader.
+    Returns the number of matches committed."""
+    from columnar import ChunkBuffers
+    from db_utils import bulk_loading, initialize_db
+    from dimensions import Dimensions
+    from manifest import load_manifest, plan_archives
+    from pipeline import commit_chunk, parse_match
+    from sources import iter_zip_matches
+
+    conn = initialize_db(str(db_path))
+    try:
+        buffers = ChunkBuffers(Dimensions.open(conn), bulk=bulk_loading(conn))
+        for match_file in plan_archives(((name, iter_zip_matches(path)) for name, path in archives),
+                                        load_manifest(conn)):
+            buffers.add(conn, parse_match(match_file))
+        return commit_chunk(conn, buffers, 1)
+    finally:
+        conn.close()
+
+
+def write_matches(path: Path, first: int, matches: int, seed: int = 0) -> Path:
+    """A Cricsheet-style archive of synthetic matches named first.json, first+1.json, ..."""
+    import json
+    import random
+    import zipfile
+    from synthetic import generate_match
+
+    rnd = random.Random(seed)
+    with zipfile.ZipFile(path, "w") as archive:
+        for index in range(matches):
+            archive.writestr(f"{first + index}.json", json.dumps(generate_match(rnd, index)))
+    return path
+
+
+@pytest.fixture(scope="session")
+def synthetic_archives(tmp_path_factory):
+    """Two small synthetic archives with different matches, as (name, zip path) pairs."""
+    directory = tmp_path_factory.mktemp("archives")
+    return [("odis", write_matches(directory / "odis_json.zip", 1_000_000, 6, seed=1)),
+            ("t20s", write_matches(directory / "t20s_json.zip", 2_000_000, 4, seed=2))]
@@ -0,0 +1,68 @@
+# tests/test_bulk.py
+# A bulk load into an empty database, finished into the fully keyed schema.
+import duckdb
+import pytest
+from conftest import load_archives
+from db_utils import IntegrityError, bulk_loading, finish_bulk_load, initialize_db
+
+
+def constraints(conn):
+    return set(conn.execute("""
+    SELECT table_name, constraint_type, constraint_text FROM duckdb_constraints()
+    WHERE constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY');
+    """).fetchall())
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_finished_bulk_load_has_every_key(tmp_path, synthetic_archives, compact):
+    keyed = tmp_path / "keyed.db"
+    conn = initialize_db(str(keyed), compact=compact)
+    expected = constraints(conn)
+    conn.close()
+    load_archives(keyed, synthetic_archives)
+
+    # An empty keyed database, as `make db-init` creates, is converted for the bulk load
+    bulk = tmp_path / "bulk.db"
+    initialize_db(str(bulk), compact=compact).close()
+    conn = initialize_db(str(bulk), bulk=True)
+    assert bulk_loading(conn)
+    assert not any(kind == "FOREIGN KEY" for _, kind, _ in constraints(conn))
+    conn.close()
+    assert load_archives(bulk, synthetic_archives) == 10
+
+    conn = duckdb.connect(str(bulk))
+    finish_bulk_load(conn)
+    assert not bulk_loading(conn)
+    assert constraints(conn) == expected
+    conn.execute(f"ATTACH '{keyed}' AS keyed (READ_ONLY);")
+    for table in ("players", "match_players", "officials", "innings"):
+        assert conn.execute(f"""
+        SELECT count(*) FROM (
+            (SELECT * EXCLUDE (created_at) FROM {table} EXCEPT ALL SELECT * EXCLUDE (created_at) FROM keyed.{table})
+            UNION ALL
+            (SELECT * EXCLUDE (created_at) FROM keyed.{table} EXCEPT ALL SELECT * EXCLUDE (created_at) FROM {table})
+        );
+        """).fetchone()[0] == 0, table
+    conn.close()
+
+
+def test_unfinished_bulk_load_with_problems_is_left_as_is(tmp_path, synthetic_archives):
+    db_path = tmp_path / "bulk.db"
+    initialize_db(str(db_path), bulk=True).close()
+    load_archives(db_path, synthetic_archives[:1])
+    conn = duckdb.connect(str(db_path))
+    conn.execute("INSERT INTO players SELECT * FROM players LIMIT 1;")
+
+    with pytest.raises(IntegrityError, match="duplicate players keys"):
+        finish_bulk_load(conn)
+
+    assert bulk_loading(conn)
+    conn.close()
+
+
+def test_bulk_load_refuses_a_database_with_data(tmp_path, synthetic_archives):
+    db_path = tmp_path / "keyed.db"
+    load_archives(db_path, synthetic_archives[:1])
+
+    with pytest.raises(ValueError, match="new or empty database"):
+        initialize_db(str(db_path), bulk=True)
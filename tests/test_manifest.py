@@ -0,0 +1,90 @@
+# tests/test_manifest.py
+# Reloads planned from the manifest: trusted content and incremental skips.
+import json
+import random
+import zipfile
+
+import decoding
+import duckdb
+import pytest
+from conftest import load_archives
+from db_utils import drop_unmanifested, unmanifested_matches
+from manifest import load_manifest, plan_loads
+from synthetic import generate_match
+
+
+@pytest.fixture(params=decoding.available_backends())
+def backend(request):
+    previous = decoding.get_backend()
+    yield decoding.set_backend(request.param)
+    decoding.set_backend(previous)
+
+
+def write_match(path, match):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("1000000.json", json.dumps(match))
+    return path
+
+
+def innings_by_team(db_path):
+    conn = duckdb.connect(str(db_path), read_only=True)
+    try:
+        return dict(conn.execute("SELECT team, count(*) FROM innings GROUP BY team").fetchall())
+    finally:
+        conn.close()
+
+
+def test_skipped_innings_stay_skipped_on_reload(tmp_path, backend):
+    match = generate_match(random.Random(5), 0)
+    match["innings"][0]["team"] = 123  # fails validation, but the trusted path would read it
+    archive = write_match(tmp_path / "odis_json.zip", match)
+    db_path = tmp_path / "odi_data.db"
+
+    assert load_archives(db_path, [("odis", archive)]) == 1
+    loaded = innings_by_team(db_path)
+    assert "123" not in loaded and len(loaded) == 1
+
+    conn = duckdb.connect(str(db_path))
+    manifest = load_manifest(conn)
+    assert conn.execute("SELECT innings_skipped FROM ingest_manifest").fetchall() == [(1,)]
+    conn.close()
+    raw = json.dumps(match).encode()
+    assert not next(plan_loads([("1000000.json", raw)], manifest)).trusted
+
+    assert load_archives(db_path, [("odis", archive)]) == 1
+    assert innings_by_team(db_path) == loaded
+
+
+def test_whole_match_is_trusted_on_reload(tmp_path, backend):
+    match = generate_match(random.Random(5), 0)
+    archive = write_match(tmp_path / "odis_json.zip", match)
+    db_path = tmp_path / "odi_data.db"
+
+    load_archives(db_path, [("odis", archive)])
+    loaded = innings_by_team(db_path)
+    conn = duckdb.connect(str(db_path))
+    manifest = load_manifest(conn)
+    conn.close()
+
+    assert next(plan_loads([("1000000.json", json.dumps(match).encode())], manifest)).trusted
+    assert load_archives(db_path, [("odis", archive)]) == 1
+    assert innings_by_team(db_path) == loaded
+
+
+def test_matches_without_manifest_rows_are_found_and_dropped(tmp_path, synthetic_archives):
+    db_path = tmp_path / "odi_data.db"
+    load_archives(db_path, synthetic_archives)
+    conn = duckdb.connect(str(db_path))
+    # As left by a load from before the manifest existed
+    conn.execute("DELETE FROM ingest_manifest WHERE archive = 't20s';")
+
+    assert unmanifested_matches(conn) == 4
+    assert drop_unmanifested(conn) == 4
+
+    assert unmanifested_matches(conn) == 0
+    assert conn.execute("SELECT count(*) FROM matches").fetchone()[0] == 6
+    for table in ("innings", "match_players", "officials", "batter_match_stats", "bowler_match_stats"):
+        assert conn.execute(f"""
+        SELECT count(*) FROM {table} WHERE match_id NOT IN (SELECT match_id FROM matches)
+        """).fetchone()[0] == 0, table
+    conn.close()
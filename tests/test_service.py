@@ -0,0 +1,151 @@
+# tests/test_service.py
+# The query service on localhost, answering from a snapshot of a small synthetic load.
+import http.client
+import json
+import threading
+
+import duckdb
+import pyarrow as pa
+import pytest
+from conftest import load_archives
+from service import ARROW_STREAM, QueryServer, SnapshotPool
+from snapshot import write_snapshot
+
+
+class Response:
+    def __init__(self, response: http.client.HTTPResponse):
+        self.status = response.status
+        self.headers = response.headers
+        self.body = response.read()
+
+    def json(self):
+        return json.loads(self.body)
+
+
+@pytest.fixture
+def db_path(tmp_path, synthetic_archives):
+    path = tmp_path / "odi_data.db"
+    load_archives(path, synthetic_archives[:1])
+    return path
+
+
+def take_snapshot(db_path):
+    conn = duckdb.connect(str(db_path))
+    try:
+        write_snapshot(conn, db_path, db_path.with_suffix(".snapshot.db"))
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def service(db_path):
+    pool = SnapshotPool(db_path.with_suffix(".snapshot.db"), size=2)
+    server = QueryServer(("127.0.0.1", 0), pool)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def get(path, headers=None):
+        # http.client sends the path as given, without normalizing dot segments
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+        try:
+            conn.request("GET", path, headers=headers or {})
+            return Response(conn.getresponse())
+        finally:
+            conn.close()
+
+    yield get
+    server.shutdown()
+    server.server_close()
+    pool.close()
+
+
+def matches_served(get):
+    # Every match counts once for each of its two teams (the synthetic ones all have a result)
+    response = get("/query/2a?match_type=ODI")
+    assert response.status == 200
+    return sum(row["total_matches"] for row in response.json()["rows"]) // 2
+
+
+def test_missing_snapshot_is_unavailable(service):
+    assert service("/query/2a").status == 503
+
+
+def test_json_result(db_path, service):
+    take_snapshot(db_path)
+
+    response = service("/query/2a")
+
+    assert response.status == 200
+    assert response.headers["Content-Type"] == "application/json"
+    body = response.json()
+    assert body["query"] == "2a"
+    assert body["columns"][:3] == ["year", "gender", "team"]
+    assert body["rows"]
+    assert response.headers["X-Data-Version"] == str(body["data_version"])
+
+
+def test_arrow_result(db_path, service):
+    take_snapshot(db_path)
+    rows = service("/query/2a").json()["rows"]
+
+    for response in (service("/query/2a?format=arrow"), service("/query/2a", {"Accept": ARROW_STREAM})):
+        assert response.status == 200
+        assert response.headers["Content-Type"] == ARROW_STREAM
+        table = pa.ipc.open_stream(response.body).read_all()
+        assert table.num_rows == len(rows)
+        assert table.column("team").to_pylist() == [row["team"] for row in rows]
+
+
+def test_parameters_filter(db_path, service):
+    take_snapshot(db_path)
+    rows = service("/query/2a").json()["rows"]
+    year = rows[0]["year"]
+
+    response = service(f"/query/2b?year={year}")
+
+    assert response.status == 200
+    assert response.json()["rows"]
+
+
+@pytest.mark.parametrize("path", [
+    "/query/2a?format=xml",
+    "/query/2a?1year=2019",
+    "/query/2a?match-type=ODI",
+])
+def test_bad_parameters(db_path, service, path):
+    take_snapshot(db_path)
+
+    response = service(path)
+
+    assert response.status == 400
+    assert "error" in response.json()
+
+
+@pytest.mark.parametrize("path", [
+    "/query/../requirements",
+    "/query/..%2F..%2Fapp%2Fingest",
+    "/query/%2E%2E/queries/2a",
+    "/query//etc/passwd",
+    "/query/2a.sql",
+])
+def test_query_names_outside_queries_are_rejected(db_path, service, path):
+    take_snapshot(db_path)
+
+    response = service(path)
+
+    assert response.status == 404
+    assert response.json()["error"].startswith("Unknown query")
+
+
+def test_snapshot_swapped_after_commit(db_path, service, synthetic_archives):
+    take_snapshot(db_path)
+    before = service("/health").json()["data_version"]
+    assert matches_served(service) == 6
+
+    load_archives(db_path, synthetic_archives[1:])
+    # Still the old snapshot until the writer takes a new one
+    assert matches_served(service) == 6
+    take_snapshot(db_path)
+
+    assert service("/health").json()["data_version"] > before
+    assert matches_served(service) == 10
@@ -0,0 +1,178 @@
+# tests/test_sources.py
+# The cached archive fetcher against a local stand-in for the downloads server.
+import json
+import os
+
+import duckdb
+import pytest
+import requests
+import sources
+from conftest import Archive, load_archives
+from sources import Source, fetch_archive, fetch_archives, mark_ingested
+
+BODY = os.urandom(300_000)
+CHUNK_BYTES = 10_000  # divides half the body, so a transfer cut off halfway keeps exactly that half
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(sources, "DOWNLOAD_CHUNK_BYTES", CHUNK_BYTES)
+
+
+def meta(zip_path):
+    return json.loads(zip_path.with_name(zip_path.name + ".meta.json").read_text())
+
+
+@pytest.fixture
+def zip_path(tmp_path):
+    return tmp_path / "odis_json.zip"
+
+
+def fetch(server, zip_path, **kwargs):
+    return fetch_archive(server.url("/odis_json.zip"), zip_path, backoff=0, **kwargs)
+
+
+def test_download_stores_validators(archive_server, zip_path):
+    archive_server.archives["/odis_json.zip"] = Archive(BODY)
+
+    result = fetch(archive_server, zip_path)
+
+    assert result.changed and not result.ingested
+    assert zip_path.read_bytes() == BODY
+    assert meta(zip_path)["etag"] == '"v1"'
+    assert not zip_path.with_name(zip_path.name + ".part").exists()
+
+
+def test_not_modified_reuses_cached_archive(archive_server, zip_path):
+    archive_server.archives["/odis_json.zip"] = Archive(BODY)
+    fetch(archive_server, zip_path)
+    mark_ingested(zip_path)
+
+    result = fetch(archive_server, zip_path)
+
+    assert archive_server.statuses("/odis_json.zip") == [200, 304]
+    assert archive_server.requests[-1]["If-None-Match"] == '"v1"'
+    assert not result.changed and result.ingested
+    assert zip_path.read_bytes() == BODY
+
+
+def test_changed_etag_downloads_again(archive_server, zip_path):
+    archive = archive_server.archives["/odis_json.zip"] = Archive(BODY)
+    fetch(archive_server, zip_path)
+    mark_ingested(zip_path)
+    archive.body, archive.etag = BODY[::-1], '"v2"'
+
+    result = fetch(archive_server, zip_path)
+
+    assert archive_server.statuses("/odis_json.zip") == [200, 200]
+    assert result.changed and not result.ingested
+    assert zip_path.read_bytes() == BODY[::-1]
+    assert meta(zip_path)["etag"] == '"v2"'
+
+
+def test_interrupted_download_resumes_with_range(archive_server, zip_path):
+    archive = archive_server.archives["/odis_json.zip"] = Archive(BODY)
+    archive.truncate_next = 1
+
+    result = fetch(archive_server, zip_path)
+
+    assert archive_server.statuses("/odis_json.zip") == [200, 206]
+    resumed = archive_server.requests[-1]
+    assert resumed["Range"] == f"bytes={len(BODY) // 2}-"
+    assert resumed["If-Range"] == '"v1"'
+    assert result.changed
+    assert zip_path.read_bytes() == BODY
+
+
+def test_interrupted_download_resumes_on_a_later_run(archive_server, zip_path):
+    archive = archive_server.archives["/odis_json.zip"] = Archive(BODY)
+    archive.truncate_next = 1
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        fetch(archive_server, zip_path, retries=0)
+    assert zip_path.with_name(zip_path.name + ".part").stat().st_size == len(BODY) // 2
+
+    fetch(archive_server, zip_path)
+
+    assert archive_server.statuses("/odis_json.zip") == [200, 206]
+    assert zip_path.read_bytes() == BODY
+
+
+def test_full_reply_to_range_request_replaces_partial(archive_server, zip_path):
+    archive = archive_server.archives["/odis_json.zip"] = Archive(BODY)
+    archive.truncate_next = 1
+    archive.ranges = False
+
+    fetch(archive_server, zip_path)
+
+    assert archive_server.statuses("/odis_json.zip") == [200, 200]
+    assert "Range" in archive_server.requests[-1]
+    assert zip_path.read_bytes() == BODY
+
+
+def test_changed_archive_during_resume_starts_over(archive_server, zip_path):
+    archive = archive_server.archives["/odis_json.zip"] = Archive(BODY)
+    archive.truncate_next = 1
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        fetch(archive_server, zip_path, retries=0)
+    archive.body, archive.etag = BODY[::-1], '"v2"'
+
+    fetch(archive_server, zip_path)
+
+    # If-Range no longer matches, so the server sends the new archive whole
+    assert archive_server.statuses("/odis_json.zip") == [200, 200]
+    assert zip_path.read_bytes() == BODY[::-1]
+
+
+def test_server_error_is_retried(archive_server, zip_path):
+    archive = archive_server.archives["/odis_json.zip"] = Archive(BODY)
+    archive.failures = [503, 500]
+
+    result = fetch(archive_server, zip_path)
+
+    assert archive_server.statuses("/odis_json.zip") == [503, 500, 200]
+    assert result.changed
+    assert zip_path.read_bytes() == BODY
+
+
+def test_persistent_server_error_fails(archive_server, zip_path):
+    archive = archive_server.archives["/odis_json.zip"] = Archive(BODY)
+    archive.failures = [503] * 10
+
+    with pytest.raises(requests.RequestException):
+        fetch(archive_server, zip_path, retries=1)
+
+    assert not zip_path.exists()
+
+
+def test_sources_are_fetched_concurrently(archive_server, tmp_path):
+    sources = []
+    for name in ("odis", "t20s", "tests"):
+        archive = archive_server.archives[f"/{name}_json.zip"] = Archive(BODY)
+        archive.delay = 0.3
+        sources.append(Source(name, archive_server.url(f"/{name}_json.zip")))
+
+    results = fetch_archives(sources, tmp_path, backoff=0)
+
+    assert archive_server.peak == 3
+    assert [result.path.name for result in results] == ["odis_json.zip", "t20s_json.zip", "tests_json.zip"]
+    assert all(result.changed and result.path.read_bytes() == BODY for result in results)
+
+
+def test_failing_source_does_not_stop_the_others(archive_server, synthetic_archives, tmp_path):
+    for name, path in synthetic_archives:
+        archive_server.archives[f"/{path.name}"] = Archive(path.read_bytes(), etag=f'"{name}"')
+    archive_server.archives["/tests_json.zip"] = Archive(BODY)
+    archive_server.archives["/tests_json.zip"].failures = [503] * 10
+    sources = [Source("odis", archive_server.url("/odis_json.zip")),
+               Source("tests", archive_server.url("/tests_json.zip")),
+               Source("t20s", archive_server.url("/t20s_json.zip"))]
+
+    results = fetch_archives(sources, tmp_path / "data", retries=1, backoff=0)
+
+    assert results[1] is None
+    fetched = [(source.name, result.path) for source, result in zip(sources, results) if result]
+    assert load_archives(tmp_path / "odi_data.db", fetched) == 10
+    conn = duckdb.connect(str(tmp_path / "odi_data.db"), read_only=True)
+    assert dict(conn.execute("SELECT archive, count(*) FROM ingest_manifest GROUP BY archive").fetchall()) == \
+        {"odis": 6, "t20s": 4}
+    conn.close()
@@ -0,0 +1,61 @@
+# tests/test_summaries.py
+# Per-match summary rows against counts taken straight from the match JSON.
+import json
+import random
+import zipfile
+from collections import Counter
+
+import duckdb
+from conftest import load_archives
+from query import data_version
+from summaries import BOWLER_WICKETS, rebuild_summaries
+from synthetic import generate_match
+
+KINDS = ("bowled", "caught", "caught and bowled", "lbw", "stumped", "hit wicket", "run out",
+         "retired hurt", "retired not out", "retired out", "obstructing the field", "timed out")
+
+
+def test_wickets_and_dismissals_by_kind(tmp_path):
+    match = generate_match(random.Random(3), 0)
+    deliveries = [delivery for innings in match["innings"] for over in innings["overs"]
+                  for delivery in over["deliveries"]]
+    wickets = [(delivery, wicket) for delivery in deliveries for wicket in delivery.get("wickets", [])]
+    assert len(wickets) >= len(KINDS)
+    for n, (_, wicket) in enumerate(wickets):
+        wicket["kind"] = KINDS[n % len(KINDS)]
+    expected_wickets = Counter(delivery["bowler"] for delivery, wicket in wickets
+                               if wicket["kind"] in BOWLER_WICKETS)
+    # Batters who never faced a ball have no row
+    faced = {delivery["batter"] for delivery in deliveries}
+    expected_dismissals = Counter(wicket["player_out"] for _, wicket in wickets
+                                  if wicket["kind"] not in ("retired hurt", "retired not out")
+                                  and wicket["player_out"] in faced)
+    archive = tmp_path / "odis_json.zip"
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("1000000.json", json.dumps(match))
+    db_path = tmp_path / "odi_data.db"
+    assert load_archives(db_path, [("odis", archive)]) == 1
+
+    conn = duckdb.connect(str(db_path))
+    try:
+        for _ in range(2):  # as maintained during ingestion, then rebuilt from the base tables
+            credited = dict(conn.execute("SELECT bowler, wickets FROM bowler_match_stats WHERE wickets > 0").fetchall())
+            dismissals = dict(conn.execute(
+                "SELECT batter, dismissals FROM batter_match_stats WHERE dismissals > 0").fetchall())
+            assert credited == dict(expected_wickets)
+            assert dismissals == dict(expected_dismissals)
+            rebuild_summaries(conn)
+    finally:
+        conn.close()
+
+
+def test_rebuild_bumps_data_version(tmp_path, synthetic_archives):
+    db_path = tmp_path / "odi_data.db"
+    load_archives(db_path, synthetic_archives[:1])
+    conn = duckdb.connect(str(db_path))
+    before = data_version(conn)
+
+    rebuild_summaries(conn)
+
+    assert data_version(conn) == before + 1
+    conn.close()
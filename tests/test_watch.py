@@ -0,0 +1,54 @@
+# tests/test_watch.py
+# The watch-folder daemon loading files dropped into a directory.
+import json
+import random
+from pathlib import Path
+
+import pytest
+from db_utils import initialize_db
+from synthetic import generate_match
+from watch import DropFolder, Watcher
+
+
+@pytest.fixture
+def drop_dir(tmp_path):
+    rnd = random.Random(7)
+    path = tmp_path / "drop"
+    path.mkdir()
+    for index in range(7):
+        (path / f"{3_000_000 + index}.json").write_text(json.dumps(generate_match(rnd, index)))
+    return path
+
+
+def test_files_are_read_as_the_batches_fill(tmp_path, drop_dir, monkeypatch):
+    conn = initialize_db(str(tmp_path / "odi_data.db"))
+    watcher = Watcher(conn, DropFolder(drop_dir, settle=0), batch_size=2)
+    reads = []
+    read_bytes = Path.read_bytes
+    monkeypatch.setattr(Path, "read_bytes", lambda path: reads.append(path.name) or read_bytes(path))
+    commit = watcher.commit
+    reads_at_commit = []
+    monkeypatch.setattr(watcher, "commit", lambda: reads_at_commit.append(len(reads)) or commit())
+
+    assert watcher.poll() == 7
+    watcher.close()
+
+    # Each full batch commits before the next file is read
+    assert reads_at_commit[:3] == [3, 5, 7]
+    assert watcher.batches == 4
+    assert conn.execute("SELECT count(*) FROM matches").fetchone()[0] == 7
+    conn.close()
+
+
+def test_unchanged_files_are_not_loaded_again(tmp_path, drop_dir):
+    conn = initialize_db(str(tmp_path / "odi_data.db"))
+    watcher = Watcher(conn, DropFolder(drop_dir, settle=0), batch_size=50)
+    assert watcher.poll() == 7
+    watcher.close()
+
+    # A new watcher sees every file again, but the manifest has them all
+    watcher = Watcher(conn, DropFolder(drop_dir, settle=0), batch_size=50)
+    assert watcher.poll() == 0
+    assert watcher.poll() == 0
+    assert conn.execute("SELECT count(*) FROM matches").fetchone()[0] == 7
+    conn.close()